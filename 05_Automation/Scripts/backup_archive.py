@@ -0,0 +1,612 @@
+"""
+BigSkyAg Backup Archive Writer
+Native streaming ZIP64 writer with a per-file STORED/DEFLATED policy
+"""
+
+import hashlib
+import logging
+import os
+import stat as stat_module
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from exclusions import compile_exclusions, walk_tree
+from page_cache import open_source
+
+logger = logging.getLogger(__name__)
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+DEFAULT_COMPRESSLEVEL = 6
+READ_SIZE = 1024 * 1024             # Streaming read size (bounds memory per entry)
+SMALL_FILE_LIMIT = 64 * 1024        # Files up to this size are compressed in one go
+SAMPLE_SIZE = 16 * 1024             # Bytes per compressibility sample
+MIN_DEFLATE_GAIN = 0.05             # Store unless deflate saves at least 5%
+DIGEST_BLOCK_SIZE = 4 * 1024 * 1024 # Content digests hash files in blocks of this size
+
+# Extensions whose payload is already compressed: never worth deflating
+STORE_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic",
+    ".mp4", ".mov", ".avi", ".mkv", ".webm", ".mp3", ".aac", ".m4a", ".flac",
+    ".qgz", ".kmz", ".docx", ".xlsx", ".pptx", ".odt", ".ods", ".odp",
+    ".laz", ".ecw", ".sid", ".jp2",
+}
+
+# Leading bytes of already-compressed formats (caught even with a misleading extension)
+COMPRESSED_MAGIC = (
+    b"PK\x03\x04",          # zip family (docx/xlsx/qgz/kmz/zip)
+    b"\x1f\x8b",            # gzip
+    b"BZh",                 # bzip2
+    b"\xfd7zXZ\x00",        # xz
+    b"7z\xbc\xaf\x27\x1c",  # 7-zip
+    b"Rar!\x1a\x07",        # rar
+    b"\x28\xb5\x2f\xfd",    # zstd
+    b"\x89PNG\r\n\x1a\n",   # png
+    b"\xff\xd8\xff",        # jpeg
+    b"GIF8",                # gif
+    b"ID3",                 # mp3
+)
+
+# Zip record layouts
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<4sHHHHIIH")
+ZIP64_END_RECORD = struct.Struct("<4sQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<4sIQI")
+DESCRIPTOR_32 = struct.Struct("<4sIII")
+DESCRIPTOR_64 = struct.Struct("<4sIQQ")
+
+LOCAL_SIG = b"PK\x03\x04"
+CENTRAL_SIG = b"PK\x01\x02"
+END_SIG = b"PK\x05\x06"
+ZIP64_END_SIG = b"PK\x06\x06"
+ZIP64_LOCATOR_SIG = b"PK\x06\x07"
+DESCRIPTOR_SIG = b"PK\x07\x08"
+
+ZIP32_LIMIT = 0xFFFFFFFF
+ZIP64_ENTRY_THRESHOLD = 0xFFFFFFFF - 64 * 1024 * 1024  # Leave room for deflate expansion
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+CREATE_SYSTEM_UNIX = 3
+
+def dos_date_time(mtime: float) -> Tuple[int, int]:
+    """Convert a POSIX mtime to (dos_time, dos_date)"""
+    t = time.localtime(max(mtime, 315532800))  # 1980-01-01
+    year = min(max(t.tm_year, 1980), 2107)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+def file_type_key(name: str) -> str:
+    """Stats bucket for a file: its lowercased extension, or '(none)'"""
+    suffix = Path(name).suffix.lower()
+    return suffix if suffix else "(none)"
+
+def is_excluded(relative_path: str, patterns: Iterable[str]) -> bool:
+    """Match a POSIX relative path against zip -x style patterns ('*' spans '/')"""
+    return compile_exclusions(patterns).excludes(relative_path)
+
+def looks_compressed(head: bytes) -> bool:
+    """Check leading bytes for an already-compressed container format"""
+    if any(head.startswith(magic) for magic in COMPRESSED_MAGIC):
+        return True
+    # ISO media (mp4/mov/m4a/heic): 'ftyp' box at offset 4
+    return len(head) >= 8 and head[4:8] == b"ftyp"
+
+def deflate_worthwhile(sample: bytes) -> bool:
+    """Quick compressibility check: does a fast deflate of the sample save enough?"""
+    if not sample:
+        return False
+    compressed = zlib.compress(sample, 1)
+    return len(compressed) <= len(sample) * (1 - MIN_DEFLATE_GAIN)
+
+def choose_method(name: str, head: bytes, sample: bytes = None) -> int:
+    """Pick STORED or DEFLATED from extension, magic bytes and a compressibility sample"""
+    if Path(name).suffix.lower() in STORE_EXTENSIONS or looks_compressed(head):
+        return ZIP_STORED
+    return ZIP_DEFLATED if deflate_worthwhile(sample if sample is not None else head) else ZIP_STORED
+
+# === CONTENT DIGESTS ===
+# A file's digest is BLAKE2b over its 4 MiB blocks: one block hashes directly, larger
+# files hash the concatenated block digests. Blocks compressed in different processes
+# can then be hashed where they are read instead of rereading the file.
+
+def block_digest(data: bytes) -> bytes:
+    return hashlib.blake2b(data, digest_size=32).digest()
+
+def combine_digests(block_digests: List[bytes]) -> str:
+    """File digest (hex) from its block digests in order"""
+    if not block_digests:
+        return block_digest(b"").hex()
+    if len(block_digests) == 1:
+        return block_digests[0].hex()
+    return hashlib.blake2b(b"".join(block_digests), digest_size=32).hexdigest()
+
+class ContentDigest:
+    """Incremental file digest fed with arbitrarily sized chunks"""
+
+    def __init__(self):
+        self._blocks: List[bytes] = []
+        self._hasher = hashlib.blake2b(digest_size=32)
+        self._filled = 0
+
+    def update(self, data: bytes):
+        view = memoryview(data)
+        while view:
+            take = min(len(view), DIGEST_BLOCK_SIZE - self._filled)
+            self._hasher.update(view[:take])
+            self._filled += take
+            view = view[take:]
+            if self._filled == DIGEST_BLOCK_SIZE:
+                self._blocks.append(self._hasher.digest())
+                self._hasher = hashlib.blake2b(digest_size=32)
+                self._filled = 0
+
+    def hexdigest(self) -> str:
+        blocks = self._blocks + ([self._hasher.digest()] if self._filled or not self._blocks else [])
+        return combine_digests(blocks)
+
+def file_digest(path: Path) -> str:
+    """Content digest of a file on disk"""
+    digest = ContentDigest()
+    with open_source(path) as f:
+        for chunk in read_chunks(f):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ArchiveEntry:
+    """Central-directory record for one written entry"""
+
+    __slots__ = ("name", "offset", "data_offset", "crc", "compress_size", "file_size", "method",
+                 "dos_time", "dos_date", "external_attr", "flags", "zip64_local", "mtime")
+
+    def __init__(self, name: str, offset: int, method: int, dos_time: int, dos_date: int,
+                 external_attr: int, flags: int, zip64_local: bool):
+        self.name = name
+        self.offset = offset
+        self.method = method
+        self.dos_time = dos_time
+        self.dos_date = dos_date
+        self.external_attr = external_attr
+        self.flags = flags
+        self.zip64_local = zip64_local
+        self.data_offset = offset
+        self.crc = 0
+        self.compress_size = 0
+        self.file_size = 0
+        self.mtime = 0.0
+
+    @property
+    def is_dir(self) -> bool:
+        return self.name.endswith("/")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ArchiveEntry":
+        entry = cls(data["name"], data["offset"], data["method"], data["dos_time"],
+                    data["dos_date"], data["external_attr"], data["flags"], data["zip64_local"])
+        entry.crc = data["crc"]
+        entry.compress_size = data["compress_size"]
+        entry.file_size = data["file_size"]
+        entry.data_offset = data.get("data_offset", entry.offset)
+        entry.mtime = data.get("mtime", 0.0)
+        return entry
+
+class ArchiveStats:
+    """Bytes in/out per file type for a backup run"""
+
+    def __init__(self):
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self.skipped: List[str] = []
+        self.changed: List[str] = []  # Files whose size changed while they were read
+
+    def record(self, name: str, bytes_in: int, bytes_out: int, method: int):
+        bucket = self.by_type.setdefault(file_type_key(name), {
+            "files": 0, "stored": 0, "bytes_in": 0, "bytes_out": 0,
+        })
+        bucket["files"] += 1
+        bucket["stored"] += method == ZIP_STORED
+        bucket["bytes_in"] += bytes_in
+        bucket["bytes_out"] += bytes_out
+
+    def reassign(self, entry: "ArchiveEntry", parts: List[Tuple[str, int]], method: int = ZIP_DEFLATED):
+        """Count a written container entry (a solid block) as the files packed into it
+
+        The entry's compressed bytes are shared out in proportion to each part's size,
+        so per-type ratios stay meaningful when small files are packed.
+        """
+        key = file_type_key(entry.name)
+        bucket = self.by_type[key]
+        bucket["files"] -= 1
+        bucket["stored"] -= entry.method == ZIP_STORED
+        bucket["bytes_in"] -= entry.file_size
+        bucket["bytes_out"] -= entry.compress_size
+        if not bucket["files"]:
+            del self.by_type[key]
+        total = sum(size for _name, size in parts) or 1
+        for name, size in parts:
+            self.record(name, size, entry.compress_size * size // total, method)
+
+    @property
+    def files(self) -> int:
+        return sum(bucket["files"] for bucket in self.by_type.values())
+
+    @property
+    def bytes_in(self) -> int:
+        return sum(bucket["bytes_in"] for bucket in self.by_type.values())
+
+    @property
+    def bytes_out(self) -> int:
+        return sum(bucket["bytes_out"] for bucket in self.by_type.values())
+
+    def report_lines(self, limit: int = 15) -> List[str]:
+        """Human-readable per-type summary, largest types first"""
+        lines = [f"   {'type':<10} {'files':>7} {'stored':>7} {'MB in':>10} {'MB out':>10} {'ratio':>6}"]
+        ordered = sorted(self.by_type.items(), key=lambda item: item[1]["bytes_in"], reverse=True)
+        for ext, bucket in ordered[:limit]:
+            ratio = bucket["bytes_out"] / bucket["bytes_in"] if bucket["bytes_in"] else 1.0
+            lines.append(
+                f"   {ext:<10} {bucket['files']:>7} {bucket['stored']:>7} "
+                f"{bucket['bytes_in'] / 1024**2:>10.1f} {bucket['bytes_out'] / 1024**2:>10.1f} {ratio:>6.2f}"
+            )
+        if len(ordered) > limit:
+            lines.append(f"   ... and {len(ordered) - limit} more types")
+        total_ratio = self.bytes_out / self.bytes_in if self.bytes_in else 1.0
+        lines.append(
+            f"   {'TOTAL':<10} {self.files:>7} {'':>7} "
+            f"{self.bytes_in / 1024**2:>10.1f} {self.bytes_out / 1024**2:>10.1f} {total_ratio:>6.2f}"
+        )
+        return lines
+
+class ZipArchiveWriter:
+    """Streaming ZIP64 writer
+
+    Every entry is written with a data descriptor, so the output never needs to be
+    seekable and memory use is bounded by READ_SIZE regardless of file size.
+    """
+
+    def __init__(self, fileobj, compresslevel: int = DEFAULT_COMPRESSLEVEL, offset: int = 0):
+        self.fp = fileobj
+        self.compresslevel = compresslevel
+        self.offset = offset
+        self.entries: List[ArchiveEntry] = []
+        self.digests: Dict[str, str] = {}  # arcname -> content digest of each file entry
+        self.stats = ArchiveStats()
+        self.on_entry: Optional[Callable[["ZipArchiveWriter"], None]] = None  # After each entry
+        self.before_entry: Optional[Callable[["ZipArchiveWriter", int], None]] = None  # Before each, with its size hint
+        self.preamble: List[Tuple[str, bytes]] = []  # Entries repeated at the start of each restart()
+        self.packed: Dict[str, dict] = {}  # Solid block name -> its member table (see solid_pack)
+        self._names = set()
+        self.closed = False
+
+    @classmethod
+    def resume(cls, fileobj, offset: int, entries: List[ArchiveEntry], digests: Dict[str, str],
+               compresslevel: int = DEFAULT_COMPRESSLEVEL) -> "ZipArchiveWriter":
+        """Continue a partially written archive after its last checkpoint
+
+        fileobj must be open for update; everything after `offset` is discarded. Entries
+        left out of `entries` stay in the file as unreferenced bytes.
+        """
+        fileobj.seek(offset)
+        fileobj.truncate()
+        writer = cls(fileobj, compresslevel, offset)
+        for entry in entries:
+            writer.entries.append(entry)
+            writer._names.add(entry.name)
+            if not entry.is_dir:
+                writer.stats.record(entry.name, entry.file_size, entry.compress_size, entry.method)
+        writer.digests.update((name, digests[name]) for name in writer._names if name in digests)
+        return writer
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+
+    def _write(self, data: bytes):
+        self.fp.write(data)
+        self.offset += len(data)
+
+    def _begin_entry(self, name: str, method: int, mtime: float, mode: int,
+                     size_hint: Optional[int]) -> ArchiveEntry:
+        if self.closed:
+            raise ValueError("Archive is closed")
+        if name in self._names:
+            raise ValueError(f"Duplicate archive entry: {name}")
+        if self.before_entry is not None:
+            self.before_entry(self, size_hint or 0)
+
+        encoded = name.encode("utf-8")
+        flags = FLAG_DATA_DESCRIPTOR | (0 if encoded.isascii() else FLAG_UTF8)
+        zip64 = size_hint is None or size_hint > ZIP64_ENTRY_THRESHOLD
+        dos_time, dos_date = dos_date_time(mtime)
+        entry = ArchiveEntry(name, self.offset, method, dos_time, dos_date,
+                             (mode & 0xFFFF) << 16, flags, zip64)
+        entry.mtime = mtime
+
+        if zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            sizes = (ZIP32_LIMIT, ZIP32_LIMIT)
+        else:
+            extra = b""
+            sizes = (0, 0)
+        self._write(LOCAL_HEADER.pack(
+            LOCAL_SIG, VERSION_ZIP64 if zip64 else VERSION_DEFAULT, flags, method,
+            dos_time, dos_date, 0, sizes[0], sizes[1], len(encoded), len(extra),
+        ))
+        self._write(encoded)
+        self._write(extra)
+        entry.data_offset = self.offset
+        return entry
+
+    def _finish_entry(self, entry: ArchiveEntry, crc: int, compress_size: int, file_size: int):
+        entry.crc = crc
+        entry.compress_size = compress_size
+        entry.file_size = file_size
+        if entry.zip64_local:
+            self._write(DESCRIPTOR_64.pack(DESCRIPTOR_SIG, crc, compress_size, file_size))
+        else:
+            self._write(DESCRIPTOR_32.pack(DESCRIPTOR_SIG, crc, compress_size, file_size))
+        self.entries.append(entry)
+        self._names.add(entry.name)
+        if not entry.is_dir:
+            self.stats.record(entry.name, file_size, compress_size, entry.method)
+
+    def _entry_done(self):
+        if self.on_entry is not None:
+            self.on_entry(self)
+
+    def add_directory(self, arcname: str, mtime: float = None, mode: int = 0o40755) -> ArchiveEntry:
+        """Add an empty directory entry (name gets a trailing '/')"""
+        arcname = arcname.rstrip("/") + "/"
+        entry = self._begin_entry(arcname, ZIP_STORED, time.time() if mtime is None else mtime,
+                                  mode | stat_module.S_IFDIR, 0)
+        entry.external_attr |= 0x10  # MS-DOS directory bit
+        self._finish_entry(entry, 0, 0, 0)
+        self._entry_done()
+        return entry
+
+    def add_stream(self, arcname: str, chunks: Iterable[bytes], method: int = ZIP_DEFLATED,
+                   mtime: float = None, mode: int = 0o100644,
+                   size_hint: Optional[int] = None) -> ArchiveEntry:
+        """Add an entry from an iterable of uncompressed chunks"""
+        entry = self._begin_entry(arcname, method, time.time() if mtime is None else mtime,
+                                  mode, size_hint)
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        compressor = (zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+                      if method == ZIP_DEFLATED else None)
+        digest = ContentDigest()
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            crc = zlib.crc32(chunk, crc)
+            digest.update(chunk)
+            file_size += len(chunk)
+            data = compressor.compress(chunk) if compressor else chunk
+            if data:
+                self._write(data)
+                compress_size += len(data)
+
+        if compressor:
+            data = compressor.flush()
+            self._write(data)
+            compress_size += len(data)
+
+        self._finish_entry(entry, crc, compress_size, file_size)
+        self.digests[arcname] = digest.hexdigest()
+        self._entry_done()
+        return entry
+
+    def add_bytes(self, arcname: str, data: bytes, method: int = None,
+                  mtime: float = None, mode: int = 0o100644) -> ArchiveEntry:
+        """Add an in-memory entry, choosing the method automatically when not given"""
+        if method is None:
+            method = choose_method(arcname, data[:SAMPLE_SIZE], data)
+        return self.add_stream(arcname, [data], method, mtime, mode, len(data))
+
+    def add_raw(self, arcname: str, compressed_chunks: Iterable[bytes], crc: int,
+                file_size: int, method: int, mtime: float = None,
+                mode: int = 0o100644, digest: str = None) -> ArchiveEntry:
+        """Add an entry whose data is already compressed with `method` (no recompression)"""
+        entry = self.open_raw_entry(arcname, method, mtime, mode, file_size)
+        for chunk in compressed_chunks:
+            self.write_raw(entry, chunk)
+        self.close_raw_entry(entry, crc, file_size, digest)
+        return entry
+
+    def open_raw_entry(self, arcname: str, method: int, mtime: float = None,
+                       mode: int = 0o100644, size_hint: Optional[int] = None) -> ArchiveEntry:
+        """Start an entry whose compressed data arrives piecewise via write_raw()"""
+        return self._begin_entry(arcname, method, time.time() if mtime is None else mtime,
+                                 mode, size_hint)
+
+    def write_raw(self, entry: ArchiveEntry, data: bytes):
+        """Append already-compressed data to an entry opened with open_raw_entry()"""
+        self._write(data)
+
+    def close_raw_entry(self, entry: ArchiveEntry, crc: int, file_size: int, digest: str = None):
+        """Finish an entry opened with open_raw_entry() (digest: its content digest, if known)"""
+        self._finish_entry(entry, crc, self.offset - entry.data_offset, file_size)
+        if digest is not None:
+            self.digests[entry.name] = digest
+        self._entry_done()
+
+    def abandon_entry(self, entry: ArchiveEntry):
+        """Drop a partially written entry; its bytes stay in the file but are unreferenced"""
+        logger.warning(f"⚠️  Abandoned partially written entry: {entry.name}")
+
+    def add_file(self, path: Path, arcname: str, st: os.stat_result = None,
+                 method: int = None) -> ArchiveEntry:
+        """Stream a file into the archive, choosing STORED/DEFLATED per file"""
+        path = Path(path)
+        st = st or path.stat()
+
+        with open_source(path, st.st_size) as f:
+            head = f.read(SMALL_FILE_LIMIT if st.st_size <= SMALL_FILE_LIMIT else SAMPLE_SIZE)
+
+            if st.st_size <= SMALL_FILE_LIMIT:
+                # Small file: decide on the exact compressed size
+                if method is None:
+                    method = ZIP_STORED
+                    if not looks_compressed(head) and Path(arcname).suffix.lower() not in STORE_EXTENSIONS:
+                        compressed = _raw_deflate(head, self.compresslevel)
+                        if len(compressed) <= len(head) * (1 - MIN_DEFLATE_GAIN):
+                            return self.add_raw(arcname, [compressed], zlib.crc32(head), len(head),
+                                                ZIP_DEFLATED, st.st_mtime, st.st_mode,
+                                                block_digest(head).hex())
+                return self.add_stream(arcname, [head], method, st.st_mtime, st.st_mode, len(head))
+
+            if method is None:
+                # Sample the start and middle of larger files
+                f.seek(st.st_size // 2)
+                sample = head + f.read(SAMPLE_SIZE)
+                f.seek(len(head))
+                method = choose_method(arcname, head, sample)
+
+            return self.add_stream(arcname, _chain([head], read_snapshot(f, st.st_size - len(head),
+                                                                         self.stats, arcname)),
+                                   method, st.st_mtime, st.st_mode, st.st_size)
+
+    def close(self):
+        """Write the central directory and end records"""
+        if self.closed:
+            return
+        central_offset = self.offset
+
+        for entry in self.entries:
+            encoded = entry.name.encode("utf-8")
+            zip64_fields = []
+            file_size, compress_size, offset = entry.file_size, entry.compress_size, entry.offset
+            if file_size >= ZIP32_LIMIT:
+                zip64_fields.append(file_size)
+                file_size = ZIP32_LIMIT
+            if compress_size >= ZIP32_LIMIT:
+                zip64_fields.append(compress_size)
+                compress_size = ZIP32_LIMIT
+            if offset >= ZIP32_LIMIT:
+                zip64_fields.append(offset)
+                offset = ZIP32_LIMIT
+
+            extra = b""
+            if zip64_fields:
+                extra = struct.pack(f"<HH{len(zip64_fields)}Q", 0x0001, 8 * len(zip64_fields), *zip64_fields)
+            version = VERSION_ZIP64 if (zip64_fields or entry.zip64_local) else VERSION_DEFAULT
+
+            self._write(CENTRAL_HEADER.pack(
+                CENTRAL_SIG, (CREATE_SYSTEM_UNIX << 8) | version, version, entry.flags,
+                entry.method, entry.dos_time, entry.dos_date, entry.crc, compress_size,
+                file_size, len(encoded), len(extra), 0, 0, 0, entry.external_attr, offset,
+            ))
+            self._write(encoded)
+            self._write(extra)
+
+        central_size = self.offset - central_offset
+        count = len(self.entries)
+
+        if count >= 0xFFFF or central_offset >= ZIP32_LIMIT or central_size >= ZIP32_LIMIT:
+            zip64_end_offset = self.offset
+            self._write(ZIP64_END_RECORD.pack(
+                ZIP64_END_SIG, ZIP64_END_RECORD.size - 12, (CREATE_SYSTEM_UNIX << 8) | VERSION_ZIP64,
+                VERSION_ZIP64, 0, 0, count, count, central_size, central_offset,
+            ))
+            self._write(ZIP64_LOCATOR.pack(ZIP64_LOCATOR_SIG, 0, zip64_end_offset, 1))
+            count = min(count, 0xFFFF)
+            central_size = min(central_size, ZIP32_LIMIT)
+            central_offset = min(central_offset, ZIP32_LIMIT)
+
+        self._write(END_RECORD.pack(END_SIG, 0, 0, count, count, central_size, central_offset, 0))
+        self.fp.flush()
+        self.closed = True
+
+    def restart(self, fileobj):
+        """Continue as a new, empty archive in fileobj after close()
+
+        Used for split volumes: digests and stats keep accumulating across archives, and
+        the preamble entries are written first so each archive stays self-contained.
+        """
+        if not self.closed:
+            raise ValueError("Close the current archive before restarting")
+        self.fp = fileobj
+        self.offset = 0
+        self.entries = []
+        self._names = set()
+        self.closed = False
+        for name, data in list(self.preamble):
+            self.add_bytes(name, data)
+
+def _raw_deflate(data: bytes, level: int) -> bytes:
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+def read_chunks(f, size: int = READ_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = f.read(size)
+        if not chunk:
+            return
+        yield chunk
+
+def read_snapshot(f, size: int, stats: ArchiveStats, arcname: str) -> Iterator[bytes]:
+    """Read at most `size` more bytes, the rest of the file as it was stat'ed
+
+    The size hint that sized the entry's header stays true when a file grows while it
+    is being read (a log past 4 GiB would otherwise overflow a 32-bit descriptor); a
+    file that grew or shrank is recorded in stats.changed.
+    """
+    while size > 0:
+        chunk = f.read(min(READ_SIZE, size))
+        if not chunk:
+            break
+        size -= len(chunk)
+        yield chunk
+    if size or f.read(1):
+        logger.warning(f"⚠️  {arcname} changed while it was being read: archived as stat'ed")
+        stats.changed.append(arcname)
+
+def _chain(*iterables):
+    for iterable in iterables:
+        yield from iterable
+
+def iter_source_tree(source: Path, exclude_patterns: Iterable[str] = ()) -> Iterator[Tuple[str, Path, os.stat_result]]:
+    """Walk source in deterministic order, yielding (arcname, path, stat) for dirs and files
+
+    Directory arcnames end with '/'. Exclusions use zip -x semantics on the relative path
+    (see exclusions.py); fully excluded folders are not descended into.
+    """
+    return walk_tree(source, exclude_patterns)
+
+def write_tree(writer: ZipArchiveWriter, source: Path, exclude_patterns: Iterable[str] = (),
+               items: Iterable[tuple] = None) -> ArchiveStats:
+    """Add every non-excluded file and directory under source to the writer
+
+    Pass `items` (arcname, path, stat) to archive an explicit list instead of walking source.
+    """
+    if items is None:
+        items = iter_source_tree(source, exclude_patterns)
+    for arcname, path, st in items:
+        try:
+            if arcname.endswith("/"):
+                writer.add_directory(arcname, st.st_mtime, stat_module.S_IMODE(st.st_mode))
+            else:
+                writer.add_file(path, arcname, st)
+        except OSError as e:
+            # Like zip, warn and carry on when a source file can't be opened. Errors without
+            # a filename come from mid-stream reads or archive writes and are fatal.
+            if e.filename is None:
+                raise
+            logger.warning(f"⚠️  Skipping unreadable file {arcname}: {e}")
+            writer.stats.skipped.append(arcname)
+    return writer.stats
@@ -0,0 +1,127 @@
+"""
+BigSkyAg Backup Checkpoints
+Periodic checkpoints of a partially written backup archive (completed entries,
+their central-directory records and the byte offset), so an interrupted backup
+resumes where it stopped instead of starting over
+"""
+
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backup_archive import ArchiveEntry, ZipArchiveWriter
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_INTERVAL = 60                 # Seconds between checkpoints
+CHECKPOINT_BYTES = 256 * 1024 * 1024     # ...or archive bytes, whichever comes first
+RESUME_MAX_AGE = 12 * 3600               # Older partial backups are discarded, not resumed
+
+def partial_path(archive_path: Path) -> Path:
+    archive_path = Path(archive_path)
+    return archive_path.with_name(archive_path.name + ".partial")
+
+def checkpoint_path(archive_path: Path) -> Path:
+    archive_path = Path(archive_path)
+    return archive_path.with_name(archive_path.name + ".checkpoint.json")
+
+class ArchiveCheckpoint:
+    """Writes checkpoints for one archive as entries complete"""
+
+    def __init__(self, archive_path: Path, info: Dict[str, Any] = None,
+                 interval: float = None, interval_bytes: int = None):
+        self.archive_path = Path(archive_path)
+        self.path = checkpoint_path(archive_path)
+        self.info = info or {}
+        self.interval = CHECKPOINT_INTERVAL if interval is None else interval
+        self.interval_bytes = CHECKPOINT_BYTES if interval_bytes is None else interval_bytes
+        self.saved = False
+        self._last_time = time.monotonic()
+        self._last_offset = 0
+
+    def maybe_save(self, writer: ZipArchiveWriter):
+        """Entry-completed hook: checkpoint when enough time or bytes have passed"""
+        if (time.monotonic() - self._last_time >= self.interval
+                or writer.offset - self._last_offset >= self.interval_bytes):
+            self.save(writer)
+
+    def save(self, writer: ZipArchiveWriter):
+        """Make everything written so far durable, then record it"""
+        writer.fp.flush()
+        os.fsync(writer.fp.fileno())
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "archive": self.archive_path.name,
+            "info": self.info,
+            "saved": time.time(),
+            "offset": writer.offset,
+            "entries": [entry.to_dict() for entry in writer.entries],
+            "digests": writer.digests,
+        }
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.saved = True
+        self._last_time = time.monotonic()
+        self._last_offset = writer.offset
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+
+def load_checkpoint(archive_path: Path, info: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+    """A usable checkpoint for archive_path, or None
+
+    The checkpoint must match `info` (backup type and kind), be younger
+    than RESUME_MAX_AGE and describe no more bytes than the partial file holds.
+    """
+    path = checkpoint_path(archive_path)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        partial_size = partial_path(archive_path).stat().st_size
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"⚠️  Ignoring unreadable checkpoint {path.name}: {e}")
+        return None
+
+    if data.get("version") != CHECKPOINT_VERSION or data.get("info") != (info or {}):
+        return None
+    if time.time() - data.get("saved", 0) > RESUME_MAX_AGE or data["offset"] > partial_size:
+        return None
+    return data
+
+def validate_entries(checkpoint: Dict[str, Any], items: List[tuple]) -> Tuple[List[ArchiveEntry], int]:
+    """Checkpointed entries whose source still has the same size and mtime
+
+    Returns (entries to keep, number dropped). Dropped entries (changed or deleted
+    since) are written again after resuming.
+    """
+    current = {arcname: st for arcname, _path, st in items}
+    keep = []
+    dropped = 0
+    for data in checkpoint["entries"]:
+        entry = ArchiveEntry.from_dict(data)
+        st = current.get(entry.name)
+        if st is not None and (entry.is_dir or (st.st_size == entry.file_size and st.st_mtime == entry.mtime)):
+            keep.append(entry)
+        else:
+            dropped += 1
+    return keep, dropped
+
+def find_resumable(folder: Path, pattern: str) -> List[Path]:
+    """Archive paths (without .partial) of partial backups matching pattern, newest first"""
+    partials = sorted(Path(folder).glob(pattern + ".partial"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return [p.with_name(p.name[:-len(".partial")]) for p in partials]
+
+def discard_partial(archive_path: Path):
+    """Remove a partial archive and its checkpoint"""
+    partial_path(archive_path).unlink(missing_ok=True)
+    checkpoint_path(archive_path).unlink(missing_ok=True)
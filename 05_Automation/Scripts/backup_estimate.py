@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Backup Estimator
+Predicts a backup's compressed size and duration before it starts, from the
+compression ratio each file type achieved and the throughput recorded in earlier
+runs, and warns when free space or the backup window look too small
+"""
+
+import json
+import os
+import shutil
+import sys
+import time
+import logging
+from pathlib import Path
+from statistics import median
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backup_archive import STORE_EXTENSIONS, ArchiveStats, file_type_key, iter_source_tree
+
+logger = logging.getLogger(__name__)
+
+HISTORY_VERSION = 1
+HISTORY_RUNS = 20            # Throughput records kept
+HISTORY_DECAY = 0.7          # Weight of older runs when a new one is folded into the type ratios
+DEFAULT_RATIO = 0.6          # Compressed/original for types never seen before
+DEFAULT_RATE_MBPS = 40.0     # Throughput assumed until a run has been recorded
+RATE_MIN_BYTES = 64 * 1024 * 1024  # Smaller runs are mostly fixed overhead: not used for throughput
+SPACE_MARGIN = 1.1           # Free space wanted relative to the estimated archive size
+SHRINK_WARNING = 0.5         # A backup below this share of its estimate is suspicious
+FORECAST_RUNS = 3            # Recent runs of a type whose largest output forecasts the next one
+
+def run_mode(stream: bool, volume_size_mb: int) -> str:
+    """Throughput is recorded per mode: streaming and volumes run at different speeds"""
+    return "stream" if stream else "volumes" if volume_size_mb else "local"
+
+def history_path(state_dir: Path, backup_prefix: str) -> Path:
+    """Throughput and ratio history for a backup prefix (kept outside the mirrored tree)"""
+    return Path(state_dir) / "estimates" / f"{backup_prefix}.json"
+
+class EstimateHistory:
+    """Per-type compression totals and recent run throughput"""
+
+    def __init__(self, types: Dict[str, List[float]] = None, runs: List[dict] = None):
+        self.types = types or {}   # type -> [bytes_in, bytes_out], decayed across runs
+        self.runs = runs or []     # newest last
+
+    @classmethod
+    def load(cls, path: Path) -> "EstimateHistory":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable estimate history {path}: {e}")
+            return cls()
+        if data.get("version") != HISTORY_VERSION:
+            return cls()
+        return cls(data.get("types"), data.get("runs"))
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": HISTORY_VERSION, "types": self.types, "runs": self.runs}, f,
+                      separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def ratio(self, key: str) -> float:
+        """Expected compressed/original size for a file type"""
+        if key in self.types and self.types[key][0] > 0:
+            return self.types[key][1] / self.types[key][0]
+        if key in STORE_EXTENSIONS:
+            return 1.0
+        bytes_in = sum(totals[0] for totals in self.types.values())
+        bytes_out = sum(totals[1] for totals in self.types.values())
+        return bytes_out / bytes_in if bytes_in else DEFAULT_RATIO
+
+    def rate(self, mode: str = None) -> Optional[float]:
+        """Median MB/s of recent runs (of the same mode when there are any), or None"""
+        runs = [run for run in self.runs if run["seconds"] > 0 and run["bytes_in"] >= RATE_MIN_BYTES]
+        same = [run for run in runs if run.get("mode") == mode]
+        runs = same or runs
+        if not runs:
+            return None
+        return median(run["bytes_in"] / (1024**2) / run["seconds"] for run in runs)
+
+    def record(self, stats: ArchiveStats, seconds: float, mode: str, backup_type: str, kind: str):
+        """Fold a finished backup's per-type stats and throughput into the history"""
+        for key in self.types:
+            self.types[key] = [value * HISTORY_DECAY for value in self.types[key]]
+        for key, bucket in stats.by_type.items():
+            totals = self.types.setdefault(key, [0.0, 0.0])
+            totals[0] += bucket["bytes_in"]
+            totals[1] += bucket["bytes_out"]
+        self.runs.append({"time": time.time(), "backup_type": backup_type, "kind": kind, "mode": mode,
+                          "files": stats.files, "bytes_in": stats.bytes_in, "bytes_out": stats.bytes_out,
+                          "seconds": round(seconds, 2)})
+        self.runs = self.runs[-HISTORY_RUNS:]
+
+def forecast_bytes(history: EstimateHistory, backup_type: str, kind: str) -> Optional[int]:
+    """Space the next backup of a type needs, from its largest recent run (or that of any
+    run of the same kind), with SPACE_MARGIN; None without history"""
+    runs = [run for run in history.runs if run.get("backup_type") == backup_type]
+    runs = runs or [run for run in history.runs if run.get("kind") == kind]
+    if not runs:
+        return None
+    return int(max(run["bytes_out"] for run in runs[-FORECAST_RUNS:]) * SPACE_MARGIN)
+
+class BackupEstimate:
+    """Predicted size and duration of one backup"""
+
+    def __init__(self, by_type: Dict[str, List[float]], rate_mbps: float, from_history: bool):
+        self.by_type = by_type     # type -> [files, bytes_in, estimated bytes_out]
+        self.rate_mbps = rate_mbps
+        self.from_history = from_history
+
+    @property
+    def files(self) -> int:
+        return int(sum(values[0] for values in self.by_type.values()))
+
+    @property
+    def bytes_in(self) -> int:
+        return int(sum(values[1] for values in self.by_type.values()))
+
+    @property
+    def bytes_out(self) -> int:
+        return int(sum(values[2] for values in self.by_type.values()))
+
+    @property
+    def seconds(self) -> float:
+        return self.bytes_in / (1024**2) / self.rate_mbps
+
+    def report_lines(self, limit: int = 10) -> List[str]:
+        lines = [f"   {'type':<10} {'files':>7} {'MB in':>10} {'est. MB':>10}"]
+        ordered = sorted(self.by_type.items(), key=lambda item: item[1][1], reverse=True)
+        for key, (files, bytes_in, bytes_out) in ordered[:limit]:
+            lines.append(f"   {key:<10} {int(files):>7} {bytes_in / 1024**2:>10.1f} {bytes_out / 1024**2:>10.1f}")
+        if len(ordered) > limit:
+            lines.append(f"   ... and {len(ordered) - limit} more types")
+        lines.append(f"   {'TOTAL':<10} {self.files:>7} {self.bytes_in / 1024**2:>10.1f} {self.bytes_out / 1024**2:>10.1f}")
+        return lines
+
+def estimate_backup(files: Iterable[Tuple[str, int]], history: EstimateHistory, mode: str = None) -> BackupEstimate:
+    """Estimate a backup of (arcname, size) files from the history"""
+    by_type: Dict[str, List[float]] = {}
+    for arcname, size in files:
+        key = file_type_key(arcname)
+        values = by_type.setdefault(key, [0, 0, 0.0])
+        values[0] += 1
+        values[1] += size
+    for key, values in by_type.items():
+        values[2] = values[1] * history.ratio(key)
+    rate = history.rate(mode)
+    return BackupEstimate(by_type, rate or DEFAULT_RATE_MBPS, rate is not None)
+
+def check_estimate(estimate: BackupEstimate, backup_folder: Optional[Path], window_minutes: float = 0) -> List[str]:
+    """Warnings for an estimate: not enough free space in backup_folder (None when
+    nothing is written locally) or longer than the backup window (0 = no window)"""
+    warnings = []
+    if backup_folder is not None:
+        free = shutil.disk_usage(backup_folder).free
+        if free < estimate.bytes_out * SPACE_MARGIN:
+            warnings.append(f"Only {round(free / (1024**3), 2)} GB free in {backup_folder}, "
+                            f"the backup needs about {round(estimate.bytes_out / (1024**3), 2)} GB")
+    if window_minutes and estimate.seconds > window_minutes * 60:
+        warnings.append(f"The backup will take about {round(estimate.seconds / 60)} minutes, "
+                        f"longer than the {window_minutes}-minute backup window")
+    return warnings
+
+def size_warning(estimate: BackupEstimate, actual_bytes: int) -> Optional[str]:
+    """Warning when a finished backup came out far smaller than estimated, or None"""
+    if estimate.from_history and actual_bytes < estimate.bytes_out * SHRINK_WARNING:
+        return (f"Backup is {round(actual_bytes / (1024**3), 2)} GB, far below the estimated "
+                f"{round(estimate.bytes_out / (1024**3), 2)} GB: files may have been skipped")
+    return None
+
+def report_estimate(estimate: BackupEstimate, warnings: List[str]):
+    basis = "from recent backups" if estimate.from_history else "assumed until backups are recorded"
+    print(f"🔮 Estimate: {estimate.files} files, {round(estimate.bytes_in / (1024**3), 2)} GB → "
+          f"about {round(estimate.bytes_out / (1024**3), 2)} GB in {round(estimate.seconds / 60, 1)} minutes "
+          f"at {round(estimate.rate_mbps, 1)} MB/s ({basis})")
+    for warning in warnings:
+        print(f"⚠️  {warning}")
+
+def main():
+    """Estimate the next backup without running it"""
+    import argparse
+    from backup_manifest import METADATA_DIR, FileManifest, manifest_path
+    from config import BACKUP_CONFIG, STATE_DIR, STORAGE_CONFIG, get_folder_path
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Estimate the size and duration of a BigSkyAg backup")
+    parser.add_argument("backup_type", nargs="?", choices=list(BACKUP_CONFIG["backup_types"]),
+                        help="Backup type (default: chosen by date, like create_backup_zip.py)")
+    args = parser.parse_args()
+
+    from create_backup_zip import backup_kind, backup_mode, select_backup_type
+    backup_type = args.backup_type or select_backup_type(BACKUP_CONFIG)
+    source = get_folder_path("automation").parent
+    backup_prefix = STORAGE_CONFIG["backup_prefix"]
+    exclude_patterns = list(BACKUP_CONFIG["exclude_patterns"]) + [METADATA_DIR + "*"]
+
+    start_time = time.time()
+    files = [(arcname, st) for arcname, _path, st in iter_source_tree(source, exclude_patterns)
+             if not arcname.endswith("/")]
+    previous = FileManifest.load(manifest_path(STATE_DIR, backup_prefix))
+    if backup_kind(BACKUP_CONFIG, backup_type) == "incremental" and previous is not None:
+        # Without rehashing, touched-but-identical files count as changed: an upper bound
+        files = [(arcname, st) for arcname, st in files
+                 if arcname not in previous.entries or not previous.entries[arcname].same_stat(st)]
+    print(f"🔍 Scanned {source} in {round(time.time() - start_time, 2)} seconds")
+
+    history = EstimateHistory.load(history_path(STATE_DIR, backup_prefix))
+    stream, keep_local, volume_size_mb = backup_mode(BACKUP_CONFIG)
+    estimate = estimate_backup(((arcname, st.st_size) for arcname, st in files), history,
+                               run_mode(stream, volume_size_mb))
+    print(f"📦 Next {backup_type} backup:")
+    for line in estimate.report_lines():
+        print(line)
+    warnings = check_estimate(estimate, get_folder_path("backups") if keep_local else None,
+                              BACKUP_CONFIG.get("backup_window_minutes") or 0)
+    report_estimate(estimate, warnings)
+    return not warnings
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,300 @@
+"""
+BigSkyAg Backup Manifest
+Per-file state (size, mtime, inode, content digest) recorded after each backup, so
+incremental backups archive only what changed since the previous one, and the
+per-archive manifest (digest and offset of every entry) used to verify a backup
+and restore single files without scanning it
+"""
+
+import gzip
+import json
+import logging
+import os
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backup_archive import ZipArchiveWriter, file_digest
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+ARCHIVE_MANIFEST_VERSION = 1
+
+# Metadata entries written into every archive (never collide with the source tree)
+METADATA_DIR = ".bigsky/"
+BACKUP_INFO_NAME = METADATA_DIR + "backup.json"
+DELETED_LIST_NAME = METADATA_DIR + "deleted.txt"
+ARCHIVE_MANIFEST_NAME = METADATA_DIR + "manifest.json"
+VOLUME_INFO_NAME = METADATA_DIR + "volume.json"
+
+def manifest_path(state_dir: Path, backup_prefix: str) -> Path:
+    """Location of the latest manifest for a backup prefix (kept outside the mirrored tree)"""
+    return Path(state_dir) / "manifests" / f"{backup_prefix}.json.gz"
+
+class ManifestEntry:
+    """Recorded state of one file or directory (directories have no digest)"""
+
+    __slots__ = ("size", "mtime_ns", "inode", "digest")
+
+    def __init__(self, size: int, mtime_ns: int, inode: int, digest: Optional[str] = None):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.inode = inode
+        self.digest = digest
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result, digest: Optional[str] = None) -> "ManifestEntry":
+        return cls(st.st_size, st.st_mtime_ns, st.st_ino, digest)
+
+    def same_stat(self, st: os.stat_result) -> bool:
+        return (self.size == st.st_size and self.mtime_ns == st.st_mtime_ns
+                and self.inode == st.st_ino)
+
+    def to_list(self) -> list:
+        return [self.size, self.mtime_ns, self.inode, self.digest]
+
+    @classmethod
+    def from_list(cls, data: list) -> "ManifestEntry":
+        return cls(*data)
+
+class BackupPlan:
+    """What a backup must archive, relative to the previous manifest"""
+
+    __slots__ = ("items", "carried", "deleted", "rehashed")
+
+    def __init__(self, items: List[tuple], carried: Dict[str, ManifestEntry],
+                 deleted: List[str], rehashed: int = 0):
+        self.items = items        # (arcname, path, stat) to write to the archive
+        self.carried = carried    # Unchanged entries, already refreshed to the current stat
+        self.deleted = deleted    # Paths present last time and gone now
+        self.rehashed = rehashed  # Files whose stat changed but content did not
+
+    @classmethod
+    def full(cls, items: List[tuple]) -> "BackupPlan":
+        return cls(list(items), {}, [])
+
+class FileManifest:
+    """Snapshot of the backed-up tree as of one backup"""
+
+    def __init__(self, entries: Dict[str, ManifestEntry] = None, backup_type: str = None,
+                 archive: str = None, full_archive: str = None, created: float = None):
+        self.entries = entries or {}
+        self.backup_type = backup_type
+        self.archive = archive            # Archive written by the backup that produced this manifest
+        self.full_archive = full_archive  # Most recent full backup the chain starts from
+        self.created = created
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["FileManifest"]:
+        """Load a manifest, or None when missing or unreadable (forcing a full backup)"""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable backup manifest {path}: {e}")
+            return None
+
+        if data.get("version") != MANIFEST_VERSION:
+            logger.warning(f"⚠️  Ignoring backup manifest with unknown version: {path}")
+            return None
+        entries = {name: ManifestEntry.from_list(item) for name, item in data["entries"].items()}
+        return cls(entries, data.get("backup_type"), data.get("archive"),
+                   data.get("full_archive"), data.get("created"))
+
+    def save(self, path: Path):
+        """Write the manifest atomically"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": MANIFEST_VERSION,
+            "backup_type": self.backup_type,
+            "archive": self.archive,
+            "full_archive": self.full_archive,
+            "created": self.created,
+            "entries": {name: entry.to_list() for name, entry in self.entries.items()},
+        }
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def plan_incremental(self, items: Iterable[tuple]) -> BackupPlan:
+        """Compare a fresh scan against this manifest
+
+        Files with an unchanged (size, mtime, inode) are carried over without being read.
+        When only mtime/inode moved (a re-copied mirror, a touch) the file is rehashed and
+        carried over if its digest still matches. Directories are archived only when new.
+        """
+        to_archive = []
+        carried = {}
+        seen = set()
+        rehashed = 0
+
+        for arcname, path, st in items:
+            seen.add(arcname)
+            previous = self.entries.get(arcname)
+            if previous is None:
+                to_archive.append((arcname, path, st))
+                continue
+
+            if arcname.endswith("/"):
+                carried[arcname] = ManifestEntry.from_stat(st)
+                continue
+
+            if previous.same_stat(st):
+                carried[arcname] = ManifestEntry.from_stat(st, previous.digest)
+                continue
+
+            if previous.size == st.st_size and previous.digest:
+                try:
+                    if file_digest(path) == previous.digest:
+                        carried[arcname] = ManifestEntry.from_stat(st, previous.digest)
+                        rehashed += 1
+                        continue
+                except OSError:
+                    pass  # Let the archive writer report it
+            to_archive.append((arcname, path, st))
+
+        deleted = sorted(name for name in self.entries if name not in seen)
+        return BackupPlan(to_archive, carried, deleted, rehashed)
+
+    @classmethod
+    def after_backup(cls, plan: BackupPlan, digests: Dict[str, str], backup_type: str,
+                     archive: str, full_archive: str) -> "FileManifest":
+        """Manifest describing the tree once `plan` has been archived
+
+        Files the writer skipped (no digest) are left out, so the next backup retries them.
+        """
+        entries = dict(plan.carried)
+        for arcname, _path, st in plan.items:
+            if arcname.endswith("/"):
+                entries[arcname] = ManifestEntry.from_stat(st)
+            elif arcname in digests:
+                entries[arcname] = ManifestEntry.from_stat(st, digests[arcname])
+        return cls(entries, backup_type, archive, full_archive, time.time())
+
+def backup_metadata(plan: BackupPlan, backup_type: str, kind: str,
+                    previous: Optional[FileManifest]) -> List[Tuple[str, bytes]]:
+    """Metadata entries (name, data) stored inside the archive"""
+    info = {
+        "backup_type": backup_type,
+        "kind": kind,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "files": sum(1 for arcname, _, _ in plan.items if not arcname.endswith("/")),
+        "deleted": len(plan.deleted),
+    }
+    if kind == "incremental" and previous is not None:
+        info["previous_archive"] = previous.archive
+        info["full_archive"] = previous.full_archive
+
+    entries = [(BACKUP_INFO_NAME, json.dumps(info, indent=2).encode("utf-8"))]
+    if kind == "incremental":
+        entries.append((DELETED_LIST_NAME, "".join(f"{name}\n" for name in plan.deleted).encode("utf-8")))
+    return entries
+
+# === PER-ARCHIVE MANIFEST ===
+
+def manifest_sidecar(archive_path: Path) -> Path:
+    """Manifest file stored next to an archive"""
+    archive_path = Path(archive_path)
+    return archive_path.with_name(f"{archive_path.name}.manifest.json.gz")
+
+class ArchiveManifestEntry:
+    """Where one file lives inside an archive and what its content should hash to"""
+
+    __slots__ = ("name", "size", "mtime", "digest", "offset", "data_offset",
+                 "compress_size", "method", "crc")
+
+    def __init__(self, name: str, size: int, mtime: float, digest: str, offset: int,
+                 data_offset: int, compress_size: int, method: int, crc: int):
+        self.name = name
+        self.size = size
+        self.mtime = mtime
+        self.digest = digest
+        self.offset = offset            # Local header
+        self.data_offset = offset if data_offset is None else data_offset
+        self.compress_size = compress_size
+        self.method = method
+        self.crc = crc
+
+    def to_list(self) -> list:
+        return [getattr(self, slot) for slot in self.__slots__]
+
+    @classmethod
+    def from_list(cls, data: list) -> "ArchiveManifestEntry":
+        return cls(*data)
+
+class ArchiveManifest:
+    """Digest and offsets of every file entry in one backup archive"""
+
+    def __init__(self, archive: str, entries: List[ArchiveManifestEntry]):
+        self.archive = archive
+        self.entries = entries
+        self._by_name = {entry.name: entry for entry in entries}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, name: str) -> Optional[ArchiveManifestEntry]:
+        return self._by_name.get(name)
+
+    @classmethod
+    def from_writer(cls, writer: ZipArchiveWriter, archive: str) -> "ArchiveManifest":
+        """Manifest of everything written so far (file entries with a known digest)"""
+        entries = [
+            ArchiveManifestEntry(entry.name, entry.file_size, entry.mtime, writer.digests[entry.name],
+                                 entry.offset, entry.data_offset, entry.compress_size, entry.method,
+                                 entry.crc)
+            for entry in writer.entries
+            if not entry.is_dir and entry.name in writer.digests
+        ]
+        return cls(archive, entries)
+
+    def to_bytes(self) -> bytes:
+        data = {
+            "version": ARCHIVE_MANIFEST_VERSION,
+            "archive": self.archive,
+            "fields": list(ArchiveManifestEntry.__slots__),
+            "entries": [entry.to_list() for entry in self.entries],
+        }
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "ArchiveManifest":
+        data = json.loads(raw)
+        if data.get("version") != ARCHIVE_MANIFEST_VERSION:
+            raise ValueError(f"Unsupported archive manifest version: {data.get('version')}")
+        return cls(data["archive"], [ArchiveManifestEntry.from_list(item) for item in data["entries"]])
+
+    def save_sidecar(self, archive_path: Path):
+        """Write the manifest next to the archive (atomically)"""
+        path = manifest_sidecar(archive_path)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(gzip.compress(self.to_bytes()))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, archive_path: Path) -> Optional["ArchiveManifest"]:
+        """Load an archive's manifest from its sidecar, else from inside the archive
+
+        Returns None for archives written before manifests existed.
+        """
+        archive_path = Path(archive_path)
+        try:
+            with open(manifest_sidecar(archive_path), "rb") as f:
+                return cls.from_bytes(gzip.decompress(f.read()))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable manifest for {archive_path.name}: {e}")
+
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                return cls.from_bytes(zf.read(ARCHIVE_MANIFEST_NAME))
+        except KeyError:
+            return None
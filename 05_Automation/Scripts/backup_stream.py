@@ -0,0 +1,159 @@
+"""
+BigSkyAg Streaming Backup Pipeline
+Feeds the archive writer's output through a bounded in-memory pipe straight into
+a storage provider's multipart/resumable upload, optionally teeing a local copy
+"""
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PIPE_CHUNK = 1024 * 1024   # Bytes per queued chunk
+PIPE_DEPTH = 16            # Queued chunks (bounds pipe memory to about 16 MiB)
+_EOF = object()
+
+class PipeCancelled(IOError):
+    """The reading side gave up; the writing side should stop"""
+
+class BoundedPipe:
+    """One-writer, one-reader byte pipe; the writer blocks while the pipe is full
+
+    The write side looks like a write-only file (write/flush/close) so the archive
+    writer can target it; the read side has read() for upload clients.
+    """
+
+    def __init__(self, depth: int = PIPE_DEPTH, chunk_size: int = PIPE_CHUNK):
+        self.chunk_size = chunk_size
+        self.bytes_written = 0
+        self._queue = queue.Queue(maxsize=depth)
+        self._pending = bytearray()
+        self._buffer = b""
+        self._eof = False
+        self._error: Optional[BaseException] = None
+        self._cancelled = threading.Event()
+
+    # --- write side ---
+
+    def _put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise PipeCancelled("Upload stopped reading the backup stream")
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data: bytes) -> int:
+        self._pending += data
+        self.bytes_written += len(data)
+        while len(self._pending) >= self.chunk_size:
+            self._put(bytes(self._pending[:self.chunk_size]))
+            del self._pending[:self.chunk_size]
+        return len(data)
+
+    def flush(self):
+        pass  # Chunks are pushed as they fill; close() pushes the remainder
+
+    def close(self, error: Optional[BaseException] = None):
+        """Finish the stream; with `error`, the reader raises it instead of seeing EOF"""
+        self._error = error
+        if self._pending and error is None:
+            self._put(bytes(self._pending))
+        self._pending = bytearray()
+        self._put(_EOF)
+
+    # --- read side ---
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            parts = []
+            while True:
+                part = self.read(self.chunk_size)
+                if not part:
+                    return b"".join(parts)
+                parts.append(part)
+
+        while not self._buffer and not self._eof:
+            item = self._queue.get()
+            if item is _EOF:
+                self._eof = True
+                if self._error is not None:
+                    raise IOError(f"Backup stream failed: {self._error}")
+            else:
+                self._buffer = item
+
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def readable(self) -> bool:
+        return True
+
+    def cancel(self):
+        """Reader side: stop the writer (its next write raises PipeCancelled)"""
+        self._cancelled.set()
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+class TeeWriter:
+    """Write-only file object that duplicates writes to several targets"""
+
+    def __init__(self, *targets):
+        self.targets = targets
+
+    def write(self, data: bytes) -> int:
+        for target in self.targets:
+            target.write(data)
+        return len(data)
+
+    def flush(self):
+        for target in self.targets:
+            target.flush()
+
+def stream_through_pipe(produce: Callable[[Any], Any], consume: Callable[[BoundedPipe], Any],
+                        pipe: BoundedPipe = None) -> Tuple[Any, Any]:
+    """Run produce(pipe write side) in a thread while consume(pipe) reads it here
+
+    Returns (produce result, consume result). An exception on either side stops the
+    other and is re-raised.
+    """
+    pipe = pipe or BoundedPipe()
+    outcome = {}
+
+    def producer():
+        try:
+            outcome["result"] = produce(pipe)
+        except BaseException as e:
+            outcome["error"] = e
+            try:
+                pipe.close(e)
+            except PipeCancelled:
+                pass
+            return
+        try:
+            pipe.close()
+        except PipeCancelled as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=producer, name="backup-stream", daemon=True)
+    thread.start()
+    try:
+        consumed = consume(pipe)
+    except BaseException:
+        pipe.cancel()
+        thread.join()
+        if "error" in outcome and not isinstance(outcome["error"], PipeCancelled):
+            raise outcome["error"]
+        raise
+    # A consumer that stopped before EOF must not leave the producer blocked
+    pipe.cancel()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome.get("result"), consumed
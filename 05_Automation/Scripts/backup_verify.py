@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Backup Verification
+Checks every file in a backup against its manifest digest (in parallel, without
+extracting anything to disk), checks the zip structure and CRCs of stored backups
+with a remembered result, and restores single files by seeking straight to their
+archive offset
+"""
+
+import json
+import os
+import sys
+import time
+import logging
+import zipfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import zip_longest
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from backup_archive import LOCAL_HEADER, LOCAL_SIG, READ_SIZE, ZIP_DEFLATED, ZIP_STORED, ContentDigest
+from backup_manifest import ArchiveManifest, ArchiveManifestEntry
+from solid_pack import SolidReader
+import page_cache
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOB_BYTES = 64 * 1024 * 1024  # Compressed bytes per verification job
+INTEGRITY_WORKERS = 4         # Threads reading archives during an integrity check (bounds concurrent I/O)
+REVERIFY_DAYS = 30            # Archives that passed are checked again after this long
+
+def read_entry_chunks(f: BinaryIO, entry: ArchiveManifestEntry) -> Iterator[bytes]:
+    """Yield the uncompressed content of one entry from any seekable file object"""
+    f.seek(entry.offset)
+    header = f.read(LOCAL_HEADER.size)
+    if len(header) != LOCAL_HEADER.size or header[:4] != LOCAL_SIG:
+        raise ValueError(f"No local header at offset {entry.offset}")
+
+    if entry.method == ZIP_DEFLATED:
+        decompressor = zlib.decompressobj(-15)
+    elif entry.method != ZIP_STORED:
+        raise ValueError(f"Unsupported compression method {entry.method}")
+    else:
+        decompressor = None
+
+    f.seek(entry.data_offset)
+    remaining = entry.compress_size
+    while remaining:
+        data = f.read(min(READ_SIZE, remaining))
+        if not data:
+            raise ValueError("Archive ends inside entry data")
+        remaining -= len(data)
+        yield decompressor.decompress(data) if decompressor else data
+    if decompressor:
+        yield decompressor.flush()
+
+def check_entry(f: BinaryIO, entry: ArchiveManifestEntry) -> Optional[str]:
+    """Problem with one entry, or None when its size, CRC and digest all match"""
+    digest = ContentDigest()
+    crc = 0
+    size = 0
+    try:
+        for data in read_entry_chunks(f, entry):
+            crc = zlib.crc32(data, crc)
+            digest.update(data)
+            size += len(data)
+    except (ValueError, zlib.error) as e:
+        return str(e)
+    if size != entry.size:
+        return f"size {size} != {entry.size}"
+    if crc != entry.crc:
+        return "CRC mismatch"
+    if digest.hexdigest() != entry.digest:
+        return "digest mismatch"
+    return None
+
+def _verify_entries(archive_path: str, entries: List[list]) -> List[Tuple[str, str]]:
+    """Worker job: (name, problem) for each entry that fails verification"""
+    failures = []
+    with open(archive_path, "rb") as f:
+        for item in entries:
+            entry = ArchiveManifestEntry.from_list(item)
+            problem = check_entry(f, entry)
+            if problem:
+                failures.append((entry.name, problem))
+    return failures
+
+def verify_archive(archive_path: Path, manifest: Optional[ArchiveManifest] = None,
+                   workers: Optional[int] = None) -> List[Tuple[str, str]]:
+    """Verify every manifest entry of an archive; returns (name, problem) pairs
+
+    Entries are split into jobs of about JOB_BYTES compressed bytes, read and hashed
+    across `workers` processes (default: one per core).
+    """
+    archive_path = Path(archive_path)
+    manifest = manifest or ArchiveManifest.load(archive_path)
+    if manifest is None:
+        raise ValueError(f"{archive_path.name} has no manifest to verify against")
+
+    jobs: List[List[list]] = [[]]
+    job_bytes = 0
+    for entry in sorted(manifest.entries, key=lambda e: e.offset):
+        if job_bytes >= JOB_BYTES:
+            jobs.append([])
+            job_bytes = 0
+        jobs[-1].append(entry.to_list())
+        job_bytes += entry.compress_size
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        results = [_verify_entries(str(archive_path), job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            results = list(pool.map(_verify_entries, [str(archive_path)] * len(jobs), jobs))
+    return [failure for result in results for failure in result]
+
+def _entry_jobs(infos: List[zipfile.ZipInfo]) -> List[List[zipfile.ZipInfo]]:
+    jobs: List[List[zipfile.ZipInfo]] = [[]]
+    job_bytes = 0
+    for info in sorted(infos, key=lambda info: info.header_offset):
+        if info.is_dir():
+            continue
+        if job_bytes >= JOB_BYTES:
+            jobs.append([])
+            job_bytes = 0
+        jobs[-1].append(info)
+        job_bytes += info.compress_size
+    return jobs
+
+def _check_zip_entries(zf: zipfile.ZipFile, infos: List[zipfile.ZipInfo]) -> List[Tuple[str, str]]:
+    """Thread job: read entries through zipfile, which checks each local header and CRC-32"""
+    failures = []
+    for info in infos:
+        try:
+            with zf.open(info) as f:
+                while f.read(READ_SIZE):
+                    pass
+        except (zipfile.BadZipFile, zlib.error, EOFError, NotImplementedError, OSError) as e:
+            failures.append((info.filename, str(e) or type(e).__name__))
+    return failures
+
+def check_zip_integrity(paths: Iterable[Path], workers: Optional[int] = None) -> Dict[Path, List[Tuple[str, str]]]:
+    """Check the central directory and every entry's CRC-32 of several zips at once
+
+    Works on any zip, with or without a manifest. Entries are read in jobs of about
+    JOB_BYTES by `workers` threads (default INTEGRITY_WORKERS), taking jobs from each
+    archive in turn so several archives are read concurrently. Returns each path's
+    (name, problem) pairs; a name of "" means the archive itself is unreadable.
+    """
+    results: Dict[Path, List[Tuple[str, str]]] = {Path(path): [] for path in paths}
+    opened = []
+    per_archive = []
+    try:
+        for path in results:
+            try:
+                f = page_cache.open_source(path)
+            except OSError as e:
+                results[path].append(("", str(e)))
+                continue
+            opened.append(f)
+            try:
+                zf = zipfile.ZipFile(f)
+            except (zipfile.BadZipFile, OSError, ValueError) as e:
+                results[path].append(("", f"unreadable central directory: {e}"))
+                continue
+            opened.append(zf)
+            per_archive.append([(path, zf, job) for job in _entry_jobs(zf.infolist())])
+
+        jobs = [job for turn in zip_longest(*per_archive) for job in turn if job is not None]
+        with ThreadPoolExecutor(max_workers=workers or INTEGRITY_WORKERS) as pool:
+            futures = [(path, pool.submit(_check_zip_entries, zf, infos)) for path, zf, infos in jobs]
+            for path, future in futures:
+                results[path] += future.result()
+    finally:
+        for item in reversed(opened):
+            item.close()
+    return results
+
+def verified_path(state_dir: Path, backup_prefix: str) -> Path:
+    """Integrity check results for a backup prefix"""
+    return Path(state_dir) / "verified" / f"{backup_prefix}.json"
+
+class VerifiedArchives:
+    """Remembered integrity check results, keyed by file name so a move to Archive keeps them
+
+    A result stands while the file keeps its size and mtime, for up to REVERIFY_DAYS.
+    """
+
+    def __init__(self, records: Dict[str, dict] = None):
+        self.records = records or {}  # file name -> {size, mtime_ns, checked, problems}
+
+    @classmethod
+    def load(cls, path: Path) -> "VerifiedArchives":
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f))
+        except FileNotFoundError:
+            return cls()
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable verification record {path}: {e}")
+            return cls()
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.records, f, indent=1)
+        os.replace(tmp, path)
+
+    def lookup(self, path: Path, max_age_days: float = REVERIFY_DAYS) -> Optional[List[Tuple[str, str]]]:
+        """The remembered problems of a file ([] = passed), or None when it needs checking"""
+        record = self.records.get(path.name)
+        if record is None:
+            return None
+        st = path.stat()
+        if record["size"] != st.st_size or record["mtime_ns"] != st.st_mtime_ns:
+            return None
+        if time.time() - record["checked"] > max_age_days * 86400:
+            return None
+        return [tuple(problem) for problem in record["problems"]]
+
+    def remember(self, path: Path, problems: List[Tuple[str, str]]):
+        st = path.stat()
+        self.records[path.name] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "checked": time.time(),
+                                   "problems": [list(problem) for problem in problems[:20]]}
+
+    def forget_missing(self, names: Iterable[str]):
+        """Drop records of files no longer present (names: the files that still are)"""
+        names = set(names)
+        self.records = {name: record for name, record in self.records.items() if name in names}
+
+def verify_backups(paths: List[Path], verified: VerifiedArchives, workers: Optional[int] = None,
+                   max_age_days: float = REVERIFY_DAYS) -> Dict[Path, List[Tuple[str, str]]]:
+    """Integrity problems of each zip, checking only those without a current result"""
+    results = {}
+    stale = []
+    for path in paths:
+        remembered = verified.lookup(path, max_age_days)
+        if remembered is None:
+            stale.append(path)
+        else:
+            results[path] = remembered
+    if stale:
+        size_gb = round(sum(path.stat().st_size for path in stale) / (1024**3), 2)
+        print(f"🔍 Checking {len(stale)} archives ({size_gb} GB), {len(results)} already verified")
+        for path, problems in check_zip_integrity(stale, workers).items():
+            verified.remember(path, problems)
+            results[path] = problems
+    return results
+
+def restore_file(f: BinaryIO, entry: ArchiveManifestEntry, dest: Path):
+    """Restore one entry from a seekable archive file object, checking its digest"""
+    dest = Path(dest)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    partial = dest.with_name(dest.name + ".partial")
+    digest = ContentDigest()
+    try:
+        with open(partial, "wb") as out:
+            for data in read_entry_chunks(f, entry):
+                digest.update(data)
+                out.write(data)
+        if digest.hexdigest() != entry.digest:
+            raise ValueError(f"Digest mismatch restoring {entry.name}")
+        os.replace(partial, dest)
+    except BaseException:
+        try:
+            partial.unlink()
+        except OSError:
+            pass
+        raise
+    if entry.mtime:
+        os.utime(dest, (entry.mtime, entry.mtime))
+
+def main():
+    """Verify a backup, or restore single files from it"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Verify BigSkyAg backups and restore single files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    verify = commands.add_parser("verify", help="Check every file digest in a backup")
+    verify.add_argument("archive", type=Path)
+    verify.add_argument("--workers", type=int, help="Verification processes (default: one per core)")
+    check = commands.add_parser("check", help="Check the zip structure and CRCs of archives (no manifest needed)")
+    check.add_argument("archives", type=Path, nargs="+")
+    check.add_argument("--workers", type=int, help=f"Reader threads (default: {INTEGRITY_WORKERS})")
+    restore = commands.add_parser("restore", help="Restore files from a backup")
+    restore.add_argument("archive", type=Path)
+    restore.add_argument("target", type=Path, help="Folder to restore into")
+    restore.add_argument("paths", nargs="+", help="Archive paths to restore")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        failed = 0
+        for path, problems in check_zip_integrity(args.archives, args.workers).items():
+            for name, problem in problems[:20]:
+                print(f"   ❌ {path.name}: {name or '(archive)'}: {problem}")
+            failed += bool(problems)
+            print(f"{'❌' if problems else '✅'} {path.name}")
+        return not failed
+
+    manifest = ArchiveManifest.load(args.archive)
+    if manifest is None:
+        logger.error(f"❌ {args.archive.name} has no manifest (created before manifests existed)")
+        return False
+
+    if args.command == "verify":
+        print(f"🔍 Verifying {len(manifest)} files in {args.archive.name}")
+        failures = verify_archive(args.archive, manifest, args.workers)
+        for name, problem in failures:
+            print(f"   ❌ {name}: {problem}")
+        if failures:
+            logger.error(f"❌ {len(failures)} files failed verification")
+            return False
+        print("✅ All files verified")
+        return True
+
+    success = True
+    solid = None
+    with open(args.archive, "rb") as f:
+        for name in args.paths:
+            entry = manifest.get(name)
+            if entry is None:
+                # Small files may be packed into solid blocks instead of having an entry
+                if solid is None:
+                    solid = SolidReader(zipfile.ZipFile(f))
+                if name not in solid:
+                    logger.error(f"❌ Not in backup: {name}")
+                    success = False
+                    continue
+                solid.extract([name], args.target)
+            else:
+                restore_file(f, entry, args.target / name)
+            print(f"✅ Restored {name}")
+    return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Split-Volume Backups
+Writes one backup as a set of fixed-size zip volumes that are each a complete,
+standalone archive, uploads the volumes in parallel (retrying only the ones that
+fail) and restores from whichever volumes are at hand, in any order
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import uuid
+import logging
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from backup_archive import ZipArchiveWriter
+from backup_checkpoint import partial_path
+from backup_manifest import ARCHIVE_MANIFEST_NAME, VOLUME_INFO_NAME, ArchiveManifest, manifest_sidecar
+from solid_pack import SolidReader, add_solid_index
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+VOLUME_VERSION = 1
+UPLOAD_WORKERS = 4     # Volumes uploaded at once
+UPLOAD_RETRIES = 3     # Attempts per volume
+RETRY_DELAY = 30       # Seconds before retrying a volume (grows with each attempt)
+SET_FILE = re.compile(r"^(?P<base>.+?)(?:\.part\d{3,}\.zip|\.volumes\.json)$")
+
+def volume_path(dest: Path, index: int) -> Path:
+    """Path of volume `index` (from 1) of the set named by dest"""
+    dest = Path(dest)
+    return dest.with_name(f"{dest.stem}.part{index:03d}.zip")
+
+def index_path(dest: Path) -> Path:
+    """Path of the set index written once every volume is complete"""
+    dest = Path(dest)
+    return dest.with_name(f"{dest.stem}.volumes.json")
+
+def volume_set_name(name: str) -> str:
+    """Backup name a volume or set index belongs to (other names are returned unchanged)"""
+    match = SET_FILE.match(name)
+    return f"{match.group('base')}.zip" if match else name
+
+def archive_paths(folder: Path, name: str) -> List[Path]:
+    """Zip files holding a backup in folder: the archive itself or its volumes (may be empty)"""
+    dest = Path(folder) / volume_set_name(name)
+    return [dest] if dest.exists() else sorted(dest.parent.glob(f"{dest.stem}.part*.zip"))
+
+def set_files(folder: Path, name: str) -> List[Path]:
+    """Every local file of a backup: the archive or its volumes, manifests and set index"""
+    files = archive_paths(folder, name)
+    files += [manifest_sidecar(path) for path in files]
+    files.append(index_path(Path(folder) / volume_set_name(name)))
+    return [path for path in files if path.exists()]
+
+class VolumeSetWriter:
+    """Writes a backup as standalone zip volumes of about volume_size bytes each
+
+    Volumes roll over before an entry that would not fit, so each one holds whole
+    files plus its own manifest and can be verified, uploaded or restored without the
+    others; a file larger than volume_size gets a volume to itself. `writer` is the
+    single ZipArchiveWriter to pass to write_tree/write_tree_parallel.
+    """
+
+    def __init__(self, dest: Path, volume_size: int, info: Dict[str, Any] = None):
+        self.dest = Path(dest)
+        self.volume_size = volume_size
+        self.info = info or {}
+        self.set_id = uuid.uuid4().hex
+        self.volumes: List[Dict[str, Any]] = []
+        self._file = open(partial_path(volume_path(self.dest, 1)), "wb")
+        self.writer = ZipArchiveWriter(self._file)
+        self.writer.before_entry = self.maybe_roll
+        self._volume_start = 0  # Offset after the current volume's preamble
+
+    @property
+    def size(self) -> int:
+        return sum(volume["size"] for volume in self.volumes)
+
+    def maybe_roll(self, writer: ZipArchiveWriter, size_hint: int):
+        """Entry-starting hook: start the next volume when this entry would overflow the current one
+
+        Size hints are uncompressed sizes. A volume holding nothing but its preamble
+        takes the entry whatever its size.
+        """
+        if writer.offset <= self._volume_start or writer.offset + size_hint <= self.volume_size:
+            return
+        self._finish_volume()
+        self._file = open(partial_path(volume_path(self.dest, len(self.volumes) + 1)), "wb")
+        writer.before_entry = None
+        writer.restart(self._file)
+        writer.before_entry = self.maybe_roll
+        self._volume_start = writer.offset
+
+    def _finish_volume(self, extra_entries: Iterable[Tuple[str, bytes]] = (), last: bool = False):
+        writer = self.writer
+        before_entry, writer.before_entry = writer.before_entry, None
+        index = len(self.volumes) + 1
+        path = volume_path(self.dest, index)
+
+        for name, data in extra_entries:
+            writer.add_bytes(name, data)
+        info = {"version": VOLUME_VERSION, "set_id": self.set_id, "set": self.dest.name,
+                "index": index, "last": last}
+        if last:
+            info["count"] = index
+        writer.add_bytes(VOLUME_INFO_NAME, json.dumps(info).encode("utf-8"))
+        add_solid_index(writer)
+        manifest = ArchiveManifest.from_writer(writer, path.name)
+        writer.add_bytes(ARCHIVE_MANIFEST_NAME, manifest.to_bytes())
+        writer.close()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(partial_path(path), path)
+        manifest.save_sidecar(path)
+
+        self.volumes.append({"name": path.name, "size": writer.offset, "files": len(manifest)})
+        writer.before_entry = before_entry
+
+    def close(self, extra_entries: Iterable[Tuple[str, bytes]] = ()) -> Path:
+        """Finish the last volume (with extra_entries) and write the set index"""
+        self._finish_volume(extra_entries, last=True)
+        path = index_path(self.dest)
+        data = dict(self.info, version=VOLUME_VERSION, set_id=self.set_id, set=self.dest.name,
+                    created=time.time(), volumes=self.volumes)
+        tmp = path.with_name(f"{path.name}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, path)
+        print(f"📚 Wrote {len(self.volumes)} volumes ({round(self.size / (1024**2), 1)} MB) for {self.dest.name}")
+        return path
+
+    def discard(self):
+        """Remove everything written for this set after a failure"""
+        if not self._file.closed:
+            self._file.close()
+        for index in range(1, len(self.volumes) + 2):
+            path = volume_path(self.dest, index)
+            for leftover in (path, partial_path(path), manifest_sidecar(path)):
+                leftover.unlink(missing_ok=True)
+        index_path(self.dest).unlink(missing_ok=True)
+
+def load_index(path: Path) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def read_volume_info(path: Path) -> Optional[Dict[str, Any]]:
+    """The volume record stored inside a volume, or None for ordinary archives"""
+    with zipfile.ZipFile(path) as zf:
+        try:
+            return json.loads(zf.read(VOLUME_INFO_NAME))
+        except KeyError:
+            return None
+
+def missing_volumes(infos: List[Dict[str, Any]]) -> Optional[List[int]]:
+    """Volume numbers absent from a set, or None while the last volume is unseen"""
+    counts = [info["count"] for info in infos if info.get("last")]
+    if not counts:
+        return None
+    present = {info["index"] for info in infos}
+    return [index for index in range(1, counts[0] + 1) if index not in present]
+
+def restore_volumes(paths: List[Path], target: Path, patterns: List[str] = None) -> Tuple[List[str], Optional[List[int]]]:
+    """Extract files from the volumes of one set, given in any order
+
+    Each volume is restored on its own, so volumes can be processed as they arrive.
+    Returns (restored names, missing volume numbers or None if the set's size is
+    unknown because its last volume is not among paths).
+    """
+    from restore_backup import select_members
+
+    target = Path(target)
+    infos = []
+    restored = []
+    for path in paths:
+        info = read_volume_info(path)
+        if info is None:
+            raise ValueError(f"{Path(path).name} is not a backup volume")
+        if infos and info["set_id"] != infos[0]["set_id"]:
+            raise ValueError(f"{Path(path).name} belongs to a different backup ({info['set']})")
+        infos.append(info)
+
+        with zipfile.ZipFile(path) as zf:
+            names = select_members(zf.namelist(), patterns or ["*"])
+            for name in names:
+                dest = target / name
+                if target.resolve() not in dest.resolve().parents:
+                    logger.warning(f"⚠️  Skipping unsafe path: {name}")
+                    continue
+                zf.extract(name, target)
+                info_time = zf.getinfo(name).date_time
+                mtime = time.mktime(info_time + (0, 0, -1))
+                os.utime(dest, (mtime, mtime))
+                restored.append(name)
+            solid = SolidReader(zf)
+            restored += solid.extract(select_members(solid.names(), patterns or ["*"]), target)
+    return restored, missing_volumes(infos)
+
+def upload_volume_set(provider, index_file: Path, backup_type: str = "daily", workers: int = UPLOAD_WORKERS,
+                      retries: int = UPLOAD_RETRIES, retry_delay: float = RETRY_DELAY) -> List[str]:
+    """Upload every volume of a set in parallel, then the set index
+
+    Each volume is retried on its own and volumes already stored with the right size
+    are skipped, so re-running after a failure only sends what is missing. Returns
+    the names of volumes that could not be uploaded (the index is only uploaded once
+    that list is empty).
+    """
+    index_file = Path(index_file)
+    index = load_index(index_file)
+    destination = provider.get_backup_destination(backup_type)
+    try:
+        stored = {item["name"]: item for item in provider.list_files(destination)}
+    except Exception as e:
+        logger.warning(f"⚠️  Could not list {destination}, uploading every volume: {e}")
+        stored = {}
+
+    def upload(volume: Dict[str, Any]) -> bool:
+        name = volume["name"]
+        remote = stored.get(name)
+        if remote is not None and int(remote.get("size") or -1) == volume["size"]:
+            print(f"   ⏭️  {name} already uploaded")
+            return True
+        for attempt in range(1, retries + 1):
+            try:
+                if provider.upload_backup(index_file.with_name(name), backup_type):
+                    print(f"   ✅ {name} ({round(volume['size'] / (1024**2), 1)} MB)")
+                    return True
+            except Exception as e:
+                logger.warning(f"⚠️  {name}: attempt {attempt}/{retries} failed: {e}")
+            if attempt < retries:
+                time.sleep(retry_delay * attempt)
+        logger.error(f"❌ {name}: giving up after {retries} attempts")
+        return False
+
+    if not getattr(provider, "supports_parallel_upload", True):
+        workers = 1
+    print(f"☁️  Uploading {len(index['volumes'])} volumes of {index['set']} ({workers} at a time)")
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = list(pool.map(upload, index["volumes"]))
+    failed = [volume["name"] for volume, ok in zip(index["volumes"], results) if not ok]
+    if not failed and not provider.upload_backup(index_file, backup_type):
+        failed.append(index_file.name)
+    return failed
+
+def main():
+    """Restore from backup volumes, or upload a volume set"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Work with split-volume BigSkyAg backups")
+    commands = parser.add_subparsers(dest="command", required=True)
+    restore = commands.add_parser("restore", help="Restore files from the volumes of one backup (any order)")
+    restore.add_argument("target", type=Path, help="Folder to restore into")
+    restore.add_argument("volumes", nargs="+", type=Path, help="Volume files")
+    restore.add_argument("--path", action="append", dest="paths", help="Only matching archive paths (repeatable)")
+    upload = commands.add_parser("upload", help="Upload a volume set in parallel")
+    upload.add_argument("index", type=Path, help="The set's .volumes.json index")
+    upload.add_argument("--type", default="daily", help="Backup type folder to upload into")
+    upload.add_argument("--workers", type=int, default=UPLOAD_WORKERS)
+    args = parser.parse_args()
+
+    if args.command == "restore":
+        restored, missing = restore_volumes(args.volumes, args.target, args.paths)
+        print(f"📁 Restored {len(restored)} files to {args.target}")
+        if missing is None:
+            print("⚠️  The last volume was not given, so the set may be incomplete")
+        elif missing:
+            print(f"⚠️  Volumes still missing: {', '.join(str(index) for index in missing)}")
+        return bool(restored)
+
+    from config import get_storage_provider_config
+    from storage_providers import get_storage_provider
+
+    provider_config = get_storage_provider_config()
+    provider = get_storage_provider(provider_config["provider"], provider_config)
+    failed = upload_volume_set(provider, args.index, args.type, args.workers)
+    if failed:
+        logger.error(f"❌ {len(failed)} volumes failed: {', '.join(failed)}")
+        return False
+    print("✅ All volumes uploaded")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
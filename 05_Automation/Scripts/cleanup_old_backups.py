@@ -1,83 +1,194 @@
 """
 BigSkyAg Backup Cleanup
-Keeps only the most recent backups and removes old ones
+Keeps only the most recent backups and removes old ones, pruning further when the
+next backup would not fit the disk or the local space budget
 """
 
+import os
 import logging
+from datetime import date, timedelta
 from pathlib import Path
-from config import ensure_critical_folders, get_folder_path, BACKUP_CONFIG, STORAGE_CONFIG
+from typing import Dict, List, Optional
+import page_cache
+from backup_estimate import EstimateHistory, forecast_bytes, history_path
+from backup_verify import REVERIFY_DAYS, VerifiedArchives, verified_path, verify_backups
+from backup_volumes import set_files, volume_set_name
+from retention import RetentionPlan, apply_plan, make_space, plan_backups
+from config import ensure_critical_folders, get_folder_path, BACKUP_CONFIG, STATE_DIR, STORAGE_CONFIG
+from config_loader import CompiledConfig
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def cleanup_old_backups():
-    """Remove old backup files, keeping only the most recent ones"""
+def newest_backups(folder: Path, pattern: str) -> List[str]:
+    """Backup names in folder, newest first (the volumes of a split backup count as one)"""
+    mtimes = {}
+    for path in folder.glob(pattern):
+        name = volume_set_name(path.name)
+        mtimes[name] = max(mtimes.get(name, 0), path.stat().st_mtime)
+    return sorted(mtimes, key=mtimes.get, reverse=True)
+
+def damaged_backups(folders: List[Path], pattern: str, backup_config, backup_prefix: str) -> Dict[str, List[str]]:
+    """Integrity problems of the damaged backups in folders, by backup name
+
+    Every zip (each volume of a split backup) gets a CRC check unless it passed or
+    failed one recently; results are remembered in the state folder.
+    """
+    page_cache.configure_from(backup_config)
+    record_file = verified_path(STATE_DIR, backup_prefix)
+    verified = VerifiedArchives.load(record_file)
+    paths = [path for folder in folders for path in sorted(folder.glob(pattern))]
+    results = verify_backups(paths, verified, backup_config.get("integrity_workers"),
+                             backup_config.get("reverify_days", REVERIFY_DAYS))
+    verified.forget_missing(path.name for path in paths)
+    try:
+        verified.save(record_file)
+    except OSError as e:
+        logger.warning(f"⚠️  Could not save verification record {record_file}: {e}")
+
+    damaged: Dict[str, List[str]] = {}
+    for path, problems in results.items():
+        for name, problem in problems:
+            damaged.setdefault(volume_set_name(path.name), []).append(f"{path.name}: {name or '(archive)'}: {problem}")
+    return damaged
+
+def space_shortfall(backup_folder: Path, backup_config, needed: int, freed: int = 0, used: int = 0) -> int:
+    """Bytes still to free so a backup of `needed` bytes fits, after deleting `freed`
+    bytes and keeping `used` bytes of local backups
+
+    Two targets: `min_free_gb` left free on the disk (statvfs) after the backup, and
+    local backups within `local_budget_gb` (0 = no budget) including the new one.
+    """
+    st = os.statvfs(backup_folder)
+    shortfall = needed + (backup_config.get("min_free_gb") or 0) * 1024**3 - (st.f_bavail * st.f_frsize + freed)
+    budget = (backup_config.get("local_budget_gb") or 0) * 1024**3
+    if budget:
+        shortfall = max(shortfall, used + needed - budget)
+    return max(0, int(shortfall))
+
+def plan_shortfall(plan: RetentionPlan, backup_folder: Path, backup_config, needed: int) -> int:
+    return space_shortfall(backup_folder, backup_config, needed,
+                           plan.local_bytes(plan.local_delete), plan.local_bytes(plan.local_keep))
+
+def forecast_next_backup(backup_config, backup_prefix: str) -> int:
+    """Space tomorrow's scheduled backup is expected to need (0 without history)"""
+    from create_backup_zip import backup_kind, select_backup_type
+    backup_type = select_backup_type(backup_config, date.today() + timedelta(days=1))
+    history = EstimateHistory.load(history_path(STATE_DIR, backup_prefix))
+    needed = forecast_bytes(history, backup_type, backup_kind(backup_config, backup_type))
+    if needed is None:
+        print(f"ℹ️  No size history for {backup_type} backups yet: not reserving space for the next one")
+        return 0
+    print(f"🔮 Next backup ({backup_type}) needs about {round(needed / (1024**3), 2)} GB")
+    return needed
+
+def fit_to_space(plan: RetentionPlan, backup_folder: Path, backup_config, needed: int) -> bool:
+    """Add the oldest backups to the plan's local deletions until `needed` bytes fit;
+    False when even that is not enough"""
+    shortfall = plan_shortfall(plan, backup_folder, backup_config, needed)
+    if not shortfall:
+        return True
+    dropped = make_space(plan, shortfall)
+    if dropped:
+        print(f"💽 Pruning {len(dropped)} more backups to free {round(shortfall / (1024**3), 2)} GB: "
+              f"{', '.join(dropped)}")
+    remaining = plan_shortfall(plan, backup_folder, backup_config, needed)
+    if remaining:
+        logger.error(f"❌ Still {round(remaining / (1024**3), 2)} GB short for the next backup "
+                     f"after pruning all but the newest backups")
+        return False
+    return True
+
+def make_room(config: Optional[CompiledConfig], needed: int) -> bool:
+    """Before a backup of about `needed` bytes: when it would not fit, apply local
+    retention and prune the oldest backups as far as necessary"""
+    backup_config = config.backup_config if config else BACKUP_CONFIG
+    backup_prefix = config.backup_prefix if config else STORAGE_CONFIG["backup_prefix"]
+    backup_folder = config.get_folder_path("backups") if config else get_folder_path("backups")
+    plan = plan_backups(backup_config, backup_prefix, backup_folder)
+    if not space_shortfall(backup_folder, backup_config, needed, used=plan.local_bytes(plan.local)):
+        return True
+    print("💽 Not enough room for this backup: pruning old backups first")
+    fits = fit_to_space(plan, backup_folder, backup_config, needed)
+    return apply_plan(plan) and fits
+
+def cleanup_old_backups(config: Optional[CompiledConfig] = None, dry_run: bool = False):
+    """Rotate local backups: the newest stay in Backups, older ones move to Archive, and
+    those outside the retention plan are deleted (dry_run only prints the plan)"""
     
     # Ensure all critical folders exist
-    ensure_critical_folders()
+    ensure_critical_folders(config=config)
+    
+    backup_config = config.backup_config if config else BACKUP_CONFIG
+    backup_prefix = config.backup_prefix if config else STORAGE_CONFIG["backup_prefix"]
     
     # Get backup folder path
-    backup_folder = get_folder_path("backups")
+    backup_folder = config.get_folder_path("backups") if config else get_folder_path("backups")
     
     if not backup_folder.exists():
         print(f"ℹ️  Backup folder does not exist: {backup_folder}")
         return True
     
-    # Find all backup zip files (white-label prefix)
-    backup_pattern = f"{STORAGE_CONFIG['backup_prefix']}_*.zip"
-    zips = sorted(
-        backup_folder.glob(backup_pattern), 
-        key=lambda f: f.stat().st_mtime, 
-        reverse=True
-    )
+    # Find all backups (white-label prefix); a split-volume backup counts as one
+    backup_pattern = f"{backup_prefix}_*.zip"
+    backups = newest_backups(backup_folder, backup_pattern)
     
-    if not zips:
+    if not backups:
         print("ℹ️  No backup files found")
         return True
     
-    print(f"📦 Found {len(zips)} backup files")
+    print(f"📦 Found {len(backups)} backups")
     
     # Rotation strategy:
     # - Keep 1 latest backup in Backups (working)
     # - Move older ones to Backups/Archive
-    # - Keep only N in Archive
-    working_keep = BACKUP_CONFIG.get("max_working_backups", 1)
-    archive_keep = BACKUP_CONFIG.get("max_archive_backups", 4)
+    # - Keep what the GFS retention plan needs, at most max_archive_backups in Archive
+    working_keep = backup_config.get("max_working_backups", 1)
 
     archive_folder = backup_folder / "Archive"
     archive_folder.mkdir(parents=True, exist_ok=True)
 
-    # Move older backups to Archive
-    to_archive = zips[working_keep:]
-    for old_zip in to_archive:
-        target = archive_folder / old_zip.name
-        if not target.exists():
+    # Move older backups to Archive (with their manifests and volume index)
+    to_archive = backups[working_keep:]
+    for name in to_archive:
+        if dry_run:
+            print(f"📦 Would move to Archive: {name}")
+        elif not (archive_folder / name).exists():
             try:
-                old_zip.rename(target)
-                print(f"📦 Moved to Archive: {old_zip.name}")
+                for path in set_files(backup_folder, name):
+                    path.rename(archive_folder / path.name)
+                print(f"📦 Moved to Archive: {name}")
             except Exception as e:
-                logger.error(f"Failed to move {old_zip.name} to Archive: {e}")
-
-    # Prune archive
-    archives = sorted(
-        archive_folder.glob(backup_pattern),
-        key=lambda f: f.stat().st_mtime,
-        reverse=True
-    )
-    to_delete = archives[archive_keep:]
-    for old in to_delete:
-        try:
-            size_mb = round(old.stat().st_size / (1024**2), 1)
-            print(f"   🗑️  Deleting from Archive: {old.name} ({size_mb} MB)")
-            old.unlink()
-        except Exception as e:
-            logger.error(f"Failed to delete {old.name} from Archive: {e}")
-
-    print("✅ Backup rotation complete")
-    return True
+                logger.error(f"Failed to move {name} to Archive: {e}")
+
+    # Check integrity so a damaged backup never takes the place of an intact one
+    damaged = {}
+    if backup_config.get("verify_before_cleanup", True):
+        damaged = damaged_backups([backup_folder, archive_folder], backup_pattern, backup_config, backup_prefix)
+        for name, problems in damaged.items():
+            logger.error(f"❌ Damaged backup {name}: {problems[0]}"
+                         + (f" (and {len(problems) - 1} more problems)" if len(problems) > 1 else ""))
+
+    # Prune both folders to the retention plan (see retention.py)
+    plan = plan_backups(backup_config, backup_prefix, backup_folder, damaged=damaged)
+    # ...and further, oldest first, until tomorrow's backup fits the disk and the budget
+    fits = fit_to_space(plan, backup_folder, backup_config, forecast_next_backup(backup_config, backup_prefix))
+    success = apply_plan(plan, dry_run=dry_run) and fits
+
+    kept_damaged = [name for name in plan.local_keep if name in damaged]
+    if kept_damaged:
+        logger.error(f"❌ Rotation kept damaged backups: {', '.join(kept_damaged)}")
+        return False
+    if success:
+        print("✅ Backup rotation complete")
+    return success
 
 if __name__ == "__main__":
-    success = cleanup_old_backups()
+    import argparse
+    parser = argparse.ArgumentParser(description="Rotate local BigSkyAg backups")
+    parser.add_argument("--dry-run", action="store_true", help="Print the retention plan without moving or deleting")
+    args = parser.parse_args()
+    success = cleanup_old_backups(dry_run=args.dry_run)
     exit(0 if success else 1)
 
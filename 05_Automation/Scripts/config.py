@@ -4,8 +4,13 @@ Storage-agnostic, company-agnostic configuration for all automation scripts
 """
 
 import os
+import copy
+import json
+import time
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from config_loader import CompiledConfig, ConfigWatcher, deep_update, load_cached, read_config_file
 
 # === COMPANY CONFIGURATION ===
 # Change these values to deploy for any company
@@ -27,53 +32,68 @@ BASE_DIR = Path(os.environ.get("BIGSKY_BASE", DEFAULT_BASE))
 # Desktop source directory (for sync operations)
 DESKTOP_SOURCE = Path("/Users/gregpaulsen/Desktop/BigSkyAg")
 
+# Automation state (stamps, manifests, snapshots). Lives beside BASE_DIR rather than
+# inside it so the SSD mirror's --delete never removes it.
+STATE_DIR = Path(os.environ.get("BIGSKY_STATE_DIR", BASE_DIR.parent / ".bigsky_state"))
+
+# Optional TOML/JSON file overriding the defaults below (see config_template.toml)
+CONFIG_FILE = os.environ.get("BIGSKY_CONFIG")
+
 # === STORAGE CONFIGURATION ===
 # Storage-agnostic configuration for different providers
-STORAGE_CONFIG = {
-    "provider": COMPANY_SETTINGS["storage_provider"],
-    
-    # Company branding (auto-generated from COMPANY_SETTINGS)
-    "company_name": COMPANY_SETTINGS["company_name"],
-    "backup_prefix": COMPANY_SETTINGS["backup_prefix"],
-    
-    # Provider-specific configurations
-    "providers": {
-        "google_drive": {
-            "credentials_path": BASE_DIR / "05_Automation" / "Scripts" / "credentials.json",
-            "token_path": BASE_DIR / "05_Automation" / "Scripts" / "token.json",
-            "backup_folder_id": "1hJeN0e9ElQ617yrt_dsTq0o1CerUeQ15"
-        },
-        "dropbox": {
-            "access_token": "YOUR_DROPBOX_ACCESS_TOKEN_HERE"
-        },
-        "s3": {
-            "bucket_name": "YOUR_S3_BUCKET_NAME",
-            "region_name": "us-west-2"
-        },
-        "local": {
-            "storage_path": BASE_DIR / "00_Admin" / "Local_Backups"
+def build_storage_config(company_settings: Dict[str, Any], base_dir: Path) -> Dict[str, Any]:
+    """Build the storage configuration for a company rooted at base_dir"""
+    return {
+        "provider": company_settings["storage_provider"],
+        
+        # Company branding (auto-generated from COMPANY_SETTINGS)
+        "company_name": company_settings["company_name"],
+        "backup_prefix": company_settings["backup_prefix"],
+        
+        # Provider-specific configurations
+        "providers": {
+            "google_drive": {
+                "credentials_path": base_dir / "05_Automation" / "Scripts" / "credentials.json",
+                "token_path": base_dir / "05_Automation" / "Scripts" / "token.json",
+                "backup_folder_id": "1hJeN0e9ElQ617yrt_dsTq0o1CerUeQ15"
+            },
+            "dropbox": {
+                "access_token": "YOUR_DROPBOX_ACCESS_TOKEN_HERE"
+            },
+            "s3": {
+                "bucket_name": "YOUR_S3_BUCKET_NAME",
+                "region_name": "us-west-2"
+            },
+            "local": {
+                "storage_path": base_dir / "00_Admin" / "Local_Backups"
+            }
         }
     }
-}
+
+STORAGE_CONFIG = build_storage_config(COMPANY_SETTINGS, BASE_DIR)
 
 # Company-specific dynamic names
 COMPANY_DROPZONE_NAME = f"{STORAGE_CONFIG['company_name']}DropZone"
 
 # === CRITICAL FOLDERS ===
 # These folders will be created automatically if they don't exist
-CRITICAL_FOLDERS = {
-    "backups": BASE_DIR / "00_Admin" / "Backups",
-    "dropzone": BASE_DIR / COMPANY_DROPZONE_NAME,
-    "archive": BASE_DIR / "Z_Archive",
-    "scripts": BASE_DIR / "05_Automation" / "Scripts",
-    "admin": BASE_DIR / "00_Admin",
-    "branding": BASE_DIR / "01_Branding",
-    "field_projects": BASE_DIR / "02_Field_Projects",
-    "mapping": BASE_DIR / "03_Mapping_QGIS",
-    "training": BASE_DIR / "04_Training",
-    "automation": BASE_DIR / "05_Automation",
-    "business": BASE_DIR / "06_Business_Strategy"
-}
+def build_critical_folders(base_dir: Path, dropzone_name: str) -> Dict[str, Path]:
+    """Build the critical folder map for a base directory"""
+    return {
+        "backups": base_dir / "00_Admin" / "Backups",
+        "dropzone": base_dir / dropzone_name,
+        "archive": base_dir / "Z_Archive",
+        "scripts": base_dir / "05_Automation" / "Scripts",
+        "admin": base_dir / "00_Admin",
+        "branding": base_dir / "01_Branding",
+        "field_projects": base_dir / "02_Field_Projects",
+        "mapping": base_dir / "03_Mapping_QGIS",
+        "training": base_dir / "04_Training",
+        "automation": base_dir / "05_Automation",
+        "business": base_dir / "06_Business_Strategy"
+    }
+
+CRITICAL_FOLDERS = build_critical_folders(BASE_DIR, COMPANY_DROPZONE_NAME)
 
 # === FILE ROUTING RULES ===
 # Maps file extensions to destination folders
@@ -171,39 +191,80 @@ ROUTING_RULES = {
     ".markdown": "business"
 }
 
+# === EXCLUSIONS ===
+# Junk never worth copying: shared by the backup, mirror_to_ssd.py and sync_to_ssd.sh.
+# zip -x style (see exclusions.py): matched against the whole relative path, '*' spans '/'.
+EXCLUDE_PATTERNS = [
+    "*.DS_Store",
+    "__MACOSX/*",
+    "*/__MACOSX/*",
+    ".git/*",
+    "*/.git/*",
+    "*.tmp",
+]
+
+# === SSD MIRROR ===
+# How mirror_to_ssd.py copies DESKTOP_SOURCE onto the SSD
+MIRROR_CONFIG = {
+    "engine": "rsync",  # "rsync", or "native": mirror_engine.py, which copies only what changed since its last snapshot
+    "workers": 4,  # Native engine: threads copying changed files, each given a balanced shard of them
+    "daemon_quiet_seconds": 2,  # mirror_daemon.py: apply journaled changes once events pause this long...
+    "daemon_max_delay_seconds": 10,  # ...or once the oldest has waited this long, even while events keep coming
+    "daemon_stable_seconds": 2,  # Files modified more recently than this are still being written; they wait
+    "reconcile_minutes": 60,  # Full snapshot-based mirror, at low priority, to catch anything the events missed
+}
+
 # === BACKUP CONFIG ===
 # New hybrid backup strategy
-BACKUP_CONFIG = {
-    "max_working_backups": COMPANY_SETTINGS["max_working_backups"],
-    "max_archive_backups": COMPANY_SETTINGS["max_archive_backups"],
-    "min_size_gb": COMPANY_SETTINGS["min_backup_size_gb"],
-    "exclude_patterns": [
-        "*.DS_Store", 
-        "__MACOSX/*", 
-        "*.tmp",
-        "00_Admin/Backups/*",      # Exclude backup folder from backups
-        "00_Admin/Local_Backups/*", # Exclude local backups
-        f"{COMPANY_DROPZONE_NAME}/*", # Exclude dropzone from backups
-        "*.log"                    # Exclude log files
-    ],
-    "backup_types": {
-        "daily": {
-            "type": "incremental",  # Only changed files
-            "retention": 7,         # Keep 7 days
-            "upload": True          # Upload to cloud storage
-        },
-        "weekly": {
-            "type": "full",         # Complete system backup
-            "retention": 4,         # Keep 4 weeks
-            "upload": True          # Upload to cloud storage
-        },
-        "monthly": {
-            "type": "full",         # Complete system backup
-            "retention": 12,        # Keep 12 months
-            "upload": True          # Upload to cloud storage
+def build_backup_config(company_settings: Dict[str, Any], dropzone_name: str) -> Dict[str, Any]:
+    """Build the backup configuration for a company"""
+    return {
+        "max_working_backups": company_settings["max_working_backups"],
+        "max_archive_backups": company_settings["max_archive_backups"],
+        "min_size_gb": company_settings["min_backup_size_gb"],
+        "compression_workers": 0,  # Parallel compressor processes (0 = one per CPU core, 1 = serial)
+        "verify_after_backup": True,  # Check every file digest once the archive is written
+        "stream_upload": False,  # Upload the archive while it is written instead of afterwards
+        "keep_local_copy": True,  # When streaming, also keep the archive in the backups folder
+        "volume_size_mb": 0,  # Split backups into standalone volumes of this size (0 = one archive)
+        "upload_workers": 4,  # Volumes uploaded in parallel
+        "solid_small_files": False,  # Pack small files into solid compressed blocks
+        "solid_file_limit_kb": 64,  # Files up to this size are packed
+        "page_cache": "drop",  # "drop": release source pages once read so other apps keep their cache; "keep": plain reads
+        "backup_window_minutes": 0,  # Warn before starting when the estimate runs longer (0 = no window)
+        "direct_io_min_mb": 0,  # Read files at least this large with O_DIRECT, bypassing the cache (0 = never)
+        "synthetic_full": False,  # Merge full backups from the last full and its incrementals instead of rereading the tree
+        "verify_before_cleanup": True,  # Check archive CRCs during rotation so only intact backups count as kept
+        "reverify_days": 30,  # Re-check archives that passed after this many days
+        "integrity_workers": 4,  # Threads reading archives during those checks
+        "min_free_gb": 2,  # Free space to leave on the backup disk after the next backup (older backups are pruned for it)
+        "local_budget_gb": 0,  # Most space local backups may take, the next one included (0 = no budget)
+        "exclude_patterns": EXCLUDE_PATTERNS + [
+            "00_Admin/Backups/*",      # Exclude backup folder from backups
+            "00_Admin/Local_Backups/*", # Exclude local backups
+            f"{dropzone_name}/*", # Exclude dropzone from backups
+            "*.log"                    # Exclude log files
+        ],
+        "backup_types": {
+            "daily": {
+                "type": "incremental",  # Only changed files
+                "retention": 7,         # Keep 7 days
+                "upload": True          # Upload to cloud storage
+            },
+            "weekly": {
+                "type": "full",         # Complete system backup
+                "retention": 4,         # Keep 4 weeks
+                "upload": True          # Upload to cloud storage
+            },
+            "monthly": {
+                "type": "full",         # Complete system backup
+                "retention": 12,        # Keep 12 months
+                "upload": True          # Upload to cloud storage
+            }
         }
     }
-}
+
+BACKUP_CONFIG = build_backup_config(COMPANY_SETTINGS, COMPANY_DROPZONE_NAME)
 
 # === COMPANY CONFIGURATIONS ===
 # Template configurations for different companies
@@ -228,23 +289,157 @@ COMPANY_TEMPLATES = {
     }
 }
 
-def ensure_critical_folders():
-    """Create all critical folders if they don't exist"""
-    print("🔧 Ensuring critical folders exist...")
+# === FOLDER VERIFICATION STAMP ===
+# After a full verification the folder inodes and mount ID are stamped to disk, so later
+# calls (from any script) within the TTL only need to stat BASE_DIR.
+FOLDER_STAMP_TTL = 15 * 60  # seconds
+FOLDER_STAMP_VERSION = 1
+PROBE_FILE_NAME = ".bigsky_write_probe"
+# stamp path -> (signature, probe_writes, verified_at, base identity) for this process
+_folders_verified: Dict[str, tuple] = {}
+
+def _folder_scope(config: Optional[CompiledConfig] = None):
+    """Folders, base dir and stamp path for a tenant config (or the module globals)"""
+    if config is None:
+        return CRITICAL_FOLDERS, BASE_DIR, STATE_DIR / f"folders_{COMPANY_DROPZONE_NAME}.json"
+    return config.critical_folders, config.base_dir, STATE_DIR / f"folders_{config.dropzone_name}.json"
+
+def _folder_stamp_path(config: Optional[CompiledConfig] = None) -> Path:
+    return _folder_scope(config)[2]
+
+def _folders_signature(folders) -> List[List[str]]:
+    return sorted([key, str(path)] for key, path in folders.items())
+
+def _base_identity(base_dir: Path) -> Optional[List[int]]:
+    """Mount ID and inode of the base dir (changes if the SSD is swapped or remounted)"""
+    try:
+        stat = os.stat(base_dir)
+    except OSError:
+        return None
+    return [stat.st_dev, stat.st_ino]
+
+def _read_folder_stamp(config: Optional[CompiledConfig] = None) -> Optional[Dict[str, Any]]:
+    try:
+        with open(_folder_stamp_path(config), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _folder_stamp_is_valid(stamp: Optional[Dict[str, Any]], probe_writes: bool,
+                           config: Optional[CompiledConfig] = None) -> bool:
+    folders, base_dir, _ = _folder_scope(config)
+    if not stamp or stamp.get("version") != FOLDER_STAMP_VERSION:
+        return False
+    if stamp.get("folders") != _folders_signature(folders):
+        return False
+    if time.time() - stamp.get("verified_at", 0) > FOLDER_STAMP_TTL:
+        return False
+    if probe_writes and not stamp.get("writable"):
+        return False
+    return stamp.get("base") == _base_identity(base_dir)
+
+def _write_folder_stamp(stamp_path: Path, stamp: Dict[str, Any]):
+    try:
+        stamp_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = stamp_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(stamp, f)
+        os.replace(tmp_path, stamp_path)
+    except OSError:
+        pass  # Stamp is only an optimisation
+
+def invalidate_folder_stamp(config: Optional[CompiledConfig] = None):
+    """Force the next ensure_critical_folders() call to re-verify everything"""
+    stamp_path = _folder_stamp_path(config)
+    _folders_verified.pop(str(stamp_path), None)
+    try:
+        stamp_path.unlink()
+    except OSError:
+        pass
+
+def ensure_critical_folders(verbose: bool = False, probe_writes: bool = False,
+                            config: Optional[CompiledConfig] = None) -> List[str]:
+    """Create all critical folders if they don't exist
+    
+    Quiet unless a folder had to be created or changed; pass verbose=True for a full
+    listing. With probe_writes=True each folder also gets a write/delete probe. Both
+    checks are skipped while a valid verification stamp exists. Pass a tenant config
+    to verify that tenant's folders instead of the module-level ones. Returns a list
+    of error messages (empty on success).
+    """
+    folders, base_dir, stamp_path = _folder_scope(config)
+    signature = _folders_signature(folders)
+    memo_key = str(stamp_path)
+    
+    # In-process fast path: a single stat of the base dir
+    memo = _folders_verified.get(memo_key)
+    if memo is not None:
+        verified_signature, verified_probe, verified_at, verified_base = memo
+        if (verified_signature == signature and (verified_probe or not probe_writes)
+                and time.time() - verified_at <= FOLDER_STAMP_TTL
+                and _base_identity(base_dir) == verified_base):
+            return []
     
-    for folder_name, folder_path in CRITICAL_FOLDERS.items():
-        if not folder_path.exists():
-            folder_path.mkdir(parents=True, exist_ok=True)
-            print(f"✅ Created: {folder_path}")
-        else:
-            print(f"✅ Exists: {folder_path}")
+    stamp = _read_folder_stamp(config)
+    if _folder_stamp_is_valid(stamp, probe_writes, config):
+        _folders_verified[memo_key] = (signature, stamp.get("writable", False),
+                                       stamp["verified_at"], stamp["base"])
+        if verbose:
+            print("✅ All critical folders verified (cached)")
+        return []
     
+    if verbose:
+        print("🔧 Ensuring critical folders exist...")
+    
+    previous_inodes = (stamp or {}).get("inodes", {})
+    inodes = {}
+    errors = []
+    to_check = dict(folders)
     # Ensure backup archive subfolder exists
-    archive_sub = CRITICAL_FOLDERS["backups"] / "Archive"
-    archive_sub.mkdir(parents=True, exist_ok=True)
-    print(f"✅ Ensured: {archive_sub}")
+    to_check["backups_archive"] = folders["backups"] / "Archive"
+    
+    for folder_name, folder_path in to_check.items():
+        try:
+            if not folder_path.exists():
+                folder_path.mkdir(parents=True, exist_ok=True)
+                print(f"✅ Created: {folder_path}")
+            elif verbose:
+                print(f"✅ Exists: {folder_path}")
+            
+            stat = folder_path.stat()
+            inodes[folder_name] = [stat.st_dev, stat.st_ino]
+            previous = previous_inodes.get(folder_name)
+            if previous and previous != inodes[folder_name]:
+                print(f"🔄 Changed since last check: {folder_path}")
+            
+            if probe_writes:
+                test_file = folder_path / PROBE_FILE_NAME
+                test_file.write_text("test")
+                test_file.unlink()
+        except PermissionError:
+            errors.append(f"Permission denied for folder: {folder_path}")
+        except Exception as e:
+            errors.append(f"Failed to validate folder {folder_path}: {str(e)}")
+    
+    for error in errors:
+        print(f"❌ {error}")
+    
+    if not errors:
+        base_identity = _base_identity(base_dir)
+        verified_at = time.time()
+        _write_folder_stamp(stamp_path, {
+            "version": FOLDER_STAMP_VERSION,
+            "verified_at": verified_at,
+            "base": base_identity,
+            "folders": signature,
+            "inodes": inodes,
+            "writable": probe_writes,
+        })
+        _folders_verified[memo_key] = (signature, probe_writes, verified_at, base_identity)
+        if verbose:
+            print("✅ All critical folders verified")
     
-    print("✅ All critical folders verified")
+    return errors
 
 def get_folder_path(folder_key):
     """Get the path for a specific folder by key"""
@@ -309,12 +504,39 @@ def setup_company(company_name: str, storage_provider: str, custom_settings: Dic
     
     # Update critical folders
     CRITICAL_FOLDERS["dropzone"] = BASE_DIR / COMPANY_DROPZONE_NAME
+    invalidate_folder_stamp()
     
     print(f"✅ Company setup complete: {company_name}")
     print(f"   Storage Provider: {storage_provider}")
     print(f"   Backup Prefix: {COMPANY_SETTINGS['backup_prefix']}")
     print(f"   DropZone: {COMPANY_DROPZONE_NAME}")
 
+def build_company_config(company_name: str, storage_provider: str = None,
+                         custom_settings: Dict[str, Any] = None, base_dir: Path = None) -> CompiledConfig:
+    """Build an immutable config context for a company without touching module globals
+    
+    Layers on top of the BIGSKY_CONFIG override file (if any). Unknown custom_settings
+    keys are ignored, as in setup_company().
+    """
+    custom_settings = dict(custom_settings or {})
+    overrides = read_config_file(CONFIG_FILE) if CONFIG_FILE else {}
+    
+    company_overrides = {k: v for k, v in custom_settings.items() if k in _DEFAULT_COMPANY_SETTINGS}
+    company_overrides["company_name"] = company_name
+    if storage_provider:
+        company_overrides["storage_provider"] = storage_provider
+    company_overrides.setdefault("backup_prefix", f"{company_name}_Backup")
+    
+    deep_update(overrides, {"company_settings": company_overrides})
+    # Company-level values must win over any provider/branding in the override file
+    storage_overrides = overrides.setdefault("storage_config", {})
+    for key in ("provider", "company_name", "backup_prefix"):
+        storage_overrides.pop(key, None)
+    if base_dir is not None:
+        overrides["base_dir"] = str(base_dir)
+    
+    return compile_config(overrides, source=CONFIG_FILE)
+
 def get_system_info():
     """Get comprehensive system information"""
     return {
@@ -329,6 +551,107 @@ def get_system_info():
         "backup_config": BACKUP_CONFIG
     }
 
+# === FILE OVERRIDES ===
+# Pristine defaults, captured before any override file or setup_company() mutates them
+_DEFAULT_COMPANY_SETTINGS = copy.deepcopy(COMPANY_SETTINGS)
+_DEFAULT_ROUTING_RULES = copy.deepcopy(ROUTING_RULES)
+_DEFAULT_BASE_DIR = BASE_DIR
+_DEFAULT_DESKTOP_SOURCE = DESKTOP_SOURCE
+_config_watcher = None
+_default_compiled = None
+
+def compile_config(overrides: Dict[str, Any] = None, source: str = None) -> CompiledConfig:
+    """Build an immutable CompiledConfig from the defaults plus optional overrides
+
+    Recognised override sections: company_settings, storage_config, routing_rules,
+    backup_config, plus top-level base_dir and desktop_source.
+    """
+    overrides = overrides or {}
+
+    company_settings = copy.deepcopy(_DEFAULT_COMPANY_SETTINGS)
+    company_settings.update(overrides.get("company_settings", {}))
+    if "company_name" in overrides.get("company_settings", {}) and \
+            "backup_prefix" not in overrides["company_settings"]:
+        company_settings["backup_prefix"] = f"{company_settings['company_name']}_Backup"
+
+    base_dir = Path(overrides.get("base_dir", _DEFAULT_BASE_DIR))
+    desktop_source = Path(overrides.get("desktop_source", _DEFAULT_DESKTOP_SOURCE))
+
+    storage_config = build_storage_config(company_settings, base_dir)
+    deep_update(storage_config, overrides.get("storage_config", {}))
+
+    dropzone_name = f"{storage_config['company_name']}DropZone"
+
+    backup_config = build_backup_config(company_settings, dropzone_name)
+    deep_update(backup_config, overrides.get("backup_config", {}))
+
+    routing_rules = copy.deepcopy(_DEFAULT_ROUTING_RULES)
+    routing_rules.update({ext.lower(): key for ext, key in overrides.get("routing_rules", {}).items()})
+
+    return CompiledConfig({
+        "company_settings": company_settings,
+        "storage_config": storage_config,
+        "routing_rules": routing_rules,
+        "backup_config": backup_config,
+        "critical_folders": build_critical_folders(base_dir, dropzone_name),
+        "base_dir": base_dir,
+        "desktop_source": desktop_source,
+        "dropzone_name": dropzone_name,
+        "source": source,
+    })
+
+def load_config_file(config_file) -> CompiledConfig:
+    """Load an override file into a CompiledConfig, using the on-disk pickle cache"""
+    config_file = Path(config_file)
+    # Defaults come from this module and BIGSKY_BASE, so both are part of the cache key
+    defaults_mtime = os.stat(__file__).st_mtime_ns
+    return load_cached(
+        config_file,
+        lambda overrides: compile_config(overrides, source=str(config_file)),
+        key_extra=(defaults_mtime, str(_DEFAULT_BASE_DIR)),
+    )
+
+def get_config() -> CompiledConfig:
+    """Get the current compiled configuration
+
+    With BIGSKY_CONFIG set, the override file is watched and reloaded automatically
+    when it changes, so long-running processes pick up edits without restarting.
+    """
+    global _config_watcher, _default_compiled
+    if CONFIG_FILE:
+        if _config_watcher is None:
+            _config_watcher = ConfigWatcher(Path(CONFIG_FILE), load_config_file)
+            _config_watcher.add_listener(_apply_compiled_config)
+        return _config_watcher.get()
+
+    if _default_compiled is None:
+        _default_compiled = compile_config()
+    return _default_compiled
+
+def _apply_compiled_config(compiled: CompiledConfig):
+    """Mirror a CompiledConfig into the legacy module-level globals (in place)"""
+    global BASE_DIR, DESKTOP_SOURCE, COMPANY_DROPZONE_NAME, STATE_DIR
+    BASE_DIR = compiled.base_dir
+    if "BIGSKY_STATE_DIR" not in os.environ:
+        STATE_DIR = BASE_DIR.parent / ".bigsky_state"
+    _folders_verified.clear()
+    DESKTOP_SOURCE = compiled.desktop_source
+    COMPANY_DROPZONE_NAME = compiled.dropzone_name
+
+    raw = compiled.to_dict()
+    for target, key in (
+        (COMPANY_SETTINGS, "company_settings"),
+        (STORAGE_CONFIG, "storage_config"),
+        (ROUTING_RULES, "routing_rules"),
+        (BACKUP_CONFIG, "backup_config"),
+        (CRITICAL_FOLDERS, "critical_folders"),
+    ):
+        target.clear()
+        target.update(raw[key])
+
+if CONFIG_FILE:
+    _apply_compiled_config(get_config())
+
 if __name__ == "__main__":
     # Test the configuration
     print(f"🏠 Base directory: {BASE_DIR}")
@@ -337,6 +660,8 @@ if __name__ == "__main__":
     print(f"🏢 Company: {STORAGE_CONFIG['company_name']}")
     print(f"📦 Backup prefix: {STORAGE_CONFIG['backup_prefix']}")
     print(f"🔄 DropZone: {COMPANY_DROPZONE_NAME}")
+    if CONFIG_FILE:
+        print(f"🗂️  Config overrides: {CONFIG_FILE}")
     
     # Show system info
     print("\n📊 System Information:")
@@ -345,4 +670,4 @@ if __name__ == "__main__":
         if key != "critical_folders":
             print(f"   {key}: {value}")
     
-    ensure_critical_folders()
+    ensure_critical_folders(verbose=True)
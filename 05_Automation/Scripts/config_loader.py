@@ -0,0 +1,301 @@
+"""
+BigSkyAg Compiled Configuration
+Immutable, precompiled configuration objects loaded from TOML/JSON override files
+"""
+
+import copy
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import tomllib  # Python 3.11+
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the pickled layout of CompiledConfig changes
+CACHE_FORMAT_VERSION = 1
+
+# How often (seconds) a watcher re-stats the source file
+DEFAULT_CHECK_INTERVAL = 2.0
+
+def freeze(value: Any) -> Any:
+    """Recursively convert dicts/lists into read-only mappings/tuples"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, set):
+        return frozenset(value)
+    return value
+
+def thaw(value: Any) -> Any:
+    """Recursively convert frozen mappings/tuples back into plain dicts/lists"""
+    if isinstance(value, (dict, MappingProxyType)):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+def deep_update(target: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge overrides into target in place, descending into nested dicts"""
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            deep_update(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+    return target
+
+class CompiledConfig:
+    """Immutable snapshot of the automation configuration with precomputed lookups"""
+
+    __slots__ = (
+        "_raw",
+        "_routing_paths",
+        "company_settings",
+        "storage_config",
+        "routing_rules",
+        "backup_config",
+        "critical_folders",
+        "base_dir",
+        "desktop_source",
+        "dropzone_name",
+        "source",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        raw = copy.deepcopy(raw)
+        critical_folders = {key: Path(path) for key, path in raw["critical_folders"].items()}
+        routing_rules = {ext.lower(): key for ext, key in raw["routing_rules"].items()}
+
+        set_attr = object.__setattr__
+        set_attr(self, "_raw", raw)
+        set_attr(self, "company_settings", freeze(raw["company_settings"]))
+        set_attr(self, "storage_config", freeze(raw["storage_config"]))
+        set_attr(self, "routing_rules", freeze(routing_rules))
+        set_attr(self, "backup_config", freeze(raw["backup_config"]))
+        set_attr(self, "critical_folders", freeze(critical_folders))
+        set_attr(self, "base_dir", Path(raw["base_dir"]))
+        set_attr(self, "desktop_source", Path(raw["desktop_source"]))
+        set_attr(self, "dropzone_name", raw["dropzone_name"])
+        set_attr(self, "source", raw.get("source"))
+
+        # Precompiled extension -> destination path lookup (one dict hit per file)
+        set_attr(self, "_routing_paths", MappingProxyType({
+            ext: critical_folders[key]
+            for ext, key in routing_rules.items()
+            if key in critical_folders
+        }))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledConfig is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledConfig is immutable")
+
+    def __reduce__(self):
+        # MappingProxyType cannot be pickled, so rebuild from the plain source dicts
+        return (CompiledConfig, (self._raw,))
+
+    def __repr__(self):
+        return (f"CompiledConfig(company={self.company_settings.get('company_name')!r}, "
+                f"provider={self.storage_config.get('provider')!r}, source={self.source!r})")
+
+    @property
+    def company_name(self) -> str:
+        return self.storage_config["company_name"]
+
+    @property
+    def backup_prefix(self) -> str:
+        return self.storage_config["backup_prefix"]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Get a mutable deep copy of the underlying configuration"""
+        return copy.deepcopy(self._raw)
+
+    def get_folder_path(self, folder_key: str) -> Path:
+        """Get the path for a specific folder by key"""
+        if folder_key not in self.critical_folders:
+            raise ValueError(f"Unknown folder key: {folder_key}")
+        return self.critical_folders[folder_key]
+
+    def get_routing_destination(self, file_extension: str) -> Optional[Path]:
+        """Get the destination folder for a file extension"""
+        return self._routing_paths.get(file_extension.lower())
+
+    def get_storage_provider_config(self) -> Dict[str, Any]:
+        """Get a mutable provider config dict, shaped like config.get_storage_provider_config()"""
+        provider_name = self.storage_config["provider"]
+        if provider_name not in self.storage_config["providers"]:
+            raise ValueError(f"Unknown storage provider: {provider_name}")
+
+        provider_config = thaw(self.storage_config)
+        provider_config.update(provider_config["providers"][provider_name])
+        return provider_config
+
+    def get_system_info(self) -> Dict[str, Any]:
+        """Get comprehensive system information"""
+        return {
+            "company_name": self.company_settings["company_name"],
+            "storage_provider": self.storage_config["provider"],
+            "backup_prefix": self.storage_config["backup_prefix"],
+            "base_directory": str(self.base_dir),
+            "desktop_source": str(self.desktop_source),
+            "dropzone_name": self.dropzone_name,
+            "critical_folders": {k: str(v) for k, v in self.critical_folders.items()},
+            "routing_rules_count": len(self.routing_rules),
+            "backup_config": thaw(self.backup_config),
+            "config_source": self.source,
+        }
+
+def read_config_file(path: Path) -> Dict[str, Any]:
+    """Parse a TOML or JSON override file into a dict"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+
+    if suffix == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    elif suffix == ".toml":
+        if tomllib is None:
+            raise ImportError("TOML config requires Python 3.11+ or: pip install tomli")
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    else:
+        raise ValueError(f"Unsupported config file type: {path.suffix} (use .toml or .json)")
+
+    if not isinstance(data, dict):
+        raise ValueError(f"Config file must contain a table/object at the top level: {path}")
+    return data
+
+def cache_path_for(source: Path) -> Path:
+    """Pickle cache location for a config file (hidden file next to the source)"""
+    source = Path(source)
+    return source.with_name(f".{source.name}.cache.pickle")
+
+def _source_signature(source: Path) -> Tuple[int, int]:
+    stat = os.stat(source)
+    return stat.st_mtime_ns, stat.st_size
+
+def load_cached(
+    source: Path,
+    build: Callable[[Dict[str, Any]], CompiledConfig],
+    key_extra: Tuple = (),
+) -> CompiledConfig:
+    """Load a CompiledConfig from its pickle cache, rebuilding when the source has changed
+
+    The cache key is the source path, mtime and size plus ``key_extra`` (callers pass
+    anything else the compiled result depends on, such as the defaults module mtime).
+    """
+    source = Path(source)
+    key = (CACHE_FORMAT_VERSION, str(source.resolve()), *_source_signature(source), *key_extra)
+    cache_file = cache_path_for(source)
+
+    try:
+        with open(cache_file, "rb") as f:
+            cached_key, compiled = pickle.load(f)
+        if cached_key == key and isinstance(compiled, CompiledConfig):
+            return compiled
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.debug(f"Ignoring unreadable config cache {cache_file}: {e}")
+
+    compiled = build(read_config_file(source))
+
+    # Write atomically so concurrent launch steps never read a torn pickle
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, "wb") as f:
+            pickle.dump((key, compiled), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+    except OSError as e:
+        logger.debug(f"Could not write config cache {cache_file}: {e}")
+        try:
+            tmp_file.unlink()
+        except OSError:
+            pass
+
+    return compiled
+
+class ConfigWatcher:
+    """Serves the current CompiledConfig and reloads it when the source file changes
+
+    Long-running processes call ``get()`` whenever they need configuration; the source
+    is re-stat'ed at most once per ``check_interval`` seconds. If a reload fails the
+    last good configuration is kept.
+    """
+
+    def __init__(
+        self,
+        source: Path,
+        loader: Callable[[Path], CompiledConfig],
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+    ):
+        self.source = Path(source)
+        self.loader = loader
+        self.check_interval = check_interval
+        self._config: Optional[CompiledConfig] = None
+        self._signature: Optional[Tuple[int, int]] = None
+        self._last_check = 0.0
+        self._listeners: List[Callable[[CompiledConfig], None]] = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, callback: Callable[[CompiledConfig], None]):
+        """Register a callback invoked with the new config after each reload"""
+        self._listeners.append(callback)
+
+    def get(self) -> CompiledConfig:
+        """Get the current config, reloading if the source file changed"""
+        reloaded = None
+
+        with self._lock:
+            now = time.monotonic()
+            if self._config is not None and now - self._last_check < self.check_interval:
+                return self._config
+            self._last_check = now
+
+            try:
+                signature = _source_signature(self.source)
+            except OSError as e:
+                if self._config is None:
+                    raise
+                logger.warning(f"⚠️  Config file unavailable, keeping previous config: {e}")
+                return self._config
+
+            if signature != self._signature:
+                try:
+                    config = self.loader(self.source)
+                except Exception as e:
+                    if self._config is None:
+                        raise
+                    logger.error(f"❌ Config reload failed, keeping previous config: {e}")
+                    return self._config
+
+                if self._config is not None:
+                    logger.info(f"🔄 Reloaded configuration from {self.source}")
+                    reloaded = config
+                self._config = config
+                self._signature = signature
+
+            config = self._config
+
+        if reloaded is not None:
+            for callback in self._listeners:
+                try:
+                    callback(reloaded)
+                except Exception as e:
+                    logger.error(f"❌ Config reload listener failed: {e}")
+
+        return config
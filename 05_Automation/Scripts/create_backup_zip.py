@@ -1,46 +1,236 @@
 """
 BigSkyAg Backup Creator
-Creates timestamped backup zips of the entire BigSkyAg directory
+Creates timestamped backup zips of the BigSkyAg directory: full backups of the
+entire tree, or incremental backups of what changed since the previous backup
 """
 
 import os
-import subprocess
 import time
 import logging
+import page_cache
+from datetime import date as date_type
 from pathlib import Path
-from config import ensure_critical_folders, get_folder_path, BACKUP_CONFIG
+from typing import List, Optional, Tuple
+from backup_archive import ZipArchiveWriter, iter_source_tree, write_tree
+from backup_estimate import (
+    SPACE_MARGIN, EstimateHistory, check_estimate, estimate_backup, history_path, report_estimate, run_mode,
+    size_warning,
+)
+from backup_checkpoint import (
+    ArchiveCheckpoint, discard_partial, find_resumable, load_checkpoint, partial_path, validate_entries,
+)
+from backup_manifest import (
+    ARCHIVE_MANIFEST_NAME, METADATA_DIR, ArchiveManifest, BackupPlan, FileManifest, backup_metadata,
+    manifest_path,
+)
+from backup_stream import TeeWriter, stream_through_pipe
+from backup_verify import verify_archive
+from backup_volumes import VolumeSetWriter, set_files
+from parallel_deflate import default_workers, write_tree_parallel
+from solid_pack import SMALL_FILE_LIMIT, add_solid_index, pack_small_files
+from config import (
+    ensure_critical_folders, get_folder_path, get_storage_provider_config, BACKUP_CONFIG, STATE_DIR, STORAGE_CONFIG,
+)
+from config_loader import CompiledConfig
+from storage_providers import get_storage_provider
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def create_zip(source, dest):
-    """Create a zip archive of the source directory"""
+def create_zip(source, dest, exclude_patterns: Optional[List[str]] = None, workers: Optional[int] = None,
+               items: Optional[List[tuple]] = None, extra_entries: List[Tuple[str, bytes]] = (),
+               checkpoint_info: Optional[dict] = None, solid_limit: Optional[int] = None):
+    """Create a zip archive of the source directory
+    
+    Streams every file through the native ZIP64 writer, storing already-compressed
+    types and deflating the rest across `workers` processes (0/None = one per core,
+    1 = serial). The archive is written to a .partial file and only renamed into
+    place once complete. `items` limits the archive to an explicit (arcname, path,
+    stat) list; `extra_entries` are (name, data) pairs appended after the files.
+    The archive manifest (digest and offset of every file) is stored as the last
+    entry and next to the archive.
+    
+    Progress is checkpointed while writing. If a checkpoint matching checkpoint_info
+    exists for dest, writing resumes from it; entries whose source changed size or
+    mtime since are written again. After a failure the partial file is kept for that.
+    
+    With solid_limit (bytes; 0/None = off, see solid_file_limit) files up to that size
+    are packed into solid blocks instead of individual entries (see solid_pack).
+    
+    Returns the closed writer (entries and content digests) or None on failure.
+    """
     print(f"🌀 Creating backup zip...")
     
-    # Build exclude patterns for zip command
-    exclude_args = []
-    for pattern in BACKUP_CONFIG["exclude_patterns"]:
-        exclude_args.extend(["-x", pattern])
+    exclude_patterns = exclude_patterns or []
+    workers = workers or default_workers()
+    
+    dest = Path(dest)
+    partial = partial_path(dest)
+    if items is None:
+        items = list(iter_source_tree(Path(source), exclude_patterns))
+    checkpoint = ArchiveCheckpoint(dest, checkpoint_info)
+    state = load_checkpoint(dest, checkpoint_info)
     
     try:
-        result = subprocess.run([
-            "zip", "-r", dest, ".", 
-            *exclude_args
-        ], cwd=source, capture_output=True, text=True)
+        if state:
+            f = open(partial, "r+b")
+            entries, dropped = validate_entries(state, items)
+            writer = ZipArchiveWriter.resume(f, state["offset"], entries, state["digests"])
+            done = {entry.name for entry in entries}
+            items = [item for item in items if item[0] not in done]
+            print(f"⏯️  Resuming at {round(state['offset'] / (1024**2), 1)} MB: "
+                  f"{len(entries)} entries kept, {dropped} changed since and redone")
+        else:
+            f = open(partial, "wb")
+            writer = ZipArchiveWriter(f)
         
-        if result.returncode != 0:
-            logger.error(f"Zip command failed: {result.stderr}")
-            return False
-            
-        return True
+        with f:
+            writer.on_entry = checkpoint.maybe_save
+            stats, manifest = write_archive(writer, Path(source), exclude_patterns, workers, items,
+                                            extra_entries, dest.name, solid_limit)
+            os.fsync(f.fileno())
+        os.replace(partial, dest)
+        checkpoint.discard()
+        manifest.save_sidecar(dest)
         
-    except FileNotFoundError:
-        logger.error("❌ 'zip' command not found. Please install zip utility.")
-        return False
     except Exception as e:
         logger.error(f"❌ Zip creation failed: {str(e)}")
-        return False
+        if checkpoint.saved or state:
+            print(f"💾 Kept {partial.name}: the next run resumes from its last checkpoint")
+        else:
+            discard_partial(dest)
+        return None
+    
+    report_stats(stats, workers)
+    return writer
+
+def write_archive(writer: ZipArchiveWriter, source: Path, exclude_patterns: List[str], workers: int,
+                  items: List[tuple], extra_entries: List[Tuple[str, bytes]], archive_name: str,
+                  solid_limit: Optional[int] = None):
+    """Write the files, the extra entries and the archive manifest, then close the writer
+    
+    Returns (compression stats, archive manifest).
+    """
+    stats = write_files(writer, source, exclude_patterns, workers, items, solid_limit)
+    writer.on_entry = None
+    for name, data in extra_entries:
+        writer.add_bytes(name, data)
+    add_solid_index(writer)
+    manifest = ArchiveManifest.from_writer(writer, archive_name)
+    writer.add_bytes(ARCHIVE_MANIFEST_NAME, manifest.to_bytes())
+    writer.close()
+    return stats, manifest
+
+def write_files(writer: ZipArchiveWriter, source: Path, exclude_patterns: List[str], workers: int,
+                items: List[tuple], solid_limit: Optional[int] = None):
+    """Write the source files serially or across `workers` processes; returns the stats
+    
+    Small files are packed into solid blocks first when solid_limit is set.
+    """
+    if solid_limit:
+        items, _packer = pack_small_files(writer, items, solid_limit)
+    if workers > 1:
+        return write_tree_parallel(writer, source, exclude_patterns, workers, items)
+    return write_tree(writer, source, exclude_patterns, items)
+
+def solid_file_limit(backup_config) -> int:
+    """Largest file size packed into solid blocks (0 when solid packing is off)"""
+    if not backup_config.get("solid_small_files"):
+        return 0
+    return int(backup_config.get("solid_file_limit_kb", SMALL_FILE_LIMIT // 1024)) * 1024
+
+def report_stats(stats, workers: int):
+    print(f"📊 Compression by file type ({workers} worker{'s' if workers > 1 else ''}):")
+    for line in stats.report_lines():
+        print(line)
+    if stats.skipped:
+        print(f"⚠️  Skipped {len(stats.skipped)} unreadable files")
+    if stats.changed:
+        print(f"⚠️  {len(stats.changed)} files changed while being read (archived at their listed size)")
+
+def stream_zip(source, zip_name: str, provider, backup_type: str, exclude_patterns: Optional[List[str]] = None,
+               workers: Optional[int] = None, items: Optional[List[tuple]] = None,
+               extra_entries: List[Tuple[str, bytes]] = (), local_copy: Optional[Path] = None,
+               solid_limit: Optional[int] = None):
+    """Stream a backup archive straight into the storage provider
+    
+    The writer's output goes through a bounded in-memory pipe into the provider's
+    multipart/resumable upload while it is being written, so the archive is never
+    read back from disk. With `local_copy` the same bytes are also written there;
+    without it nothing is staged on disk. Streamed backups are not checkpointed:
+    an interrupted one starts over.
+    
+    Returns a (writer, file_id) tuple, the closed writer with its entries and content
+    digests and the uploaded file's id at the provider, or None on failure.
+    """
+    print(f"🌀 Streaming backup zip to {provider.provider_name}...")
+    
+    exclude_patterns = exclude_patterns or []
+    workers = workers or default_workers()
+    if items is None:
+        items = list(iter_source_tree(Path(source), exclude_patterns))
+    
+    local_file = open(partial_path(local_copy), "wb") if local_copy else None
+    
+    def produce(pipe):
+        writer = ZipArchiveWriter(TeeWriter(pipe, local_file) if local_file else pipe)
+        stats, manifest = write_archive(writer, Path(source), exclude_patterns, workers, items,
+                                        extra_entries, zip_name, solid_limit)
+        return writer, stats, manifest
+    
+    def consume(pipe):
+        return provider.upload_backup_stream(pipe, zip_name, backup_type)
+    
+    try:
+        (writer, stats, manifest), file_id = stream_through_pipe(produce, consume)
+        if not file_id:
+            raise IOError(f"{provider.provider_name} did not accept the upload")
+        if local_file:
+            os.fsync(local_file.fileno())
+            local_file.close()
+            os.replace(partial_path(local_copy), local_copy)
+            manifest.save_sidecar(local_copy)
+    except Exception as e:
+        logger.error(f"❌ Streaming backup failed: {str(e)}")
+        if local_file:
+            local_file.close()
+            discard_partial(local_copy)
+        return None
+    
+    report_stats(stats, workers)
+    return writer, file_id
+
+def create_volumes(source, dest, volume_size: int, exclude_patterns: Optional[List[str]] = None,
+                   workers: Optional[int] = None, items: Optional[List[tuple]] = None,
+                   extra_entries: List[Tuple[str, bytes]] = (), info: Optional[dict] = None,
+                   solid_limit: Optional[int] = None):
+    """Create a backup as standalone zip volumes of about volume_size bytes
+    
+    Like create_zip, but the files are spread over dest's .partNNN.zip volumes and
+    listed in a .volumes.json index. Volume sets are not checkpointed; after a
+    failure everything written so far is removed.
+    
+    Returns the closed VolumeSetWriter or None on failure.
+    """
+    print(f"🌀 Creating backup volumes of {round(volume_size / (1024**2))} MB...")
+    
+    exclude_patterns = exclude_patterns or []
+    workers = workers or default_workers()
+    if items is None:
+        items = list(iter_source_tree(Path(source), exclude_patterns))
+    
+    volumes = VolumeSetWriter(dest, volume_size, info)
+    try:
+        stats = write_files(volumes.writer, Path(source), exclude_patterns, workers, items, solid_limit)
+        volumes.close(extra_entries)
+    except Exception as e:
+        logger.error(f"❌ Volume creation failed: {str(e)}")
+        volumes.discard()
+        return None
+    
+    report_stats(stats, workers)
+    return volumes
 
 def check_size(path):
     """Check the size of the zip file and return in GB"""
@@ -53,15 +243,82 @@ def check_size(path):
         logger.error(f"❌ Failed to check file size: {str(e)}")
         return 0
 
-def main():
-    """Main backup creation function"""
+def discard_backup(backup_folder: Path, zip_name: str):
+    """Delete a local backup that failed verification, so it is never uploaded or chained from
+    
+    Removes the archive or its volumes with their manifest sidecars and set index.
+    """
+    for path in set_files(backup_folder, zip_name):
+        try:
+            path.unlink()
+            print(f"🗑️  Removed {path.name}")
+        except OSError as e:
+            logger.error(f"❌ Could not remove {path}: {e}")
+
+def select_backup_type(backup_config, today: Optional[date_type] = None) -> str:
+    """Scheduled backup type: monthly on the 1st, weekly on Sundays, daily otherwise"""
+    today = today or date_type.today()
+    backup_types = backup_config.get("backup_types", {})
+    if today.day == 1 and "monthly" in backup_types:
+        return "monthly"
+    if today.weekday() == 6 and "weekly" in backup_types:
+        return "weekly"
+    return "daily"
+
+def backup_mode(backup_config, stream: Optional[bool] = None,
+                volume_size_mb: Optional[int] = None) -> Tuple[bool, bool, int]:
+    """(stream, keep a local copy, volume size in MB) with backup_config defaults applied"""
+    if stream is None:
+        stream = backup_config.get("stream_upload", False)
+    keep_local = not stream or backup_config.get("keep_local_copy", True)
+    if volume_size_mb is None:
+        volume_size_mb = backup_config.get("volume_size_mb") or 0
+    if stream and volume_size_mb:
+        print("ℹ️  Streamed backups are uploaded as a single archive, not split into volumes")
+        volume_size_mb = 0
+    return stream, keep_local, volume_size_mb
+
+def backup_kind(backup_config, backup_type: str) -> str:
+    """'full' or 'incremental' as configured for a backup type (unknown types are full)"""
+    kind = backup_config.get("backup_types", {}).get(backup_type, {}).get("type", "full")
+    return "incremental" if kind == "incremental" else "full"
+
+def run_backup(config: Optional[CompiledConfig] = None, backup_type: Optional[str] = None,
+               stream: Optional[bool] = None, provider=None, volume_size_mb: Optional[int] = None,
+               solid: Optional[bool] = None, measure_cache: bool = False):
+    """Create a backup for one tenant config (None means the module-level config.py settings)
+    
+    backup_type is a key of backup_config["backup_types"] (default: chosen by date).
+    Incremental types archive only files added or changed since the previous backup plus
+    a deletion list, falling back to a full backup when there is no previous manifest.
+    
+    With stream (default: backup_config["stream_upload"]) the archive is uploaded to the
+    storage provider while it is written, keeping a local copy only if
+    backup_config["keep_local_copy"] is set. A shared provider may be passed in.
+    
+    With volume_size_mb (default: backup_config["volume_size_mb"], 0 = one archive) the
+    backup is split into standalone zip volumes that upload_backup.py sends in parallel.
+    
+    With solid (default: backup_config["solid_small_files"]) small files are packed into
+    solid compressed blocks.
+    
+    With backup_config["synthetic_full"], full backups after the first are merged from the
+    previous full and its incrementals (see synthetic_full.py) instead of reread.
+    
+    Source files are read under backup_config["page_cache"] / ["direct_io_min_mb"];
+    measure_cache reports how much of the tree sits in the page cache before and after.
+    """
     
     # Ensure all critical folders exist
-    ensure_critical_folders()
+    ensure_critical_folders(config=config)
+    
+    folder_path = config.get_folder_path if config else get_folder_path
+    backup_config = config.backup_config if config else BACKUP_CONFIG
+    backup_prefix = config.backup_prefix if config else STORAGE_CONFIG["backup_prefix"]
     
     # Get paths from config
-    source_folder = get_folder_path("automation").parent  # Go up one level to get base dir
-    backup_folder = get_folder_path("backups")
+    source_folder = folder_path("automation").parent  # Go up one level to get base dir
+    backup_folder = folder_path("backups")
     
     if not source_folder.exists():
         logger.error(f"❌ Source folder does not exist: {source_folder}")
@@ -72,36 +329,186 @@ def main():
         backup_folder.mkdir(parents=True, exist_ok=True)
         print(f"📁 Created backup folder: {backup_folder}")
     
-    # Generate backup filename with timestamp
-    date = time.strftime("%Y-%m-%d_%H%M")
-    # Use backup prefix from config for white-labeling
-    from config import STORAGE_CONFIG
-    zip_name = f"{STORAGE_CONFIG['backup_prefix']}_{date}.zip"
-    zip_path = backup_folder / zip_name
+    backup_type = backup_type or select_backup_type(backup_config)
+    kind = backup_kind(backup_config, backup_type)
+    manifest_file = manifest_path(STATE_DIR, backup_prefix)
+    previous = FileManifest.load(manifest_file)
+    if kind == "incremental" and previous is None:
+        print("ℹ️  No previous backup manifest: running a full backup first")
+        kind = "full"
+    
+    stream, keep_local, volume_size_mb = backup_mode(backup_config, stream, volume_size_mb)
+    if stream and provider is None:
+        try:
+            provider_config = config.get_storage_provider_config() if config else get_storage_provider_config()
+            provider = get_storage_provider(provider_config["provider"], provider_config)
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize storage provider for streaming: {e}")
+            return False
     
-    print(f"📦 Creating backup: {zip_name}")
+    if kind == "full" and previous is not None and not stream and backup_config.get("synthetic_full"):
+        # Merge the existing chain instead of rereading the tree; a real full if that fails
+        from synthetic_full import run_synthetic_full
+        if run_synthetic_full(config, backup_type, volume_size_mb=volume_size_mb):
+            return True
+        print("ℹ️  Falling back to a full backup from the source tree")
+    
+    # Resume an interrupted backup of the same type, otherwise start a new one
+    # (streamed backups and volume sets are not checkpointed, so they always start over)
+    if solid is None:
+        solid_limit = solid_file_limit(backup_config)
+    else:
+        solid_limit = solid_file_limit(dict(backup_config, solid_small_files=solid))
+    checkpoint_info = {"backup_type": backup_type, "kind": kind, "solid": solid_limit}
+    zip_path = None
+    resumed = False
+    for candidate in find_resumable(backup_folder, f"{backup_prefix}_{backup_type}_*.zip"):
+        if zip_path is None and not stream and not volume_size_mb and load_checkpoint(candidate, checkpoint_info):
+            zip_path = candidate
+            resumed = True
+        else:
+            print(f"🗑️  Discarding stale partial backup: {candidate.name}")
+            discard_partial(candidate)
+    
+    if zip_path is None:
+        # Generate backup filename with timestamp
+        date = time.strftime("%Y-%m-%d_%H%M")
+        # Use backup prefix from config for white-labeling
+        zip_path = backup_folder / f"{backup_prefix}_{backup_type}_{date}.zip"
+    zip_name = zip_path.name
+    
+    print(f"📦 Creating {backup_type} ({kind}) backup: {zip_name}")
     print(f"📁 Source: {source_folder}")
-    print(f"💾 Destination: {zip_path}")
+    if stream:
+        print(f"☁️  Destination: {provider.provider_name} {provider.get_backup_destination(backup_type)}/{zip_name}")
+    if keep_local:
+        print(f"💾 Destination: {zip_path}")
     
-    # Create the backup
+    # Scan the tree once, then work out what this backup has to archive
     start_time = time.time()
-    success = create_zip(source_folder, zip_path)
-    duration = round(time.time() - start_time, 2)
+    exclude_patterns = list(backup_config["exclude_patterns"]) + [METADATA_DIR + "*"]
+    items = list(iter_source_tree(source_folder, exclude_patterns))
+    page_cache.configure_from(backup_config)
+    if measure_cache:
+        source_files = [path for arcname, path, _st in items if not arcname.endswith("/")]
+        cache_before = page_cache.measure_cache(source_files)
+    if kind == "incremental":
+        plan = previous.plan_incremental(items)
+        changed = sum(1 for arcname, _, _ in plan.items if not arcname.endswith("/"))
+        print(f"🔍 {changed} new or changed files, {len(plan.deleted)} deleted, "
+              f"{len(plan.carried)} unchanged")
+        if plan.rehashed:
+            print(f"   ({plan.rehashed} files had new timestamps but identical content)")
+    else:
+        plan = BackupPlan.full(items)
     
-    if success and zip_path.exists():
-        size_gb = check_size(zip_path)
-        
-        if size_gb < BACKUP_CONFIG["min_size_gb"]:
-            print(f"⚠️  WARNING: Zip size ({size_gb} GB) is smaller than expected minimum ({BACKUP_CONFIG['min_size_gb']} GB)")
-            print("   This may indicate an incomplete backup!")
-        else:
-            print(f"✅ Backup completed successfully in {duration} seconds")
-            print(f"📁 Backup location: {zip_path}")
-            
-        return True
+    # Predict size and duration from earlier runs before committing to the backup
+    mode = run_mode(stream, volume_size_mb)
+    history_file = history_path(STATE_DIR, backup_prefix)
+    history = EstimateHistory.load(history_file)
+    estimate = estimate_backup(((arcname, st.st_size) for arcname, _path, st in plan.items
+                                if not arcname.endswith("/")), history, mode)
+    if keep_local:
+        # Prune old backups first if this one would not fit (see cleanup_old_backups.py)
+        from cleanup_old_backups import make_room
+        needed = int(estimate.bytes_out * SPACE_MARGIN)
+        if not make_room(config, needed):
+            logger.error(f"❌ Not enough room in {backup_folder} for a backup of about "
+                         f"{round(needed / (1024**3), 2)} GB: skipping it")
+            return False
+    report_estimate(estimate, check_estimate(estimate, backup_folder if keep_local else None,
+                                             backup_config.get("backup_window_minutes") or 0))
+    
+    # Create the backup
+    metadata = backup_metadata(plan, backup_type, kind, previous)
+    workers = backup_config.get("compression_workers") or default_workers()
+    archives = [zip_path] if keep_local else []
+    if stream:
+        result = stream_zip(source_folder, zip_name, provider, backup_type, exclude_patterns, workers,
+                            plan.items, metadata, zip_path if keep_local else None, solid_limit)
+        writer = result[0] if result else None
+    elif volume_size_mb:
+        volumes = create_volumes(source_folder, zip_path, volume_size_mb * 1024**2, exclude_patterns, workers,
+                                 plan.items, metadata, checkpoint_info, solid_limit)
+        writer = volumes.writer if volumes else None
+        archives = [backup_folder / volume["name"] for volume in volumes.volumes] if volumes else []
     else:
+        writer = create_zip(source_folder, zip_path, exclude_patterns, workers, plan.items, metadata,
+                            checkpoint_info, solid_limit)
+    duration = round(time.time() - start_time, 2)
+    if measure_cache:
+        page_cache.report_cache(cache_before, page_cache.measure_cache(source_files))
+    
+    if not writer or not all(path.exists() for path in archives):
         logger.error("❌ Backup creation failed")
         return False
+    
+    # Verify before anything records this backup: a broken one must not advance the manifest
+    if archives and backup_config.get("verify_after_backup", True):
+        failures = []
+        for archive in archives:
+            failures += verify_archive(archive, workers=workers)
+        if failures:
+            for name, problem in failures[:20]:
+                logger.error(f"   ❌ {name}: {problem}")
+            logger.error(f"❌ Backup verification failed for {len(failures)} files")
+            discard_backup(backup_folder, zip_name)
+            return False
+        print(f"🔍 Verified all file digests in {zip_name}")
+    
+    full_archive = zip_name if kind == "full" else previous.full_archive
+    try:
+        FileManifest.after_backup(plan, writer.digests, backup_type, zip_name, full_archive).save(manifest_file)
+    except OSError as e:
+        # Without a manifest the next incremental simply becomes a full backup
+        logger.warning(f"⚠️  Could not save backup manifest {manifest_file}: {e}")
+    
+    if volume_size_mb:
+        size_gb = round(volumes.size / (1024**3), 2)
+        print(f"🗜️  Backup size: {size_gb} GB in {len(archives)} volumes")
+    elif keep_local:
+        size_gb = check_size(zip_path)
+    else:
+        size_gb = round(writer.offset / (1024**3), 2)
+        print(f"☁️  Streamed {size_gb} GB without a local copy")
+    warning = size_warning(estimate, writer.stats.bytes_out)
+    if warning:
+        print(f"⚠️  WARNING: {warning}")
+    if not resumed:
+        # A resumed run only timed its remainder, so its throughput would be inflated
+        history.record(writer.stats, duration, mode, backup_type, kind)
+        try:
+            history.save(history_file)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not save estimate history {history_file}: {e}")
+    
+    if kind == "full" and size_gb < backup_config["min_size_gb"]:
+        print(f"⚠️  WARNING: Zip size ({size_gb} GB) is smaller than expected minimum ({backup_config['min_size_gb']} GB)")
+        print("   This may indicate an incomplete backup!")
+    else:
+        print(f"✅ Backup completed successfully in {duration} seconds")
+        print(f"📁 Backup location: {zip_path if keep_local else provider.get_backup_destination(backup_type)}")
+        
+    return True
+
+def main():
+    """Main backup creation function"""
+    import argparse
+    
+    parser = argparse.ArgumentParser(description="Create a BigSkyAg backup")
+    parser.add_argument("backup_type", nargs="?", choices=list(BACKUP_CONFIG["backup_types"]),
+                        help="Backup type (default: monthly on the 1st, weekly on Sundays, daily otherwise)")
+    parser.add_argument("--stream", action="store_true", default=None,
+                        help="Upload while writing instead of afterwards")
+    parser.add_argument("--volume-size", type=int, metavar="MB",
+                        help="Split the backup into standalone volumes of about MB megabytes")
+    parser.add_argument("--solid", action="store_true", default=None,
+                        help="Pack small files into solid compressed blocks")
+    parser.add_argument("--measure-cache", action="store_true",
+                        help="Report how much of the source tree is in the page cache before and after")
+    args = parser.parse_args()
+    return run_backup(backup_type=args.backup_type, stream=args.stream, volume_size_mb=args.volume_size,
+                      solid=args.solid, measure_cache=args.measure_cache)
 
 if __name__ == "__main__":
     success = main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Exclusion Rules
+One compiled matcher for the exclude patterns used by the backup writer, the tree
+scanners and the SSD mirror. Patterns use zip -x semantics: matched against the
+whole relative POSIX path, with '*' spanning '/'. Folders whose whole subtree is
+excluded are pruned, so walks never descend into them.
+"""
+
+import fnmatch
+import os
+import re
+import stat as stat_module
+import sys
+import logging
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator, List, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+class ExclusionRules:
+    """Exclude patterns compiled into a single regular expression"""
+
+    def __init__(self, patterns: Iterable[str] = ()):
+        self.patterns = tuple(patterns)
+        self._excluded = self._compile(self.patterns)
+        # A pattern ending in '*' that matches "dir/" also matches everything below it
+        self._pruned = self._compile(pattern for pattern in self.patterns if pattern.endswith("*"))
+
+    @staticmethod
+    def _compile(patterns: Iterable[str]):
+        parts = [fnmatch.translate(pattern) for pattern in patterns]
+        if not parts:
+            return lambda path: None
+        return re.compile("|".join(parts)).match
+
+    def __bool__(self) -> bool:
+        return bool(self.patterns)
+
+    def excludes(self, relative_path: str) -> bool:
+        """True when a file path (or directory path ending in '/') is excluded"""
+        return self._excluded(relative_path) is not None
+
+    def prunes(self, dir_path: str) -> bool:
+        """True when everything under a directory path (ending in '/') is excluded"""
+        return self._pruned(dir_path) is not None
+
+    def rsync_filters(self) -> List[str]:
+        """The patterns as rsync --exclude values anchored at the transfer root
+
+        '*' becomes '**' so it still spans '/', and a pattern ending in '/*' excludes
+        the folder itself, which rsync then neither copies nor deletes under --delete.
+        """
+        filters = []
+        for pattern in self.patterns:
+            rule = "/" + re.sub(r"\*+", "**", pattern)
+            if rule.endswith("/**"):
+                rule = rule[:-2]
+            filters.append(rule)
+        return filters
+
+@lru_cache(maxsize=32)
+def _compiled(patterns: Tuple[str, ...]) -> ExclusionRules:
+    return ExclusionRules(patterns)
+
+def compile_exclusions(patterns: Union[ExclusionRules, Iterable[str], None]) -> ExclusionRules:
+    """ExclusionRules for a pattern list (compiled once per distinct list)"""
+    if isinstance(patterns, ExclusionRules):
+        return patterns
+    return _compiled(tuple(patterns or ()))
+
+def walk_tree(source: Path, rules: Union[ExclusionRules, Iterable[str]] = ()) -> Iterator[Tuple[str, Path, os.stat_result]]:
+    """Walk source with os.scandir in sorted order, yielding (arcname, path, stat)
+
+    Each folder's own entry (arcname ending in '/') comes first, then its regular files,
+    then its subfolders. Pruned folders are not entered; symlinked folders are not
+    followed. Excluded entries are skipped.
+    """
+    rules = compile_exclusions(rules)
+    source = Path(source)
+
+    def walk(folder: Path, prefix: str):
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            logger.warning(f"⚠️  Could not scan {folder}: {e}")
+            return
+        subfolders = []
+        for entry in entries:
+            arcname = prefix + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink() and not rules.prunes(arcname + "/"):
+                    subfolders.append(entry)
+                continue
+            if rules.excludes(arcname):
+                continue
+            try:
+                st = entry.stat()
+            except OSError as e:
+                logger.warning(f"⚠️  Could not stat {entry.path}: {e}")
+                continue
+            if stat_module.S_ISREG(st.st_mode):
+                yield arcname, Path(entry.path), st
+
+        for entry in subfolders:
+            arcname = prefix + entry.name + "/"
+            if not rules.excludes(arcname):
+                try:
+                    yield arcname, Path(entry.path), entry.stat()
+                except OSError as e:
+                    logger.warning(f"⚠️  Could not stat {entry.path}: {e}")
+            yield from walk(Path(entry.path), arcname)
+
+    yield from walk(source, "")
+
+def main():
+    """Print the shared exclude patterns for shell scripts"""
+    import argparse
+    from config import EXCLUDE_PATTERNS
+
+    parser = argparse.ArgumentParser(description="Print the BigSkyAg exclude patterns")
+    parser.add_argument("--rsync", action="store_true", help="As rsync --exclude-from lines")
+    args = parser.parse_args()
+    rules = compile_exclusions(EXCLUDE_PATTERNS)
+    for line in (rules.rsync_filters() if args.rsync else rules.patterns):
+        print(line)
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
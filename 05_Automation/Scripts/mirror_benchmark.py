@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Mirror Benchmark
+Times single-process rsync against the native mirror engine at several worker counts
+on a small-file-heavy tree: a first copy into an empty target, then a run with nothing
+to do. Uses a generated tree (sidecars and macOS '._' files) unless --source is given.
+"""
+
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+from mirror_engine import mirror_tree
+
+logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SIDECAR_EXTENSIONS = [".xmp", ".aux.xml", ".json", ".txt"]  # Typical tiny files beside survey imagery
+
+def make_tree(root: Path, folders: int, files_per_folder: int, seed: int = 1) -> int:
+    """Generate a tree of small files, each with a '._' AppleDouble twin; returns bytes written
+
+    Files are dated a day back, like a settled tree, so the no-change run trusts them.
+    """
+    rng = random.Random(seed)
+    settled = time.time() - 86400
+    total = 0
+    for f in range(folders):
+        folder = root / f"Field_{f // 20:03d}" / f"Flight_{f:04d}"
+        folder.mkdir(parents=True)
+        for i in range(files_per_folder):
+            name = f"IMG_{i:05d}{rng.choice(SIDECAR_EXTENSIONS)}"
+            data = os.urandom(rng.randint(0, 16 * 1024))
+            (folder / name).write_bytes(data)
+            (folder / f"._{name}").write_bytes(b"\0" * 4096)
+            total += len(data) + 4096
+    for folder, _, files in os.walk(root):
+        for name in files:
+            os.utime(os.path.join(folder, name), (settled, settled))
+    return total
+
+def timed(run) -> Optional[float]:
+    started = time.perf_counter()
+    if run() is False:
+        return None
+    return time.perf_counter() - started
+
+def rsync(source: Path, target: Path) -> bool:
+    result = subprocess.run(["rsync", "-a", "--delete", f"{source}/", f"{target}/"], capture_output=True)
+    return result.returncode == 0
+
+def benchmark(source: Path, scratch: Path, workers: List[int]) -> List[tuple]:
+    """(label, first copy seconds, no-change seconds) per contender"""
+    rows = []
+    if shutil.which("rsync"):
+        target = scratch / "rsync"
+        target.mkdir()
+        rows.append(("rsync (1 process)", timed(lambda: rsync(source, target)), timed(lambda: rsync(source, target))))
+    else:
+        print("⏭ rsync not found; benchmarking the native engine only")
+
+    for count in workers:
+        target, snapshot = scratch / f"native_{count}", scratch / f"native_{count}.json.gz"
+        target.mkdir()
+        mirror = lambda: not mirror_tree(source, target, (), snapshot, workers=count).errors
+        rows.append((f"native ({count} workers)", timed(mirror), timed(mirror)))
+    return rows
+
+def main():
+    """Run the benchmark and print a table"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark rsync against the native mirror engine")
+    parser.add_argument("--source", type=Path, help="Existing tree to mirror instead of a generated one")
+    parser.add_argument("--folders", type=int, default=200, help="Generated folders")
+    parser.add_argument("--files", type=int, default=100, help="Generated files per folder (plus their '._' twins)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="Native worker counts to try")
+    parser.add_argument("--scratch", type=Path, help="Where targets go (use a folder on the SSD to measure it)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir=args.scratch) as tmp:
+        scratch = Path(tmp)
+        source = args.source
+        if source is None:
+            source = scratch / "source"
+            size = make_tree(source, args.folders, args.files)
+            print(f"🌱 Generated {args.folders * args.files * 2} files ({size / (1024 * 1024):.1f} MB) in {source}")
+
+        print(f"{'':<22}{'first copy':>12}{'no change':>12}")
+        for label, first, again in benchmark(source, scratch, args.workers):
+            cells = "".join(f"{seconds:>11.2f}s" if seconds is not None else f"{'failed':>12}" for seconds in (first, again))
+            print(f"{label:<22}{cells}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
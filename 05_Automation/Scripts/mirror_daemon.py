@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Mirror Daemon
+Keeps the SSD within seconds of the Desktop folder without rescanning it. Filesystem
+events under DESKTOP_SOURCE are appended to a durable journal; a loop applies the
+journaled paths with mirror_engine.py once events pause, holding back files still
+being written. A low-priority snapshot mirror runs at startup and periodically to
+catch anything the events missed. Events need the optional watchdog package; without
+it the snapshot mirror simply runs every few seconds.
+"""
+
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import logging
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from exclusions import compile_exclusions
+from mirror_engine import MIRROR_WORKERS, MirrorReport, mirror_paths, mirror_tree
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    FileSystemEventHandler = object
+    Observer = None
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+JOURNAL_FSYNC_SECONDS = 0.5  # Most time between journal fsyncs (the startup reconcile covers anything lost)
+JOURNAL_COMPACT_BYTES = 1024 * 1024  # A fully applied journal is emptied once it grows this large
+POLL_SECONDS = 5  # Snapshot mirror interval when watchdog isn't installed
+RECONCILE_NICE = 10  # Niceness of the reconcile process
+EVENT_TYPES = {"created", "modified", "deleted", "moved", "closed"}  # Opens and close-without-write don't matter
+
+def journal_path(state_dir: Path) -> Path:
+    """Location of the daemon's change journal"""
+    return Path(state_dir) / "mirror" / "journal.jsonl"
+
+class ChangeJournal:
+    """Append-only log of changed paths, plus how far it has been applied
+
+    Each line is [time, path]; a path ending in '/' ('/' for the root) asks for that
+    folder's own entries to be relisted, without descending into it. Appends are flushed at once and fsynced at least every
+    JOURNAL_FSYNC_SECONDS; the applied byte offset is kept beside it in an .offset file,
+    so a restarted daemon picks up where the last one stopped.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.offset_path = self.path.with_name(self.path.name + ".offset")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "ab")
+        self._synced = time.monotonic()
+        if self._file.tell():
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    self._file.write(b"\n")  # End a line cut short by a crash so it can't swallow the next one
+                    self._file.flush()
+
+    def append(self, paths: Iterable[str]):
+        """Record changed paths (relative to the mirrored folder)"""
+        stamp = time.time()
+        data = b"".join(json.dumps([stamp, path]).encode("utf-8") + b"\n" for path in paths)
+        if not data:
+            return
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            if time.monotonic() - self._synced >= JOURNAL_FSYNC_SECONDS:
+                os.fsync(self._file.fileno())
+                self._synced = time.monotonic()
+
+    def applied_offset(self) -> int:
+        try:
+            return int(self.offset_path.read_text())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def pending(self) -> Tuple[int, List[Tuple[float, str]]]:
+        """(offset after them, [(time, path)]) for the complete entries not yet applied"""
+        with self._lock:
+            size = self._file.tell()
+        start = self.applied_offset()
+        if start > size:
+            start = 0  # Emptied after the offset was written
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(size - start)
+        end = data.rfind(b"\n") + 1
+        entries = []
+        for line in data[:end].splitlines():
+            try:
+                stamp, path = json.loads(line)
+                entries.append((float(stamp), str(path)))
+            except (ValueError, TypeError):
+                logger.warning(f"⚠️  Skipping a damaged journal line: {line[:80]!r}")
+        return start + end, entries
+
+    def mark_applied(self, offset: int):
+        """Record that everything before offset is on the target, emptying a large fully applied journal"""
+        with self._lock:
+            if offset >= self._file.tell() >= JOURNAL_COMPACT_BYTES:
+                self._file.truncate(0)
+                self._file.seek(0)
+                offset = 0
+            tmp = self.offset_path.with_name(f"{self.offset_path.name}.{os.getpid()}.tmp")
+            tmp.write_text(str(offset))
+            os.replace(tmp, self.offset_path)
+
+    def close(self):
+        with self._lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+class JournalHandler(FileSystemEventHandler):
+    """Journals watchdog events
+
+    A folder 'modified' event means its entries changed. On macOS it may be the only
+    event (FSEvents coalesces, or asks for a rescan), so it is journaled as a relist of
+    that folder's direct children.
+    """
+
+    def __init__(self, daemon: "MirrorDaemon"):
+        super().__init__()
+        self.daemon = daemon
+
+    def on_any_event(self, event):
+        if event.event_type not in EVENT_TYPES:
+            return
+        if event.is_directory and event.event_type == "modified":
+            self.daemon.record([event.src_path], listing=True)
+            return
+        paths = [event.src_path]
+        if getattr(event, "dest_path", ""):
+            paths.append(event.dest_path)  # A rename changes both ends
+        self.daemon.record(paths)
+
+class MirrorDaemon:
+    """Journals changes under source and applies them to target"""
+
+    def __init__(self, source: Path, target: Path, journal: ChangeJournal, patterns: Iterable[str] = (),
+                 settings: dict = None, snapshot_file: Path = None, workers: int = MIRROR_WORKERS):
+        settings = settings or {}
+        self.source = Path(source)
+        self.target = Path(target)
+        self.journal = journal
+        self.rules = compile_exclusions(patterns)
+        self.snapshot_file = snapshot_file
+        self.workers = workers
+        self.quiet_seconds = settings.get("daemon_quiet_seconds", 2)
+        self.max_delay_seconds = settings.get("daemon_max_delay_seconds", 10)
+        self.stable_seconds = settings.get("daemon_stable_seconds", 2)
+        self.reconcile_minutes = settings.get("reconcile_minutes", 60)
+        self.last_event = 0.0
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+
+    def relative(self, path: str) -> Optional[str]:
+        """path relative to the source as a POSIX path, or None when outside it or excluded"""
+        rel = os.path.relpath(path, self.source)
+        if rel == os.curdir:
+            return ""
+        if rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            return None
+        rel = rel.replace(os.sep, "/")
+        return None if self.rules.excludes(rel) else rel
+
+    def record(self, paths: Iterable[str], listing: bool = False):
+        """Journal changed absolute paths (called from the watcher thread)
+
+        With listing=True the paths are folders whose entries changed; only their
+        direct children are relisted.
+        """
+        rels = [rel for rel in map(self.relative, paths) if rel is not None]
+        if listing:
+            rels = [rel + "/" for rel in rels]
+        if rels:
+            self.journal.append(rels)
+            self.last_event = time.monotonic()
+            self.wake.set()
+
+    def settling(self, rel: str, now: float) -> bool:
+        """True for a file modified within stable_seconds: probably still being written"""
+        try:
+            st = os.lstat(self.source / rel)
+        except OSError:
+            return False
+        return not os.path.isdir(self.source / rel) and now - st.st_mtime < self.stable_seconds
+
+    def apply_pending(self, force: bool = False) -> Optional[MirrorReport]:
+        """Apply the journaled paths once events have paused (or waited too long)
+
+        Files still being written go back into the journal for the next round, and so
+        do relists of the folders holding them.
+        """
+        offset, entries = self.journal.pending()
+        if not entries:
+            return None
+        now = time.time()
+        quiet = time.monotonic() - self.last_event >= self.quiet_seconds
+        if not (force or quiet or now - entries[0][0] >= self.max_delay_seconds):
+            return None
+
+        ready, waiting, folders = set(), set(), set()
+        for _, rel in entries:
+            if rel.endswith("/"):
+                folders.add(rel)
+            else:
+                (waiting if self.settling(rel, now) else ready).add(rel)
+        busy = folders & {rel.rpartition("/")[0] + "/" for rel in waiting}
+        waiting |= busy
+        report = mirror_paths(self.source, self.target, self.rules, ready, self.workers, folders - busy)
+        if waiting:
+            self.journal.append(sorted(waiting))
+        self.journal.mark_applied(offset)
+        return report
+
+    def reconcile(self) -> bool:
+        """Run the snapshot mirror in a low-priority child process; journaled changes wait meanwhile"""
+        command = [sys.executable, str(Path(__file__).with_name("mirror_engine.py")),
+                   str(self.source), str(self.target), "--workers", "1"]
+        if shutil.which("taskpolicy"):
+            command = ["taskpolicy", "-b", *command]  # macOS background QoS: throttled disk I/O
+        if shutil.which("nice"):
+            command = ["nice", "-n", str(RECONCILE_NICE), *command]  # Not preexec_fn: the daemon has threads
+        print("🔎 Reconciling the SSD against the Desktop folder...")
+        result = subprocess.run(command, capture_output=True, text=True)
+        lines = result.stdout.strip().splitlines()
+        if result.returncode != 0:
+            logger.warning(f"⚠️  Reconcile failed: {(result.stderr or result.stdout).strip()[-500:]}")
+            return False
+        print(f"   {lines[-1] if lines else 'done'}")
+        return True
+
+    def poll(self):
+        """Without watchdog: mirror from the snapshot every POLL_SECONDS"""
+        logger.warning(f"⚠️  watchdog not installed (pip install watchdog); mirroring every {POLL_SECONDS}s instead")
+        while not self.stopping.is_set():
+            report = mirror_tree(self.source, self.target, self.rules, self.snapshot_file, workers=self.workers)
+            if report.changed or report.errors:
+                print(f"🔁 {report.summary()}")
+            self.stopping.wait(POLL_SECONDS)
+
+    def run(self):
+        """Watch, journal and apply until stopped"""
+        if Observer is None:
+            try:
+                self.poll()
+            finally:
+                self.journal.close()
+            return
+        observer = Observer()
+        observer.schedule(JournalHandler(self), str(self.source), recursive=True)
+        observer.start()
+        print(f"👀 Watching {self.source} → {self.target}")
+        next_reconcile = 0.0  # Straight away: catches whatever changed while the daemon was down
+        try:
+            while not self.stopping.is_set():
+                if time.monotonic() >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.monotonic() + self.reconcile_minutes * 60
+                self.wake.wait(self.quiet_seconds)
+                self.wake.clear()
+                report = self.apply_pending()
+                if report is None:
+                    continue
+                if report.changed:
+                    print(f"🔁 {report.summary()}")
+                if report.errors:
+                    logger.warning(f"⚠️  {len(report.errors)} changes failed; reconciling soon")
+                    next_reconcile = min(next_reconcile, time.monotonic() + self.max_delay_seconds)
+        finally:
+            observer.stop()
+            observer.join()
+            self.apply_pending(force=True)
+            self.journal.close()
+
+def main():
+    """Run the mirror daemon for the Desktop folder and the SSD"""
+    from config import DESKTOP_SOURCE, EXCLUDE_PATTERNS, MIRROR_CONFIG, STATE_DIR, ensure_critical_folders, get_folder_path
+    from mirror_engine import snapshot_path
+
+    ensure_critical_folders()
+    target = get_folder_path("automation").parent
+    if not DESKTOP_SOURCE.exists():
+        print(f"⏭ Desktop BigSkyAg folder not found at {DESKTOP_SOURCE}")
+        return False
+
+    daemon = MirrorDaemon(DESKTOP_SOURCE, target, ChangeJournal(journal_path(STATE_DIR)), EXCLUDE_PATTERNS,
+                          MIRROR_CONFIG, snapshot_path(STATE_DIR, DESKTOP_SOURCE, target), MIRROR_CONFIG["workers"])
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stopping.set())
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+    print("🛑 Mirror daemon stopped")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,704 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Native Mirror Engine
+Mirrors a tree like rsync -a --delete, but remembers what it mirrored last time: a
+snapshot of every folder (mtime, mode, listing) and file (size, mtime, inode, mode).
+Folders whose mtime hasn't moved are not relisted, their files are compared against
+the snapshot instead of the target, and only changed files are copied (with
+copy_file_range where the platform has it), by a few threads working through
+balanced shards. A run with nothing to do costs one stat per folder and file on the
+source.
+"""
+
+import errno
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import stat as stat_module
+import sys
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from exclusions import ExclusionRules, compile_exclusions
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+RACY_SECONDS = 2  # Mtimes this close to the scan can still change within the same clock tick, so they are never trusted
+COPY_CHUNK = 64 * 1024 * 1024  # Bytes per copy_file_range call
+FILE_COST = 256 * 1024  # Bytes a file's create/rename/utime overhead is worth when balancing shards
+MIRROR_WORKERS = 4  # Copy threads (copies release the GIL in the kernel)
+TEMP_PREFIX = ".bsk-mirror-"  # Files are written under this name, then renamed into place
+# copy_file_range refusals (other filesystem, unsupported file) that fall back to a plain copy
+COPY_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF}
+
+def snapshot_path(state_dir: Path, source: Path, target: Path) -> Path:
+    """Location of the snapshot for one source/target pair (kept outside the mirrored tree)"""
+    key = hashlib.sha1(f"{Path(source)}\0{Path(target)}".encode("utf-8")).hexdigest()[:16]
+    return Path(state_dir) / "mirror" / f"{key}.json.gz"
+
+def changes_path(state_dir: Path) -> Path:
+    """Location of the last mirror run's change list, for later stages to read instead of rescanning"""
+    return Path(state_dir) / "mirror" / "changes.txt.gz"
+
+def _file_sig(st: os.stat_result) -> list:
+    return [st.st_size, st.st_mtime_ns, st.st_ino, st.st_mode]
+
+class TreeSnapshot:
+    """The tree as of the last mirror run
+
+    dirs maps a folder ("" for the root, else "a/b/") to [mtime_ns, mode, files,
+    subfolders, links], files maps a path to [size, mtime_ns, inode, mode] and links
+    maps a symlink path to its target. An mtime of 0 (folders) or -1 (files) marks a
+    value that must not be trusted next time.
+    """
+
+    def __init__(self, source: str, target: str, patterns: Iterable[str] = (), target_id: list = None,
+                 dirs: Dict[str, list] = None, files: Dict[str, list] = None, links: Dict[str, str] = None,
+                 complete: bool = True, created: float = None):
+        self.source = str(source)
+        self.target = str(target)
+        self.patterns = list(patterns)
+        self.target_id = target_id
+        self.dirs = dirs if dirs is not None else {}
+        self.files = files if files is not None else {}
+        self.links = links if links is not None else {}
+        self.complete = complete  # False when the run hit errors; the next run then compares against the target
+        self.created = created
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["TreeSnapshot"]:
+        """Load a snapshot, or None when missing or unreadable (forcing a full comparison)"""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable mirror snapshot {path}: {e}")
+            return None
+        if data.get("version") != SNAPSHOT_VERSION:
+            logger.warning(f"⚠️  Ignoring mirror snapshot with unknown version: {path}")
+            return None
+        return cls(data["source"], data["target"], data["patterns"], data.get("target_id"),
+                   data["dirs"], data["files"], data["links"], data.get("complete", False), data.get("created"))
+
+    def save(self, path: Path):
+        """Write the snapshot atomically"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            "version": SNAPSHOT_VERSION,
+            "source": self.source,
+            "target": self.target,
+            "patterns": self.patterns,
+            "target_id": self.target_id,
+            "complete": self.complete,
+            "created": self.created,
+            "dirs": self.dirs,
+            "files": self.files,
+            "links": self.links,
+        }
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def usable_for(self, other: "TreeSnapshot") -> bool:
+        """True when this snapshot describes the same mirror and can be trusted"""
+        return (self.complete and self.source == other.source and self.target == other.target
+                and self.patterns == other.patterns and self.target_id == other.target_id)
+
+class MirrorReport:
+    """What one mirror run changed on the target"""
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.updated: List[str] = []
+        self.deleted: List[str] = []       # Files and symlinks
+        self.created_dirs: List[str] = []
+        self.deleted_dirs: List[str] = []
+        self.errors: List[str] = []
+        self.bytes_copied = 0
+        self.folders_checked = 0
+        self.folders_listed = 0            # Folders whose mtime moved (or had no snapshot) and were relisted
+        self.files_checked = 0
+        self.full = False                  # Compared against the target rather than a snapshot
+        self.seconds = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.deleted or self.created_dirs or self.deleted_dirs)
+
+    def change_lines(self) -> List[str]:
+        """One line per change: '+' added, 'M' updated, '-' deleted (folders end in '/')"""
+        lines = [f"+ {path}" for path in self.created_dirs]
+        lines += [f"+ {path}" for path in self.added]
+        lines += [f"M {path}" for path in self.updated]
+        lines += [f"- {path}" for path in self.deleted]
+        lines += [f"- {path}" for path in self.deleted_dirs]
+        return lines
+
+    @classmethod
+    def from_lines(cls, lines: Iterable[str]) -> "MirrorReport":
+        """Rebuild a report's change lists from change_lines() output"""
+        report = cls()
+        for line in lines:
+            kind, path = line[0], line[2:]
+            folder = path.endswith("/")
+            if kind == "+":
+                (report.created_dirs if folder else report.added).append(path)
+            elif kind == "M":
+                report.updated.append(path)
+            elif kind == "-":
+                (report.deleted_dirs if folder else report.deleted).append(path)
+        return report
+
+    def save_changes(self, path: Path, **info):
+        """Write the change list atomically: a JSON header line (info plus totals), then one change per line"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        header = dict(info, finished=time.time(), complete=not self.errors, bytes_copied=self.bytes_copied)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=1) as f:
+            f.write(json.dumps(header) + "\n")
+            for line in self.change_lines():
+                f.write(line + "\n")
+        os.replace(tmp, path)
+
+    @classmethod
+    def load_changes(cls, path: Path) -> Optional[Tuple[dict, "MirrorReport"]]:
+        """The header and changes of a saved change list, or None when missing or unreadable"""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+                report = cls.from_lines(line.rstrip("\n") for line in f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️  Ignoring unreadable mirror change list {path}: {e}")
+            return None
+        report.bytes_copied = header.get("bytes_copied", 0)
+        return header, report
+
+    def summary(self) -> str:
+        return (f"{len(self.added)} added, {len(self.updated)} updated, "
+                f"{len(self.deleted) + len(self.deleted_dirs)} deleted, "
+                f"{len(self.created_dirs)} folders created, {self.bytes_copied / (1024 * 1024):.1f} MB copied; "
+                f"{self.files_checked} files in {self.folders_checked} folders checked, "
+                f"{self.folders_listed} relisted, in {self.seconds:.2f}s")
+
+def _copy_file_range(src: str, dst: str) -> bool:
+    """Copy src to dst in the kernel (reflinked where the filesystem allows); False when unsupported"""
+    if not hasattr(os, "copy_file_range"):
+        return False
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            while os.copy_file_range(fsrc.fileno(), fdst.fileno(), COPY_CHUNK):
+                pass
+        except OSError as e:
+            if e.errno in COPY_FALLBACK_ERRNOS:
+                return False
+            raise
+    return True
+
+def copy_file(src: str, dst: str, st: os.stat_result):
+    """Copy one file into place atomically, keeping its mode and times"""
+    tmp = os.path.join(os.path.dirname(dst), TEMP_PREFIX + os.path.basename(dst))
+    try:
+        if not _copy_file_range(src, tmp):
+            shutil.copyfile(src, tmp)  # fcopyfile on macOS, sendfile on Linux
+        os.chmod(tmp, stat_module.S_IMODE(st.st_mode))
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dst)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def place_link(link: str, dst: str):
+    """Create or replace a symlink atomically"""
+    tmp = os.path.join(os.path.dirname(dst), TEMP_PREFIX + os.path.basename(dst))
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    os.symlink(link, tmp)
+    os.replace(tmp, dst)
+
+def shard_jobs(jobs: List[tuple], count: int) -> List[List[tuple]]:
+    """Split copy jobs (in walk order) into up to count contiguous shards of about equal cost
+
+    A file costs its size plus FILE_COST, so shards balance file count against bytes.
+    Contiguous shards keep each folder's files together on one worker.
+    """
+    costs = [job[3].st_size + FILE_COST for job in jobs]
+    count = max(1, min(count, len(jobs)))
+    share = sum(costs) / count
+    shards, spent = [[] for _ in range(count)], 0
+    for job, cost in zip(jobs, costs):
+        # Each job goes to the shard its midpoint falls in
+        shards[min(count - 1, int((spent + cost / 2) / share))].append(job)
+        spent += cost
+    return [shard for shard in shards if shard]
+
+def _kind(mode: int) -> Optional[str]:
+    if stat_module.S_ISDIR(mode):
+        return "d"
+    if stat_module.S_ISREG(mode):
+        return "f"
+    if stat_module.S_ISLNK(mode):
+        return "l"
+    return None
+
+class _Mirror:
+    """One run of the engine"""
+
+    def __init__(self, source: Path, target: Path, rules: ExclusionRules, old: Optional[TreeSnapshot],
+                 new: TreeSnapshot, report: MirrorReport):
+        self.source = str(source)
+        self.target = str(target)
+        self.rules = rules
+        self.old = old or TreeSnapshot(source, target)
+        self.new = new
+        self.report = report
+        self.full = old is None
+        self.copies: List[tuple] = []       # (path, source file, target file, stat, added), in walk order
+        self.folder_times: List[tuple] = []  # (target folder, source stat) to restore after the copies
+        self.racy_ns = time.time_ns() - RACY_SECONDS * 1_000_000_000
+
+    def error(self, message: str):
+        logger.warning(f"⚠️  {message}")
+        self.report.errors.append(message)
+
+    # --- Source listings ---
+
+    def cached_listing(self, src_dir: str, rel: str, old: list) -> Optional[tuple]:
+        """The folder's entries from the snapshot, restatted; None when the snapshot is stale"""
+        files, subdirs, links = [], [], []
+        try:
+            for name in old[2]:
+                st = os.lstat(os.path.join(src_dir, name))
+                if not stat_module.S_ISREG(st.st_mode):
+                    return None
+                files.append((name, st))
+            for name in old[3]:
+                st = os.lstat(os.path.join(src_dir, name))
+                if not stat_module.S_ISDIR(st.st_mode):
+                    return None
+                subdirs.append((name, st))
+        except FileNotFoundError:
+            return None
+        for name in old[4]:
+            link = self.old.links.get(rel + name)
+            if link is None:
+                return None
+            links.append((name, link))
+        return files, subdirs, links, set()
+
+    def list_dir(self, src_dir: str, rel: str) -> Optional[tuple]:
+        """The folder's entries that are mirrored, read from disk"""
+        files, subdirs, links, unreadable = [], [], [], set()
+        try:
+            with os.scandir(src_dir) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except OSError as e:
+            self.error(f"Could not scan {src_dir}: {e}")
+            return None
+        for entry in entries:
+            path = rel + entry.name
+            try:
+                st = entry.stat(follow_symlinks=False)
+                kind = _kind(st.st_mode)
+                if kind == "d":
+                    if not self.rules.prunes(path + "/"):
+                        subdirs.append((entry.name, st))
+                elif kind is None or self.rules.excludes(path):
+                    continue
+                elif kind == "f":
+                    files.append((entry.name, st))
+                else:
+                    links.append((entry.name, os.readlink(entry.path)))
+            except FileNotFoundError:
+                continue  # Deleted since the listing; gone from the target too
+            except OSError as e:
+                self.error(f"Could not stat {entry.path}: {e}")
+                unreadable.add(entry.name)  # Never deleted from the target for being unreadable
+        return files, subdirs, links, unreadable
+
+    # --- Target changes ---
+
+    def remove(self, dst: str, rel: str):
+        """Delete a file, symlink or folder from the target, keeping excluded paths"""
+        try:
+            st = os.lstat(dst)
+        except FileNotFoundError:
+            return
+        if not stat_module.S_ISDIR(st.st_mode):
+            os.unlink(dst)
+            self.report.deleted.append(rel)
+            return
+
+        with os.scandir(dst) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        for entry in entries:
+            path = rel + entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if not self.rules.prunes(path + "/"):
+                    self.remove(entry.path, path + "/")
+            elif not self.rules.excludes(path):
+                os.unlink(entry.path)
+                self.report.deleted.append(path)
+        try:
+            os.rmdir(dst)
+            self.report.deleted_dirs.append(rel)
+        except OSError as e:
+            if e.errno not in (errno.ENOTEMPTY, errno.EEXIST):
+                raise
+            logger.info(f"📌 Kept {rel} on the target: it holds excluded files")
+
+    def target_entries(self, dst_dir: str, rel: str) -> Optional[Dict[str, str]]:
+        """Kinds of the entries in a target folder, creating it when missing"""
+        try:
+            st = os.lstat(dst_dir)
+        except FileNotFoundError:
+            st = None
+        if st is not None and not stat_module.S_ISDIR(st.st_mode):
+            self.remove(dst_dir, rel.rstrip("/"))
+            st = None
+        if st is None:
+            os.mkdir(dst_dir)
+            self.report.created_dirs.append(rel)
+            return {}
+        entries = {}
+        with os.scandir(dst_dir) as it:
+            for entry in it:
+                entries[entry.name] = _kind(entry.stat(follow_symlinks=False).st_mode)
+        return entries
+
+    # --- The walk ---
+
+    def sync_dir(self, rel: str, st: os.stat_result, recursive: bool = True):
+        """Bring one target folder (and everything below it) in line with the source
+
+        With recursive=False only the folder's own entries are brought in line: subfolders
+        already on the target are left as they are, new ones are copied whole.
+        """
+        report = self.report
+        report.folders_checked += 1
+        src_dir = os.path.join(self.source, rel)
+        dst_dir = os.path.join(self.target, rel)
+        old = None if self.full else self.old.dirs.get(rel)
+
+        listing = None
+        if old is not None and old[0] == st.st_mtime_ns:
+            listing = self.cached_listing(src_dir, rel, old)
+        cached = listing is not None
+        if listing is None:
+            report.folders_listed += 1
+            listing = self.list_dir(src_dir, rel)
+            if listing is None:
+                return
+        files, subdirs, links, unreadable = listing
+
+        try:
+            targets = self.target_entries(dst_dir, rel) if old is None else None
+        except OSError as e:
+            self.error(f"Could not prepare {dst_dir}: {e}")
+            return
+        touched = old is None
+
+        # Deletions first, like rsync's --delete-during, so type changes make room
+        wanted = {name: "f" for name, _ in files}
+        wanted.update((name, "l") for name, _ in links)
+        wanted.update((name, "d") for name, _ in subdirs)
+        if targets is not None:
+            doomed = [(name, kind) for name, kind in targets.items()
+                      if wanted.get(name) != kind and name not in unreadable
+                      and not (self.rules.prunes(rel + name + "/") if kind == "d" else self.rules.excludes(rel + name))]
+        elif not cached:
+            doomed = [(name, kind) for kind, names in (("f", old[2]), ("d", old[3]), ("l", old[4]))
+                      for name in names if wanted.get(name) != kind and name not in unreadable]
+        else:
+            doomed = []
+        for name, kind in doomed:
+            try:
+                self.remove(os.path.join(dst_dir, name), rel + name + ("/" if kind == "d" else ""))
+                touched = True
+            except OSError as e:
+                self.error(f"Could not delete {rel + name}: {e}")
+
+        for name, fst in files:
+            path = rel + name
+            sig = _file_sig(fst)
+            report.files_checked += 1
+            if targets is None:
+                previous = self.old.files.get(path)
+                unchanged = previous == sig
+                added = previous is None
+            else:
+                unchanged = targets.get(name) == "f" and self.target_matches(os.path.join(dst_dir, name), fst)
+                added = name not in targets
+            if not unchanged:
+                self.copies.append((path, os.path.join(src_dir, name), os.path.join(dst_dir, name), fst, added))
+                touched = True
+            if fst.st_mtime_ns >= self.racy_ns:
+                sig[1] = -1
+            self.new.files[path] = sig
+
+        for name, link in links:
+            path = rel + name
+            dst = os.path.join(dst_dir, name)
+            if targets is None:
+                previous = self.old.links.get(path)
+                unchanged, added = previous == link, previous is None
+            else:
+                unchanged = targets.get(name) == "l" and os.readlink(dst) == link
+                added = name not in targets
+            if not unchanged:
+                try:
+                    place_link(link, dst)
+                except OSError as e:
+                    self.error(f"Could not link {path}: {e}")
+                    continue
+                (report.added if added else report.updated).append(path)
+                touched = True
+            self.new.links[path] = link
+
+        mtime = st.st_mtime_ns if st.st_mtime_ns < self.racy_ns else 0
+        self.new.dirs[rel] = [mtime, st.st_mode, [name for name, _ in files],
+                              [name for name, _ in subdirs], [name for name, _ in links]]
+
+        for name, sst in subdirs:
+            if recursive or targets is None or targets.get(name) != "d":
+                self.sync_dir(rel + name + "/", sst)
+
+        # Children landing in a folder move its mtime; the source's goes back once the copies are done
+        if touched or (old is not None and old[1] != st.st_mode):
+            self.folder_times.append((dst_dir, st))
+
+    def run_copies(self, workers: int = 1):
+        """Copy the queued files in balanced shards, one per worker, then restore folder times"""
+        def run(shard):
+            results = []
+            for job in shard:
+                try:
+                    copy_file(job[1], job[2], job[3])
+                    results.append((job, None))
+                except OSError as e:
+                    results.append((job, e))
+            return results
+
+        shards = shard_jobs(self.copies, workers)
+        if len(shards) > 1:
+            with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+                done = list(pool.map(run, shards))
+        else:
+            done = [run(shard) for shard in shards]
+
+        for results in done:
+            for (path, _, _, st, added), e in results:
+                if e is not None:
+                    self.error(f"Could not copy {path}: {e}")
+                    self.new.files.pop(path, None)
+                    continue
+                (self.report.added if added else self.report.updated).append(path)
+                self.report.bytes_copied += st.st_size
+        self.copies = []
+
+        for dst_dir, st in self.folder_times:
+            try:
+                os.chmod(dst_dir, stat_module.S_IMODE(st.st_mode))
+                os.utime(dst_dir, ns=(st.st_atime_ns, st.st_mtime_ns))
+            except OSError as e:
+                self.error(f"Could not set times on {dst_dir}: {e}")
+        self.folder_times = []
+
+    def sync_path(self, rel: str, recursive: bool = True):
+        """Bring one path anywhere in the tree (and everything below it) in line with the source
+
+        Missing target folders above it are created; a path gone from the source is
+        deleted from the target; excluded paths are left alone. With recursive=False a
+        folder's existing subfolders aren't descended into (see sync_dir).
+        """
+        rel = rel.strip("/")
+        if not rel:
+            self.sync_dir("", os.stat(self.source), recursive)
+            return
+        parents = rel.split("/")[:-1]
+        for i in range(len(parents)):
+            if self.rules.prunes("/".join(parents[:i + 1]) + "/"):
+                return
+        src, dst = os.path.join(self.source, rel), os.path.join(self.target, rel)
+        try:
+            st = os.lstat(src)
+        except FileNotFoundError:
+            try:
+                is_dir = stat_module.S_ISDIR(os.lstat(dst).st_mode)
+            except FileNotFoundError:
+                return
+            if self.rules.prunes(rel + "/") if is_dir else self.rules.excludes(rel):
+                return
+            try:
+                self.remove(dst, rel + "/" if is_dir else rel)
+                self.restore_parent_time(rel)
+            except OSError as e:
+                self.error(f"Could not delete {rel}: {e}")
+            return
+
+        kind = _kind(st.st_mode)
+        if kind is None or (self.rules.prunes(rel + "/") if kind == "d" else self.rules.excludes(rel)):
+            return
+        try:
+            self.make_parents(parents)
+        except OSError as e:
+            self.error(f"Could not create the folders for {rel}: {e}")
+            return
+        if kind == "d":
+            self.restore_parent_time(rel)
+            self.sync_dir(rel + "/", st, recursive)
+        elif kind == "f":
+            self.report.files_checked += 1
+            if not self.target_matches(dst, st):
+                self.copies.append((rel, src, dst, st, not os.path.lexists(dst)))
+                self.restore_parent_time(rel)
+        else:
+            link = os.readlink(src)
+            try:
+                if os.path.islink(dst) and os.readlink(dst) == link:
+                    return
+                added = not os.path.lexists(dst)
+                if os.path.isdir(dst) and not os.path.islink(dst):
+                    self.remove(dst, rel + "/")
+                place_link(link, dst)
+            except OSError as e:
+                self.error(f"Could not link {rel}: {e}")
+                return
+            (self.report.added if added else self.report.updated).append(rel)
+            self.restore_parent_time(rel)
+
+    def make_parents(self, parents: List[str]):
+        """Create the target folders leading to a path, in order, with the source's modes"""
+        for i in range(len(parents)):
+            rel = "/".join(parents[:i + 1]) + "/"
+            dst = os.path.join(self.target, rel)
+            try:
+                if stat_module.S_ISDIR(os.lstat(dst).st_mode):
+                    continue
+                self.remove(dst, rel.rstrip("/"))
+            except FileNotFoundError:
+                pass
+            os.mkdir(dst)
+            self.report.created_dirs.append(rel)
+            self.folder_times.append((dst, os.stat(os.path.join(self.source, rel))))
+
+    def restore_parent_time(self, rel: str):
+        """Queue the source folder's times for the target folder holding rel"""
+        parent = rel.rstrip("/").rpartition("/")[0]
+        try:
+            st = os.stat(os.path.join(self.source, parent))
+        except OSError:
+            return
+        self.folder_times.append((os.path.join(self.target, parent), st))
+
+    @staticmethod
+    def target_matches(dst: str, st: os.stat_result) -> bool:
+        """rsync's quick check: same size, mtime and permissions"""
+        try:
+            tst = os.lstat(dst)
+        except OSError:
+            return False
+        return (tst.st_size == st.st_size and tst.st_mtime_ns == st.st_mtime_ns
+                and stat_module.S_IMODE(tst.st_mode) == stat_module.S_IMODE(st.st_mode))
+
+def mirror_tree(source: Path, target: Path, rules: Union[ExclusionRules, Iterable[str]] = (),
+                snapshot_file: Path = None, full: bool = False, workers: int = MIRROR_WORKERS) -> MirrorReport:
+    """Mirror source onto target (rsync -a --delete semantics), copying only what changed
+
+    The walk deletes and creates folders in order; changed files are then copied by
+    up to workers threads. Excluded paths are neither copied nor deleted. Without a usable snapshot (first run,
+    different exclusions, another target disk, errors last time) or with full=True
+    every folder is compared against the target instead, and the snapshot rebuilt.
+    """
+    started = time.perf_counter()
+    rules = compile_exclusions(rules)
+    source, target = Path(source), Path(target)
+    source_st = os.stat(source)
+    target_st = os.stat(target)
+
+    new = TreeSnapshot(source, target, rules.patterns, [target_st.st_dev, target_st.st_ino], created=time.time())
+    old = TreeSnapshot.load(snapshot_file) if snapshot_file and not full else None
+    if old is not None and not old.usable_for(new):
+        logger.info("🔄 Mirror snapshot doesn't match this run; comparing against the target")
+        old = None
+
+    report = MirrorReport()
+    report.full = old is None
+    mirror = _Mirror(source, target, rules, old, new, report)
+    mirror.sync_dir("", source_st)
+    mirror.run_copies(workers)
+
+    new.complete = not report.errors
+    if snapshot_file:
+        new.save(snapshot_file)
+    report.seconds = time.perf_counter() - started
+    return report
+
+def mirror_paths(source: Path, target: Path, rules: Union[ExclusionRules, Iterable[str]],
+                 paths: Iterable[str], workers: int = MIRROR_WORKERS, folders: Iterable[str] = ()) -> MirrorReport:
+    """Mirror just the given paths (relative to source, each with everything below it)
+
+    folders are relisted without descending: their direct children are copied or
+    deleted, and only subfolders new to the target are copied whole. Paths under
+    another listed path are covered by it. The snapshot isn't touched: the next
+    mirror_tree run recopies anything it doesn't know about, which is harmless.
+    """
+    started = time.perf_counter()
+    rules = compile_exclusions(rules)
+    source, target = Path(source), Path(target)
+    report = MirrorReport()
+    report.full = True
+    mirror = _Mirror(source, target, rules, None, TreeSnapshot(source, target), report)
+
+    entries = {(path.strip("/"), True) for path in paths} | {(path.strip("/"), False) for path in folders}
+    covered = None
+    for rel, recursive in sorted(entries, key=lambda entry: (entry[0], not entry[1])):
+        if covered is not None and (rel + "/").startswith(covered):
+            continue
+        mirror.sync_path(rel, recursive)
+        if recursive:
+            covered = rel + "/" if rel else ""
+    mirror.run_copies(workers)
+    report.seconds = time.perf_counter() - started
+    return report
+
+def main():
+    """Mirror one folder onto another from the command line"""
+    import argparse
+    from config import EXCLUDE_PATTERNS, STATE_DIR
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Mirror a folder like rsync -a --delete, copying only changes")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("target", type=Path)
+    parser.add_argument("--full", action="store_true", help="Compare every file against the target")
+    parser.add_argument("--changes", action="store_true", help="List every change")
+    parser.add_argument("--workers", type=int, default=MIRROR_WORKERS, help="Copy threads")
+    args = parser.parse_args()
+
+    report = mirror_tree(args.source, args.target, EXCLUDE_PATTERNS,
+                         snapshot_path(STATE_DIR, args.source, args.target), full=args.full, workers=args.workers)
+    if args.changes:
+        for line in report.change_lines():
+            print(line)
+    print(f"{'⚠️ ' if report.errors else '✅'} {report.summary()}")
+    return not report.errors
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
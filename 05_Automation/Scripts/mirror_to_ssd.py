@@ -4,17 +4,157 @@ Syncs the Desktop BigSkyAg folder to the SSD for backup and performance
 """
 
 import os
+import re
 import subprocess
+import time
 import logging
 from pathlib import Path
-from config import ensure_critical_folders, DESKTOP_SOURCE, get_folder_path
+from typing import Iterator, Optional, Tuple
+from config import ensure_critical_folders, DESKTOP_SOURCE, EXCLUDE_PATTERNS, MIRROR_CONFIG, STATE_DIR, get_folder_path
+from exclusions import compile_exclusions
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def mirror_to_ssd():
-    """Mirror the Desktop BigSkyAg folder to the SSD"""
+SHOW_CHANGES = 20  # Changes listed after a mirror run
+PROGRESS_SECONDS = 5  # Seconds between live progress lines
+READ_CHUNK = 64 * 1024  # Bytes read from rsync's output at a time
+
+# --itemize-changes lines: update type, file type, attribute flags (9 on rsync 3, 7 on 2.6), path
+ITEMIZED_RE = re.compile(r"^([<>ch.])([fdLDS])([.+?a-zA-Z ]{7,9}) (.+)$")
+# --info=progress2 lines: "  1,234,567  45%   12.34MB/s    0:00:10 (xfr#12, to-chk=100/2000)"
+PROGRESS_RE = re.compile(r"^\s*([\d,]+)\s+(\d+)%\s+(\S+/s)\s+(\d+:\d{2}:\d{2})")
+
+def rsync_has_progress2() -> bool:
+    """True when rsync is 3.1 or newer; macOS ships 2.6.9 (or openrsync), which lacks --info"""
+    try:
+        result = subprocess.run(["rsync", "--version"], capture_output=True, text=True)
+    except OSError:
+        return False
+    match = re.search(r"version\s+(\d+)\.(\d+)", result.stdout)
+    return bool(match) and (int(match.group(1)), int(match.group(2))) >= (3, 1)
+
+def output_lines(stream) -> Iterator[str]:
+    """rsync's output line by line as it arrives, splitting on '\\r' too so progress updates come through"""
+    pending = b""
+    for chunk in iter(lambda: stream.read1(READ_CHUNK), b""):
+        parts = re.split(rb"[\r\n]", pending + chunk)
+        pending = parts.pop()
+        for part in parts:
+            if part:
+                yield part.decode("utf-8", "replace")
+    if pending:
+        yield pending.decode("utf-8", "replace")
+
+def parse_itemized(line: str) -> Optional[Tuple[str, str]]:
+    """(change, path) for an itemized line that changed content: '+' added, 'M' updated, '-' deleted
+
+    Folder paths end in '/'. Attribute-only updates and non-itemized lines give None.
+    """
+    if line.startswith("*deleting"):
+        return "-", line[len("*deleting"):].lstrip(" ")
+    match = ITEMIZED_RE.match(line)
+    if not match:
+        return None
+    update, file_type, flags, path = match.groups()
+    if update == ".":
+        return None
+    if file_type == "L":
+        path = path.split(" -> ", 1)[0]
+    if file_type == "d":
+        return ("+", path) if flags.startswith("+") else None
+    return ("+" if flags.startswith("+") else "M"), path
+
+def run_rsync(source: Path, target: Path, progress2: bool = None):
+    """Run rsync -a --delete, reading its itemized output as a stream
+
+    Prints throughput every PROGRESS_SECONDS and returns (return code, MirrorReport),
+    the report holding every content change rsync made.
+    """
+    from mirror_engine import MirrorReport
+
+    if progress2 is None:
+        progress2 = rsync_has_progress2()
+    excludes = [f"--exclude={rule}" for rule in compile_exclusions(EXCLUDE_PATTERNS).rsync_filters()]
+    command = ["rsync", "-a", "--delete", "--itemize-changes", *excludes, f"{source}/", f"{target}/"]
+    if progress2:
+        command[2:2] = ["--info=progress2", "--no-inc-recursive"]  # Whole-tree totals, so the percentage means something
+
+    report = MirrorReport()
+    started = last_shown = time.perf_counter()
+    progress = None
+    changes = 0
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    with process:
+        for line in output_lines(process.stdout):
+            change = parse_itemized(line)
+            if change is not None:
+                kind, path = change
+                if kind == "+":
+                    (report.created_dirs if path.endswith("/") else report.added).append(path)
+                elif kind == "M":
+                    report.updated.append(path)
+                else:
+                    (report.deleted_dirs if path.endswith("/") else report.deleted).append(path)
+                changes += 1
+            elif PROGRESS_RE.match(line):
+                progress = PROGRESS_RE.match(line).groups()
+            elif line.startswith("rsync") or line.startswith("file has vanished"):
+                logger.warning(f"⚠️  {line}")
+                report.errors.append(line)
+
+            now = time.perf_counter()
+            if now - last_shown >= PROGRESS_SECONDS:
+                last_shown = now
+                if progress:
+                    copied, percent, rate, eta = progress
+                    print(f"📈 {int(copied.replace(',', '')) / (1024 * 1024):,.0f} MB, {percent}% at {rate}, "
+                          f"ETA {eta}, {changes} changes", flush=True)
+                else:
+                    print(f"📈 {changes} changes, {changes / (now - started):,.0f}/s", flush=True)
+
+    report.seconds = time.perf_counter() - started
+    if progress:
+        report.bytes_copied = int(progress[0].replace(",", ""))
+    return process.returncode, report
+
+def show_changes(report, target: Path, engine: str):
+    """List the first SHOW_CHANGES changes and save them all for the stages after the mirror"""
+    from mirror_engine import changes_path
+
+    lines = report.change_lines()
+    for line in lines[:SHOW_CHANGES]:
+        print(f"   {line}")
+    if len(lines) > SHOW_CHANGES:
+        print(f"   ... and {len(lines) - SHOW_CHANGES} more")
+    try:
+        report.save_changes(changes_path(STATE_DIR), source=str(DESKTOP_SOURCE), target=str(target),
+                            engine=engine)
+    except OSError as e:
+        logger.warning(f"⚠️  Could not save the mirror change list: {e}")
+
+def mirror_native(target: Path, full: bool = False) -> bool:
+    """Mirror with mirror_engine.py, which copies only what changed since its last snapshot"""
+    from mirror_engine import mirror_tree, snapshot_path
+
+    report = mirror_tree(DESKTOP_SOURCE, target, EXCLUDE_PATTERNS,
+                         snapshot_path(STATE_DIR, DESKTOP_SOURCE, target), full=full,
+                         workers=MIRROR_CONFIG["workers"])
+    show_changes(report, target, "native")
+    if report.errors:
+        logger.error(f"❌ Native mirror hit {len(report.errors)} errors ({report.summary()})")
+        return False
+    print(f"✅ SSD sync completed successfully ({report.summary()})")
+    return True
+
+def mirror_to_ssd(engine: str = None, full: bool = False):
+    """Mirror the Desktop BigSkyAg folder to the SSD
+
+    engine is "rsync" or "native" (default from MIRROR_CONFIG); full makes the native
+    engine compare every file against the SSD instead of trusting its snapshot.
+    """
+    engine = engine or MIRROR_CONFIG["engine"]
     
     # Ensure all critical folders exist
     ensure_critical_folders()
@@ -36,31 +176,23 @@ def mirror_to_ssd():
     print("📊 This may take a while depending on file sizes...")
     
     try:
-        # Run rsync with progress and error handling
-        result = subprocess.run([
-            "rsync", "-av", "--delete",
-            "--exclude", "*.DS_Store",
-            "--exclude", "__MACOSX",
-            "--exclude", ".git",
-            "--exclude", "*.tmp",
-            f"{DESKTOP_SOURCE}/",
-            f"{target}/"
-        ], capture_output=True, text=True)
+        if engine == "native":
+            return mirror_native(target, full)
+
+        # Run rsync, following its progress and itemized changes as they stream in
+        returncode, report = run_rsync(DESKTOP_SOURCE, target)
+        if returncode != 0:
+            report.errors.append(f"rsync exited with {returncode}")
+        show_changes(report, target, "rsync")
         
-        if result.returncode == 0:
-            print("✅ SSD sync completed successfully")
-            
-            # Show some stats if available
-            if result.stdout:
-                lines = result.stdout.strip().split('\n')
-                if lines:
-                    print(f"📁 Synced {len(lines)} items")
-            
+        if returncode == 0:
+            rate = report.bytes_copied / (1024 * 1024) / max(report.seconds, 0.001)
+            print(f"✅ SSD sync completed successfully in {report.seconds:.1f}s ({rate:.1f} MB/s)")
+            print(f"📁 {len(report.added)} added, {len(report.updated)} updated, "
+                  f"{len(report.deleted) + len(report.deleted_dirs)} deleted, {len(report.created_dirs)} folders created")
             return True
         else:
-            logger.error(f"❌ rsync failed with return code {result.returncode}")
-            if result.stderr:
-                logger.error(f"Error output: {result.stderr}")
+            logger.error(f"❌ rsync failed with return code {returncode}")
             return False
             
     except FileNotFoundError:
@@ -72,9 +204,17 @@ def mirror_to_ssd():
 
 def main():
     """Main function"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mirror the Desktop BigSkyAg folder to the SSD")
+    parser.add_argument("--engine", choices=["rsync", "native"], help="Override MIRROR_CONFIG['engine']")
+    parser.add_argument("--full", action="store_true",
+                        help="Native engine: compare every file against the SSD instead of the last snapshot")
+    args = parser.parse_args()
+
     print("🚀 Starting BigSkyAg SSD mirror operation...")
     
-    success = mirror_to_ssd()
+    success = mirror_to_ssd(args.engine, args.full)
     
     if success:
         print("✅ SSD mirror operation completed successfully")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Page-Cache-Friendly Reads
+Opens source files for backup so that reading the whole tree does not evict the
+page cache other apps (QGIS) rely on: sequential read-ahead hints, dropping the
+pages the backup itself brought in, optional O_DIRECT for very large files, and a
+residency measurement (mincore) to see how much of the tree is cached
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import io
+import mmap
+import os
+import sys
+import logging
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("drop", "keep")
+CACHE_MODE = "drop"        # drop: release pages the backup read; keep: plain reads
+DIRECT_MIN = 0             # Files at least this large are read with O_DIRECT (0 = never)
+DIRECT_CHUNK = 4 * 1024 * 1024   # O_DIRECT read size (a multiple of the page size)
+READ_SIZE = 1024 * 1024    # Buffered read size for large files
+RESIDENT_SHARE = 0.5       # A range this much cached before we read it belongs to someone else
+READAHEAD_MIN = 128 * 1024 # Smaller files fit the default read-ahead: no SEQUENTIAL hint needed
+PAGE_SIZE = mmap.PAGESIZE
+
+HAS_FADVISE = hasattr(os, "posix_fadvise")
+O_DIRECT = getattr(os, "O_DIRECT", 0)
+F_NOCACHE = 48 if sys.platform == "darwin" else None  # fcntl.h; not exported by Python's fcntl
+
+def configure(mode: str = "drop", direct_min: int = 0):
+    """Set the read policy for this process (pool workers get it via their initializer)"""
+    global CACHE_MODE, DIRECT_MIN
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown page cache mode: {mode} (choose from {', '.join(CACHE_MODES)})")
+    CACHE_MODE = mode
+    DIRECT_MIN = direct_min
+
+def configure_from(backup_config: dict):
+    """Apply backup_config["page_cache"] and ["direct_io_min_mb"]"""
+    configure(backup_config.get("page_cache", "drop"),
+              int((backup_config.get("direct_io_min_mb") or 0) * 1024**2))
+
+def settings() -> Tuple[str, int]:
+    """The current policy as configure() arguments"""
+    return CACHE_MODE, DIRECT_MIN
+
+# === RESIDENCY (mincore) ===
+
+def _load_libc():
+    if sys.platform not in ("linux", "darwin"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int,
+                              ctypes.c_int, ctypes.c_int64]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+_libc = _load_libc()
+_MAP_FAILED = ctypes.c_void_p(-1).value
+
+def resident_range(fd: int, offset: int, length: int) -> Optional[Tuple[int, int]]:
+    """(cached pages, pages) for a byte range of an open file, or None if unsupported"""
+    if _libc is None or length <= 0:
+        return None
+    start = offset - offset % PAGE_SIZE
+    length += offset - start
+    addr = _libc.mmap(None, length, mmap.PROT_READ, mmap.MAP_SHARED, fd, start)
+    if addr in (None, _MAP_FAILED):
+        return None
+    try:
+        pages = (length + PAGE_SIZE - 1) // PAGE_SIZE
+        vec = (ctypes.c_ubyte * pages)()
+        if _libc.mincore(ctypes.c_void_p(addr), length, vec) != 0:
+            return None
+        return sum(1 for flag in bytes(vec) if flag & 1), pages
+    finally:
+        _libc.munmap(ctypes.c_void_p(addr), length)
+
+def resident_bytes(path: Path) -> Optional[Tuple[int, int]]:
+    """(cached bytes, size) of a file, or None when residency can't be measured"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        size = os.fstat(fd).st_size
+        if size == 0:
+            return 0, 0
+        result = resident_range(fd, 0, size)
+        return None if result is None else (min(result[0] * PAGE_SIZE, size), size)
+    finally:
+        os.close(fd)
+
+def tree_residency(paths: Iterable[Path]) -> Optional[Tuple[int, int]]:
+    """(cached bytes, total bytes) over many files, or None when unsupported"""
+    if _libc is None:
+        return None
+    cached = total = 0
+    for path in paths:
+        result = resident_bytes(path)
+        if result:
+            cached += result[0]
+            total += result[1]
+    return cached, total
+
+def system_cached_bytes() -> Optional[int]:
+    """Page cache size for the whole machine (Linux /proc/meminfo), or None"""
+    try:
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Cached:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+# === READERS ===
+
+class SourceFile(io.FileIO):
+    """Read-only file that tells the kernel it is read once, front to back
+
+    With posix_fadvise, each range read is released from the page cache right
+    away unless it was already mostly cached when first touched (then it belongs
+    to another app's working set and is left alone). macOS has no fadvise, so
+    F_NOCACHE keeps the reads from being cached at all.
+    """
+
+    def __init__(self, path, size: Optional[int] = None):
+        super().__init__(path, "rb")
+        self._keep: Optional[bool] = None   # Decided on the first read of a sequential run
+        self._next = 0                      # Offset a sequential read continues from
+        if HAS_FADVISE:
+            if size is None or size > READAHEAD_MIN:
+                os.posix_fadvise(self.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        elif F_NOCACHE is not None:
+            import fcntl
+            fcntl.fcntl(self.fileno(), F_NOCACHE, 1)
+
+    def _before(self, offset: int, length: int):
+        if not HAS_FADVISE:
+            return
+        if self._keep is None or offset != self._next:
+            # Pages just past our previous read are our own read-ahead, so only check
+            # residency where a run of reads starts
+            result = resident_range(self.fileno(), offset, length)
+            self._keep = bool(result) and result[0] >= result[1] * RESIDENT_SHARE
+
+    def _after(self, offset: int, length: int):
+        self._next = offset + length
+        if HAS_FADVISE and length and not self._keep:
+            os.posix_fadvise(self.fileno(), offset, length, os.POSIX_FADV_DONTNEED)
+
+    def readinto(self, buffer) -> Optional[int]:
+        offset = self.tell()
+        self._before(offset, len(buffer))
+        count = super().readinto(buffer)
+        self._after(offset, count or 0)
+        return count
+
+    def readall(self) -> bytes:
+        offset = self.tell()
+        self._before(offset, max(os.fstat(self.fileno()).st_size - offset, 0))
+        data = super().readall()
+        self._after(offset, len(data))
+        return data
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            return self.readall()
+        offset = self.tell()
+        self._before(offset, size)
+        data = super().read(size)
+        self._after(offset, len(data))
+        return data
+
+class DirectFile(io.RawIOBase):
+    """O_DIRECT reader: bypasses the page cache entirely
+
+    O_DIRECT needs page-aligned buffers, offsets and lengths, so data is read in
+    aligned DIRECT_CHUNK pieces into an anonymous mmap and copied out from there.
+    """
+
+    def __init__(self, path, chunk_size: int = DIRECT_CHUNK):
+        super().__init__()
+        self._fd = os.open(path, os.O_RDONLY | O_DIRECT)
+        try:
+            self._size = os.fstat(self._fd).st_size
+            self._buffer = mmap.mmap(-1, chunk_size)
+            self._start = 0
+            self._length = 0
+            self._position = 0
+            self._fill(0)  # Filesystems without O_DIRECT support fail here (EINVAL)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    def _fill(self, offset: int):
+        start = offset - offset % PAGE_SIZE
+        self._length = os.preadv(self._fd, [self._buffer], start)
+        self._start = start
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._size}[whence]
+        self._position = max(0, base + offset)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        if self._position >= self._size:
+            return 0
+        if not self._start <= self._position < self._start + self._length:
+            self._fill(self._position)
+            if not self._length:
+                return 0
+        begin = self._position - self._start
+        count = min(len(buffer), self._length - begin)
+        buffer[:count] = self._buffer[begin:begin + count]
+        self._position += count
+        return count
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+            self._buffer.close()
+        super().close()
+
+def open_source(path, size: Optional[int] = None) -> BinaryIO:
+    """Open a source file for the backup under the configured policy
+
+    The result reads like open(path, "rb"): read(n) returns n bytes until EOF.
+    """
+    if CACHE_MODE == "keep":
+        return open(path, "rb")
+    if DIRECT_MIN and O_DIRECT:
+        if size is None:
+            size = os.stat(path).st_size
+        if size >= DIRECT_MIN:
+            try:
+                return io.BufferedReader(DirectFile(path), DIRECT_CHUNK)
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                # tmpfs and some network filesystems refuse O_DIRECT
+    raw = SourceFile(path, size)
+    if size is None:
+        size = os.fstat(raw.fileno()).st_size
+    # A buffer no bigger than the file: small files are the common case
+    return io.BufferedReader(raw, max(PAGE_SIZE, min(size + 1, READ_SIZE)))
+
+def measure_cache(paths: Iterable[Path]) -> Optional[dict]:
+    """Snapshot of tree and system page-cache usage, for before/after comparisons"""
+    tree = tree_residency(paths)
+    if tree is None:
+        return None
+    return {"tree_cached": tree[0], "tree_bytes": tree[1], "system_cached": system_cached_bytes()}
+
+def report_cache(before: Optional[dict], after: Optional[dict]):
+    """Print how much page cache the backup left behind"""
+    if not before or not after:
+        print("ℹ️  Page cache residency can't be measured on this system")
+        return
+    mb = lambda value: round(value / (1024**2), 1)
+    print(f"🧠 Page cache ({CACHE_MODE} mode): tree {mb(before['tree_cached'])} MB cached before, "
+          f"{mb(after['tree_cached'])} MB after (of {mb(after['tree_bytes'])} MB)")
+    if before["system_cached"] is not None and after["system_cached"] is not None:
+        print(f"   System page cache: {mb(before['system_cached'])} MB → {mb(after['system_cached'])} MB")
+
+def main():
+    """Report how much of a folder is in the page cache"""
+    import argparse
+    from backup_archive import iter_source_tree
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Measure page-cache residency of a folder")
+    parser.add_argument("folder", type=Path)
+    args = parser.parse_args()
+
+    paths = [path for arcname, path, _st in iter_source_tree(args.folder) if not arcname.endswith("/")]
+    snapshot = measure_cache(paths)
+    if snapshot is None:
+        logger.error("❌ Page cache residency can't be measured on this system")
+        return False
+    total = snapshot["tree_bytes"] or 1
+    print(f"🧠 {round(snapshot['tree_cached'] / (1024**2), 1)} MB of "
+          f"{round(snapshot['tree_bytes'] / (1024**2), 1)} MB cached "
+          f"({round(100 * snapshot['tree_cached'] / total, 1)}%) in {len(paths)} files")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,266 @@
+"""
+BigSkyAg Parallel Deflate
+Multi-core compression for backup archives: small files are compressed in batches
+by a process pool and large files are split into independently deflated blocks
+(the pigz approach), while a single writer assembles the archive in order
+"""
+
+import logging
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from backup_archive import (
+    DIGEST_BLOCK_SIZE, SAMPLE_SIZE, SMALL_FILE_LIMIT, STORE_EXTENSIONS, ZIP_DEFLATED,
+    ZIP_STORED, ArchiveStats, ZipArchiveWriter, block_digest, choose_method, combine_digests,
+    iter_source_tree, looks_compressed, MIN_DEFLATE_GAIN, read_snapshot,
+)
+import page_cache
+from page_cache import open_source
+
+logger = logging.getLogger(__name__)
+
+BLOCK_SIZE = DIGEST_BLOCK_SIZE      # Uncompressed bytes per block (aligned with digest blocks)
+DICT_SIZE = 32 * 1024              # History primed into each block (deflate window size)
+BATCH_FILES = 256                  # Max small files per worker job
+BATCH_BYTES = 4 * 1024 * 1024      # Max small-file bytes per worker job
+PENDING_PER_WORKER = 4             # In-flight jobs per worker (bounds memory)
+
+# === CRC32 COMBINE ===
+# Port of zlib's crc32_combine(): the CRC of A+B from crc(A), crc(B) and len(B),
+# so blocks compressed in different processes never need rereading.
+
+def _gf2_matrix_times(matrix: Tuple[int, ...], vector: int) -> int:
+    result = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            result ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return result
+
+def _gf2_matrix_square(matrix: Tuple[int, ...]) -> Tuple[int, ...]:
+    return tuple(_gf2_matrix_times(matrix, matrix[n]) for n in range(32))
+
+@lru_cache(maxsize=64)
+def _crc32_shift_operator(length: int) -> Tuple[int, ...]:
+    """Matrix that advances a CRC over `length` zero bytes"""
+    # Operator for one zero bit, then square up to one zero byte
+    operator = (0xEDB88320,) + tuple(1 << n for n in range(31))
+    for _ in range(3):
+        operator = _gf2_matrix_square(operator)
+
+    result = None
+    while length:
+        if length & 1:
+            result = operator if result is None else tuple(
+                _gf2_matrix_times(operator, column) for column in result)
+        length >>= 1
+        if length:
+            operator = _gf2_matrix_square(operator)
+    return result
+
+def crc32_combine(crc1: int, crc2: int, length2: int) -> int:
+    """CRC-32 of two concatenated byte strings given each CRC and the second length"""
+    if length2 <= 0:
+        return crc1
+    return _gf2_matrix_times(_crc32_shift_operator(length2), crc1) ^ crc2
+
+# === WORKER JOBS (run in child processes) ===
+
+def _compress_small_files(paths: List[str], names: List[str], level: int) -> List[tuple]:
+    """Read and compress a batch of small files
+
+    Returns one (method, crc, size, data, digest) tuple per file, or None for unreadable files.
+    """
+    results = []
+    for path, name in zip(paths, names):
+        try:
+            with open_source(path) as f:
+                data = f.read()
+        except OSError:
+            results.append(None)
+            continue
+
+        crc = zlib.crc32(data)
+        method = ZIP_STORED
+        payload = data
+        if data and not looks_compressed(data[:SAMPLE_SIZE]) and Path(name).suffix.lower() not in STORE_EXTENSIONS:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+            compressed = compressor.compress(data) + compressor.flush()
+            if len(compressed) <= len(data) * (1 - MIN_DEFLATE_GAIN):
+                method, payload = ZIP_DEFLATED, compressed
+        results.append((method, crc, len(data), payload, block_digest(data).hex()))
+    return results
+
+def _compress_block(path: str, offset: int, length: int, level: int,
+                    final: bool) -> Tuple[int, int, bytes, bytes]:
+    """Deflate one block of a large file, primed with the preceding 32 KiB
+
+    Non-final blocks end with a sync flush (byte aligned, no final bit), so the
+    blocks concatenate into a single valid deflate stream.
+    """
+    with open_source(path) as f:
+        history = b""
+        if offset:
+            start = max(0, offset - DICT_SIZE)
+            f.seek(start)
+            history = f.read(offset - start)
+        data = f.read(length)
+
+    if history:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=history)
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    payload = compressor.compress(data)
+    payload += compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+    return zlib.crc32(data), len(data), payload, block_digest(data)
+
+# === ORDERED ASSEMBLY ===
+
+class _FileState:
+    """Bookkeeping for a large file whose blocks are in flight"""
+
+    __slots__ = ("arcname", "st", "entry", "crc", "size", "block_digests", "failed")
+
+    def __init__(self, arcname, st):
+        self.arcname = arcname
+        self.st = st
+        self.entry = None
+        self.crc = 0
+        self.size = 0
+        self.block_digests = []
+        self.failed = False
+
+def default_workers() -> int:
+    return os.cpu_count() or 1
+
+def write_tree_parallel(writer: ZipArchiveWriter, source: Path, exclude_patterns: Iterable[str] = (),
+                        workers: Optional[int] = None, items: Iterable[tuple] = None) -> ArchiveStats:
+    """Parallel equivalent of backup_archive.write_tree()
+
+    Entries are written in the same deterministic order as the serial writer. At most
+    workers * PENDING_PER_WORKER jobs are in flight, which bounds memory. Pass `items`
+    (arcname, path, stat) to archive an explicit list instead of walking source.
+    """
+    workers = workers or default_workers()
+    max_pending = workers * PENDING_PER_WORKER
+    level = writer.compresslevel
+    pending = deque()  # (kind, payload, future)
+    if items is None:
+        items = iter_source_tree(source, exclude_patterns)
+
+    def drain_one():
+        kind, payload, future = pending.popleft()
+        if kind == "dir":
+            arcname, st = payload
+            writer.add_directory(arcname, st.st_mtime, st.st_mode & 0o7777)
+        elif kind == "batch":
+            for (arcname, path, st), result in zip(payload, future.result()):
+                if result is None:
+                    logger.warning(f"⚠️  Skipping unreadable file {arcname}")
+                    writer.stats.skipped.append(arcname)
+                    continue
+                method, crc, size, data, digest = result
+                writer.add_raw(arcname, [data], crc, size, method, st.st_mtime, st.st_mode, digest)
+        elif kind == "stored":
+            arcname, path, st = payload
+            try:
+                f = open_source(path, st.st_size)
+            except OSError as e:
+                logger.warning(f"⚠️  Skipping unreadable file {arcname}: {e}")
+                writer.stats.skipped.append(arcname)
+                return
+            with f:
+                writer.add_stream(arcname, read_snapshot(f, st.st_size, writer.stats, arcname),
+                                  ZIP_STORED, st.st_mtime, st.st_mode, st.st_size)
+        elif kind == "block":
+            state, final = payload
+            if state.failed:
+                return
+            try:
+                crc, size, data, digest = future.result()
+            except OSError as e:
+                state.failed = True
+                if state.entry is not None:
+                    writer.abandon_entry(state.entry)
+                logger.warning(f"⚠️  Skipping unreadable file {state.arcname}: {e}")
+                writer.stats.skipped.append(state.arcname)
+                return
+            if state.entry is None:
+                state.entry = writer.open_raw_entry(state.arcname, ZIP_DEFLATED, state.st.st_mtime,
+                                                    state.st.st_mode, state.st.st_size)
+            writer.write_raw(state.entry, data)
+            state.crc = crc32_combine(state.crc, crc, size)
+            state.size += size
+            state.block_digests.append(digest)
+            if final:
+                writer.close_raw_entry(state.entry, state.crc, state.size,
+                                       combine_digests(state.block_digests))
+
+    def enqueue(kind, payload, future=None):
+        while len(pending) >= max_pending:
+            drain_one()
+        pending.append((kind, payload, future))
+
+    batch: List[tuple] = []
+    batch_bytes = 0
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=page_cache.configure,
+                             initargs=page_cache.settings()) as pool:
+
+        def flush_batch():
+            nonlocal batch, batch_bytes
+            if batch:
+                future = pool.submit(_compress_small_files, [str(p) for _, p, _ in batch],
+                                     [a for a, _, _ in batch], level)
+                enqueue("batch", batch, future)
+                batch, batch_bytes = [], 0
+
+        for arcname, path, st in items:
+            if arcname.endswith("/"):
+                flush_batch()
+                enqueue("dir", (arcname, st))
+                continue
+
+            if st.st_size <= max(SMALL_FILE_LIMIT, BLOCK_SIZE):
+                batch.append((arcname, path, st))
+                batch_bytes += st.st_size
+                if len(batch) >= BATCH_FILES or batch_bytes >= BATCH_BYTES:
+                    flush_batch()
+                continue
+
+            flush_batch()
+            try:
+                with open_source(path, st.st_size) as f:
+                    head = f.read(SAMPLE_SIZE)
+                    f.seek(st.st_size // 2)
+                    sample = head + f.read(SAMPLE_SIZE)
+            except OSError as e:
+                logger.warning(f"⚠️  Skipping unreadable file {arcname}: {e}")
+                writer.stats.skipped.append(arcname)
+                continue
+
+            if choose_method(arcname, head, sample) == ZIP_STORED:
+                # Nothing to compress: the writer streams it when its turn comes
+                enqueue("stored", (arcname, path, st))
+                continue
+
+            state = _FileState(arcname, st)
+            offsets = range(0, st.st_size, BLOCK_SIZE)
+            for offset in offsets:
+                final = offset + BLOCK_SIZE >= st.st_size
+                future = pool.submit(_compress_block, str(path), offset,
+                                     min(BLOCK_SIZE, st.st_size - offset), level, final)
+                enqueue("block", (state, final), future)
+
+        flush_batch()
+        while pending:
+            drain_one()
+
+    return writer.stats
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Remote Restore
+Restores individual files from a backup in cloud storage using ranged reads: the
+zip's end records and central directory are fetched first, then only the bytes of
+the requested entries, instead of downloading the whole archive. Incrementals are
+followed back to their full backup, so files that didn't change are found too
+"""
+
+import io
+import json
+import os
+import re
+import sys
+import time
+import shutil
+import logging
+import fnmatch
+import zipfile
+from pathlib import Path
+from typing import Any, Collection, Dict, List, Optional, Tuple
+
+from backup_manifest import BACKUP_INFO_NAME, DELETED_LIST_NAME
+from backup_volumes import volume_set_name
+from config import BACKUP_CONFIG, get_storage_provider_config
+from solid_pack import SolidReader
+from storage_providers import get_storage_provider
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+READAHEAD = 64 * 1024       # Minimum bytes per range request (covers headers + small files)
+COPY_SIZE = 1024 * 1024     # Read size while restoring an entry (one request per read)
+BACKUP_TIMESTAMP = re.compile(r"_(\d{4}-\d{2}-\d{2}_\d{4})(?:\.part\d{3,})?\.zip$")
+MAX_CHAIN = 400             # Incrementals followed back to their full before giving up
+
+class RangeReader(io.RawIOBase):
+    """Seekable read-only file object over a stored file, fetched with range requests
+
+    Each miss fetches at least READAHEAD bytes, so the many small reads zipfile makes
+    while parsing headers turn into a handful of requests.
+    """
+
+    def __init__(self, provider, file_id: str, size: Optional[int] = None, readahead: int = READAHEAD):
+        super().__init__()
+        self.provider = provider
+        self.file_id = file_id
+        self.size = provider.get_file_size(file_id) if size is None else int(size)
+        self.readahead = readahead
+        self.position = 0
+        self.requests = 0
+        self.bytes_fetched = 0
+        self._window_start = 0
+        self._window = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self.position + offset
+        elif whence == io.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if position < 0:
+            raise ValueError("Negative seek position")
+        self.position = position
+        return position
+
+    def readinto(self, buffer) -> int:
+        wanted = min(len(buffer), self.size - self.position)
+        if wanted <= 0:
+            return 0
+
+        window_end = self._window_start + len(self._window)
+        if not (self._window_start <= self.position and self.position + wanted <= window_end):
+            length = min(max(wanted, self.readahead), self.size - self.position)
+            self._window = self.provider.read_range(self.file_id, self.position, length)
+            self._window_start = self.position
+            self.requests += 1
+            self.bytes_fetched += len(self._window)
+            if not self._window:
+                return 0
+
+        start = self.position - self._window_start
+        data = self._window[start:start + wanted]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+def backup_sort_key(item: Dict[str, Any]) -> str:
+    """Sort remote backups by the timestamp in their name (provider mtimes differ in type)"""
+    match = BACKUP_TIMESTAMP.search(item["name"])
+    return match.group(1) if match else str(item.get("modified_time", ""))
+
+def list_remote_backups(provider, backup_types: List[str] = None) -> List[Dict[str, Any]]:
+    """Remote backup zips across the backup type folders, oldest first"""
+    backups = []
+    for backup_type in backup_types or list(BACKUP_CONFIG["backup_types"]):
+        for item in provider.list_files(provider.get_backup_destination(backup_type)):
+            if item["name"].endswith(".zip"):
+                backups.append(dict(item, backup_type=backup_type))
+    return sorted(backups, key=backup_sort_key)
+
+def group_backups(backups: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Remote backups by name, oldest first; a split backup maps to all of its volumes"""
+    grouped: Dict[str, List[Dict[str, Any]]] = {}
+    for item in backups:
+        grouped.setdefault(volume_set_name(item["name"]), []).append(item)
+    return grouped
+
+def select_members(names: List[str], patterns: List[str]) -> List[str]:
+    """Archive members matching exact paths, folder prefixes (ending '/') or glob patterns"""
+    selected = []
+    for name in names:
+        if name.endswith("/") or name.startswith(".bigsky/"):
+            continue
+        for pattern in patterns:
+            if name == pattern or (pattern.endswith("/") and name.startswith(pattern)) \
+                    or fnmatch.fnmatchcase(name, pattern):
+                selected.append(name)
+                break
+    return selected
+
+def extract_members(zf: zipfile.ZipFile, patterns: List[str], target: Path,
+                    skip: Collection[str] = ()) -> List[str]:
+    """Restore matching members of an open archive into target, except those in skip"""
+    target = Path(target)
+    restored = []
+    for name in select_members(zf.namelist(), patterns):
+        if name in skip:
+            continue
+        dest = target / name
+        if target.resolve() not in dest.resolve().parents:
+            logger.warning(f"⚠️  Skipping unsafe path: {name}")
+            continue
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        info = zf.getinfo(name)
+        partial = dest.with_name(dest.name + ".partial")
+        # zipfile checks the CRC when the entry has been read to the end
+        with zf.open(info) as src, open(partial, "wb") as out:
+            shutil.copyfileobj(src, out, COPY_SIZE)
+        os.replace(partial, dest)
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(dest, (mtime, mtime))
+        restored.append(name)
+    # Small files packed into solid blocks: only their blocks are fetched
+    solid = SolidReader(zf)
+    restored += solid.extract([name for name in select_members(solid.names(), patterns) if name not in skip], target)
+    return restored
+
+def restore_members(reader: RangeReader, patterns: List[str], target: Path, skip: Collection[str] = ()) -> List[str]:
+    """Restore matching members from a remote archive into target; returns restored names"""
+    with zipfile.ZipFile(reader) as zf:
+        return extract_members(zf, patterns, target, skip)
+
+def read_backup_info(zf: zipfile.ZipFile) -> Tuple[Dict[str, Any], List[str]]:
+    """(backup.json, deletion list) of an archive; older backups have neither and count as full"""
+    names = set(zf.namelist())
+    info = json.loads(zf.read(BACKUP_INFO_NAME)) if BACKUP_INFO_NAME in names else {}
+    deleted = zf.read(DELETED_LIST_NAME).decode("utf-8").splitlines() if DELETED_LIST_NAME in names else []
+    return info, deleted
+
+def restore_chain(provider, backups: Dict[str, List[Dict[str, Any]]], name: str, patterns: List[str],
+                  target: Path) -> Tuple[List[str], int, int]:
+    """Restore matching files as they were at backup name; returns (restored, bytes fetched, requests)
+
+    An incremental only holds what changed, so its previous_archive links are followed
+    back to the full backup, newest first. Each file comes from the newest archive that
+    has it, and a file an incremental records as deleted isn't taken from older ones.
+    """
+    restored: List[str] = []
+    settled = set()  # Restored, or deleted as of the requested backup
+    fetched = requests = 0
+    for _ in range(MAX_CHAIN):
+        info: Dict[str, Any] = {}
+        deleted: List[str] = []
+        # Every volume is a standalone zip, so each is searched on its own
+        for backup in backups[name]:
+            size = backup.get("size")
+            reader = RangeReader(provider, backup["id"], int(size) if size else None)
+            print(f"📦 Searching {backup['name']} ({round(reader.size / (1024**2), 1)} MB)")
+            with zipfile.ZipFile(reader) as zf:
+                found = extract_members(zf, patterns, target, settled)
+                volume_info, volume_deleted = read_backup_info(zf)
+            info = info or volume_info
+            deleted += volume_deleted
+            restored += found
+            settled.update(found)
+            fetched += reader.bytes_fetched
+            requests += reader.requests
+        settled.update(deleted)
+
+        if info.get("kind", "full") == "full":
+            return restored, fetched, requests
+        previous = info.get("previous_archive")
+        if not previous:
+            logger.warning(f"⚠️  Incremental {name} does not name the backup before it; older files may be missing")
+            return restored, fetched, requests
+        name = volume_set_name(previous)
+        if name not in backups:
+            logger.warning(f"⚠️  {name} is not in cloud storage; files unchanged since then may be missing")
+            return restored, fetched, requests
+    logger.warning(f"⚠️  No full backup within {MAX_CHAIN} backups; older files may be missing")
+    return restored, fetched, requests
+
+def main():
+    """Restore files from the latest (or a named) remote backup"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Restore files from a cloud backup without downloading all of it")
+    parser.add_argument("paths", nargs="*", help="Archive paths, folders ending in '/', or glob patterns")
+    parser.add_argument("--backup", help="Backup file name (default: the latest)")
+    parser.add_argument("--target", type=Path, default=Path.cwd() / "restored", help="Folder to restore into")
+    parser.add_argument("--list", action="store_true", help="List remote backups and exit")
+    args = parser.parse_args()
+
+    provider_config = get_storage_provider_config()
+    provider = get_storage_provider(provider_config["provider"], provider_config)
+    backups = group_backups(list_remote_backups(provider))
+
+    if args.list:
+        for name, parts in backups.items():
+            size_mb = round(sum(int(item.get("size") or 0) for item in parts) / (1024**2), 1)
+            volumes = f", {len(parts)} volumes" if len(parts) > 1 else ""
+            print(f"📦 {parts[0]['backup_type']:8} {name} ({size_mb} MB{volumes})")
+        return True
+
+    if not args.paths:
+        parser.error("give at least one path to restore (or --list)")
+    if not backups:
+        logger.error("❌ No remote backups found")
+        return False
+
+    if args.backup:
+        name = volume_set_name(args.backup)
+        if name not in backups:
+            logger.error(f"❌ Remote backup not found: {args.backup}")
+            return False
+    else:
+        name = list(backups)[-1]
+
+    try:
+        restored, fetched, requests = restore_chain(provider, backups, name, args.paths, args.target)
+    except NotImplementedError as e:
+        logger.error(f"❌ {e}")
+        return False
+
+    for member in restored:
+        print(f"   ✅ {member}")
+    print(f"📥 Fetched {round(fetched / 1024, 1)} KB in {requests} range requests")
+    if not restored:
+        logger.error("❌ No files in the backup matched")
+        return False
+    print(f"📁 Restored {len(restored)} files to {args.target}")
+    return True
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Backup Retention
+Plans one grandfather-father-son keep-set from the retention counts in
+BACKUP_CONFIG["backup_types"] across the local and remote backup catalogs, then
+deletes everything else in one pass (or prints the plan with the space it would free)
+"""
+
+import re
+import sys
+import time
+import logging
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from backup_manifest import manifest_sidecar
+from backup_volumes import volume_set_name
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Period each backup type's retention counts in (strftime bucket keys); other types count days
+PERIODS = {"daily": "%Y-%m-%d", "weekly": "%G-W%V", "monthly": "%Y-%m", "yearly": "%Y"}
+SIDECAR_SUFFIX = manifest_sidecar(Path("x.zip")).name[len("x.zip"):]
+
+def backup_set_name(file_name: str) -> str:
+    """The backup a stored file belongs to (volumes, set index and manifest sidecars included)"""
+    if file_name.endswith(SIDECAR_SUFFIX):
+        file_name = file_name[:-len(SIDECAR_SUFFIX)]
+    return volume_set_name(file_name)
+
+def parse_backup_name(name: str, backup_prefix: str) -> Optional[tuple]:
+    """(backup type or None, timestamp) from {prefix}_{type}_{date}[_HHMM].zip or the
+    older {prefix}_{date}.zip, or None for names that aren't backups"""
+    match = re.fullmatch(re.escape(backup_prefix) + r"_(?:(?P<type>[A-Za-z]+)_)?"
+                         r"(?P<date>\d{4}-\d{2}-\d{2})(?:_(?P<time>\d{4}))?\.zip", name)
+    if not match:
+        return None
+    stamp = datetime.strptime(match["date"] + (match["time"] or "0000"), "%Y-%m-%d%H%M")
+    return match["type"], stamp.timestamp()
+
+class RetentionRecord:
+    """One backup known locally, remotely or both"""
+
+    __slots__ = ("name", "backup_type", "kind", "time")
+
+    def __init__(self, name: str, backup_type: Optional[str], kind: str, time: float):
+        self.name = name
+        self.backup_type = backup_type
+        self.kind = kind            # "full" or "incremental"
+        self.time = time
+
+def make_records(names: Iterable[str], backup_prefix: str, backup_types: Dict[str, dict]) -> List[RetentionRecord]:
+    """Records for the recognizable backup names, newest first (untyped old backups are fulls)"""
+    records = []
+    for name in set(names):
+        parsed = parse_backup_name(name, backup_prefix)
+        if parsed is None:
+            continue
+        backup_type, stamp = parsed
+        kind = backup_types.get(backup_type, {}).get("type", "full")
+        records.append(RetentionRecord(name, backup_type, "incremental" if kind == "incremental" else "full", stamp))
+    records.sort(key=lambda record: (record.time, record.name), reverse=True)
+    return records
+
+def with_chains(records: List[RetentionRecord], keep: Dict[str, List[str]]) -> Dict[str, List[str]]:
+    """Add to keep every backup a kept incremental depends on, back to its full
+
+    records are newest first; each incremental holds the changes since the backup
+    before it, so everything from a kept incremental down to the next full stays.
+    """
+    needed = False
+    for record in records:
+        if needed and record.name not in keep:
+            keep[record.name] = ["chain"]
+        if record.name in keep:
+            needed = needed or record.kind == "incremental"
+        if record.kind == "full":
+            needed = False
+    return keep
+
+def plan_retention(records: List[RetentionRecord], backup_types: Dict[str, dict],
+                   damaged: Iterable[str] = ()) -> Dict[str, List[str]]:
+    """GFS keep-set: backup name -> reasons it is kept
+
+    records are newest first. Each backup type keeps the newest backup of each of its
+    `retention` most recent periods (days, ISO weeks, months, years) that have one;
+    full types only count full backups. The newest backup is always kept, damaged
+    backups fill a period only when it has no intact one, and incrementals bring
+    their chain. One pass per type over the sorted records.
+    """
+    damaged = set(damaged)
+    keep: Dict[str, List[str]] = {}
+    if records:
+        keep[records[0].name] = ["latest"]
+    for backup_type, settings in backup_types.items():
+        count = settings.get("retention", 0)
+        period = PERIODS.get(backup_type, PERIODS["daily"])
+        full_only = settings.get("type", "full") != "incremental"
+        chosen: Dict[str, RetentionRecord] = {}
+        for record in records:
+            if full_only and record.kind != "full":
+                continue
+            bucket = time.strftime(period, time.localtime(record.time))
+            current = chosen.get(bucket)
+            if current is None:
+                if len(chosen) < count:
+                    chosen[bucket] = record
+            elif current.name in damaged and record.name not in damaged:
+                chosen[bucket] = record
+        for record in chosen.values():
+            keep.setdefault(record.name, []).append(backup_type)
+    return with_chains(records, keep)
+
+def local_catalog(folders: List[Path], backup_prefix: str) -> Dict[str, List[Path]]:
+    """Backup name -> its files in the given folders"""
+    catalog: Dict[str, List[Path]] = {}
+    for folder in folders:
+        if folder.exists():
+            for path in folder.glob(f"{backup_prefix}_*"):
+                if path.is_file():
+                    catalog.setdefault(backup_set_name(path.name), []).append(path)
+    return catalog
+
+def remote_catalog(provider, backup_types: Dict[str, dict]) -> Dict[str, List[Dict[str, Any]]]:
+    """Backup name -> its stored files (list_files items) in every backup type's folder"""
+    catalog: Dict[str, List[Dict[str, Any]]] = {}
+    for folder in sorted({provider.get_backup_destination(backup_type) for backup_type in backup_types}):
+        for item in provider.list_files(folder):
+            catalog.setdefault(backup_set_name(item.get("name", "")), []).append(item)
+    return catalog
+
+class RetentionPlan:
+    """What to keep and delete in each location"""
+
+    def __init__(self, records: List[RetentionRecord], keep: Dict[str, List[str]],
+                 local: Dict[str, List[Path]], remote: Dict[str, List[Dict[str, Any]]],
+                 local_keep: Set[str]):
+        self.records = records
+        self.keep = keep
+        self.local = local
+        self.remote = remote
+        self.local_keep = local_keep
+
+    @property
+    def local_delete(self) -> List[str]:
+        return [record.name for record in self.records if record.name in self.local and record.name not in self.local_keep]
+
+    @property
+    def remote_delete(self) -> List[str]:
+        return [record.name for record in self.records if record.name in self.remote and record.name not in self.keep]
+
+    def local_bytes(self, names: Iterable[str]) -> int:
+        return sum(path.stat().st_size for name in names for path in self.local[name])
+
+    def remote_bytes(self, names: Iterable[str]) -> int:
+        return sum(int(item.get("size") or 0) for name in names for item in self.remote[name])
+
+    def report_lines(self) -> List[str]:
+        local_delete, remote_delete = set(self.local_delete), set(self.remote_delete)
+        lines = []
+        for record in self.records:
+            where = []
+            if record.name in self.local:
+                where.append("delete local" if record.name in local_delete else "local")
+            if record.name in self.remote:
+                where.append("delete remote" if record.name in remote_delete else "remote")
+            if record.name in self.keep:
+                reasons = ", ".join(self.keep[record.name])
+            else:
+                reasons = "-"
+            lines.append(f"   {'keep  ' if record.name in self.keep else 'delete'} {record.name:<48} "
+                         f"{reasons:<22} {' + '.join(where)}")
+        return lines
+
+def plan_backups(backup_config, backup_prefix: str, backup_folder: Path, provider=None,
+                 damaged: Iterable[str] = ()) -> RetentionPlan:
+    """Catalog local (and, with a provider, remote) backups and plan their retention
+
+    Locally at most max_working_backups + max_archive_backups of the kept backups stay
+    on disk, counting the chains their incrementals need; the full keep-set applies remotely.
+    """
+    backup_types = backup_config.get("backup_types", {})
+    local = local_catalog([backup_folder, backup_folder / "Archive"], backup_prefix)
+    remote = remote_catalog(provider, backup_types) if provider is not None else {}
+    records = make_records(list(local) + list(remote), backup_prefix, backup_types)
+    keep = plan_retention(records, backup_types, damaged)
+
+    # Newest kept backups first, each with its chain, while they fit (the latest always does)
+    local_records = [record for record in records if record.name in local]
+    limit = backup_config.get("max_working_backups", 1) + backup_config.get("max_archive_backups", 4)
+    local_keep: Set[str] = set()
+    for record in local_records:
+        if record.name not in keep or record.name in local_keep:
+            continue
+        needed = set(with_chains(local_records, {record.name: []}))
+        if local_keep and len(local_keep | needed) > limit:
+            break
+        local_keep |= needed
+    return RetentionPlan(records, keep, local, remote, local_keep)
+
+def chain_groups(records: List[RetentionRecord]) -> List[List[str]]:
+    """Backup names grouped as a full plus the incrementals after it, oldest group first"""
+    groups: List[List[str]] = []
+    for record in reversed(records):
+        if record.kind == "full" or not groups:
+            groups.append([])
+        groups[-1].append(record.name)
+    return groups
+
+def make_space(plan: RetentionPlan, shortfall: int) -> List[str]:
+    """Drop the oldest locally kept backups until shortfall bytes are freed
+
+    Whole chains go at once so no kept incremental loses its full; the newest chain
+    always stays. Returns the dropped names (now also in plan.local_delete).
+    """
+    local_records = [record for record in plan.records if record.name in plan.local_keep]
+    dropped: List[str] = []
+    freed = 0
+    for group in chain_groups(local_records)[:-1]:
+        if freed >= shortfall:
+            break
+        dropped += group
+        freed += plan.local_bytes(group)
+    plan.local_keep -= set(dropped)
+    return dropped
+
+def delete_remote(provider, items: List[Dict[str, Any]]) -> List[str]:
+    """Delete stored files in batches; returns the names that could not be deleted"""
+    failed = set(provider.delete_files([item.get("id") for item in items]))
+    return [item.get("name") for item in items if item.get("id") in failed]
+
+def apply_plan(plan: RetentionPlan, provider=None, dry_run: bool = False) -> bool:
+    """Delete what the plan drops, or just report it with dry_run"""
+    local_delete, remote_delete = plan.local_delete, plan.remote_delete
+    local_bytes, remote_bytes = plan.local_bytes(local_delete), plan.remote_bytes(remote_delete)
+    print(f"🗂️  Retention: keeping {len(plan.keep)} of {len(plan.records)} backups "
+          f"({len(plan.local_keep)} on local disk)")
+    if dry_run:
+        for line in plan.report_lines():
+            print(line)
+        print(f"♻️  Would free {round(local_bytes / (1024**3), 2)} GB locally and "
+              f"{round(remote_bytes / (1024**3), 2)} GB in storage")
+        return True
+
+    success = True
+    for name in local_delete:
+        try:
+            for path in plan.local[name]:
+                path.unlink(missing_ok=True)
+            print(f"   🗑️  Deleted {name}")
+        except OSError as e:
+            logger.error(f"Failed to delete {name}: {e}")
+            success = False
+    if remote_delete:
+        items = [item for name in remote_delete for item in plan.remote[name]]
+        failed = delete_remote(provider, items)
+        for name in failed:
+            logger.warning(f"⚠️ Could not delete old backup: {name}")
+        print(f"   ☁️  Deleted {len(remote_delete)} backups ({len(items) - len(failed)} files) from storage")
+        success = success and not failed
+    if local_delete or remote_delete:
+        print(f"♻️  Freed {round(local_bytes / (1024**3), 2)} GB locally and "
+              f"{round(remote_bytes / (1024**3), 2)} GB in storage")
+    return success
+
+def run_retention(config=None, provider=None, dry_run: bool = False, damaged: Iterable[str] = ()) -> bool:
+    """Apply the retention plan for one tenant (None means config.py); remote only with a provider"""
+    from config import BACKUP_CONFIG, STORAGE_CONFIG, get_folder_path
+
+    backup_config = config.backup_config if config else BACKUP_CONFIG
+    backup_prefix = config.backup_prefix if config else STORAGE_CONFIG["backup_prefix"]
+    backup_folder = config.get_folder_path("backups") if config else get_folder_path("backups")
+    try:
+        plan = plan_backups(backup_config, backup_prefix, backup_folder, provider, damaged)
+    except Exception as e:
+        logger.error(f"❌ Could not catalog backups for retention: {e}")
+        return False
+    return apply_plan(plan, provider, dry_run)
+
+def main():
+    """Show or apply the retention plan"""
+    import argparse
+    from config import get_storage_provider_config
+    from storage_providers import get_storage_provider
+
+    parser = argparse.ArgumentParser(description="Apply GFS retention to local and stored BigSkyAg backups")
+    parser.add_argument("--dry-run", action="store_true", help="Print the plan and the space it would free")
+    parser.add_argument("--local", action="store_true", help="Only the local backups folder")
+    args = parser.parse_args()
+
+    provider = None
+    if not args.local:
+        try:
+            provider_config = get_storage_provider_config()
+            provider = get_storage_provider(provider_config["provider"], provider_config)
+        except Exception as e:
+            logger.error(f"❌ Failed to initialize storage provider: {e}")
+            return False
+    return run_retention(provider=provider, dry_run=args.dry_run)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -10,7 +10,8 @@ import hashlib
 import time
 from pathlib import Path
 from typing import Dict, List, Tuple, Optional
-from config import ensure_critical_folders, get_routing_destination, get_folder_path, CRITICAL_FOLDERS
+from config import ensure_critical_folders, get_routing_destination, get_folder_path
+from config_loader import CompiledConfig
 
 # Set up logging
 logging.basicConfig(
@@ -26,7 +27,11 @@ logger = logging.getLogger(__name__)
 class FileRouter:
     """Handles file routing with comprehensive error handling and collision prevention"""
     
-    def __init__(self):
+    def __init__(self, config: Optional[CompiledConfig] = None):
+        # An explicit tenant config; None means the module-level config.py settings
+        self.config = config
+        self.get_folder_path = config.get_folder_path if config else get_folder_path
+        self.get_routing_destination = config.get_routing_destination if config else get_routing_destination
         self.routed_count = 0
         self.errors = []
         self.warnings = []
@@ -34,32 +39,15 @@ class FileRouter:
         self.failed_files = []
         
     def validate_destination_folders(self) -> bool:
-        """Validate that all destination folders exist and are writable"""
-        logger.info("🔍 Validating destination folders...")
+        """Validate that all destination folders exist and are writable
         
-        validation_errors = []
+        Write probes only run when the folder verification stamp is missing or stale.
+        """
+        logger.info("🔍 Validating destination folders...")
         
-        for folder_key, folder_path in CRITICAL_FOLDERS.items():
-            try:
-                if not folder_path.exists():
-                    logger.warning(f"⚠️  Creating missing folder: {folder_path}")
-                    folder_path.mkdir(parents=True, exist_ok=True)
-                
-                # Test write access
-                test_file = folder_path / ".router_test"
-                test_file.write_text("test")
-                test_file.unlink()
-                
-                logger.info(f"✅ {folder_key}: {folder_path}")
-                
-            except PermissionError:
-                error_msg = f"Permission denied for folder: {folder_path}"
-                logger.error(error_msg)
-                validation_errors.append(error_msg)
-            except Exception as e:
-                error_msg = f"Failed to validate folder {folder_path}: {str(e)}"
-                logger.error(error_msg)
-                validation_errors.append(error_msg)
+        validation_errors = ensure_critical_folders(probe_writes=True, config=self.config)
+        for error_msg in validation_errors:
+            logger.error(error_msg)
         
         if validation_errors:
             logger.error(f"❌ Folder validation failed with {len(validation_errors)} errors")
@@ -146,11 +134,11 @@ class FileRouter:
             
             # Get file extension and destination
             ext = file_path.suffix.lower()
-            dest_folder = get_routing_destination(ext)
+            dest_folder = self.get_routing_destination(ext)
             
             if not dest_folder:
                 # Route unknown file types to archive
-                dest_folder = get_folder_path("archive")
+                dest_folder = self.get_folder_path("archive")
                 logger.info(f"📦 Routing unknown file type {ext} to archive")
             
             # Ensure destination folder exists
@@ -211,16 +199,13 @@ class FileRouter:
         print("🚀 ROUTER: Starting BigSkyAg file routing process...")
         logger.info("🚀 Starting BigSkyAg file routing process...")
         
-        # Ensure all critical folders exist
-        ensure_critical_folders()
-        
-        # Validate destination folders
+        # Ensure all critical folders exist and are writable
         if not self.validate_destination_folders():
             logger.error("❌ Destination folder validation failed")
             return False
         
         # Get DropZone path
-        dropzone = get_folder_path("dropzone")
+        dropzone = self.get_folder_path("dropzone")
         print(f"🔍 ROUTER: DropZone path: {dropzone}")
         logger.info(f"🔍 DropZone path: {dropzone}")
         
@@ -0,0 +1,350 @@
+"""
+BigSkyAg Solid Small-File Packing
+Packs the tree's many tiny files (sidecars, trackers, AppleDouble files) into solid
+compressed blocks inside the backup zip instead of one zip entry each. Blocks share a
+deflate dictionary trained on the files themselves, and every block carries a member
+table, so any packed file can be read back by decompressing just its block.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import struct
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from backup_archive import ZIP_STORED, ZipArchiveWriter, block_digest, file_type_key
+from backup_manifest import METADATA_DIR
+from page_cache import open_source
+
+logger = logging.getLogger(__name__)
+
+SOLID_VERSION = 1
+SOLID_VERSION_NAMED_DICT = 2      # Blocks whose table names their own dictionary (merged archives)
+SOLID_DIR = METADATA_DIR + "solid/"
+SOLID_DICT_NAME = SOLID_DIR + "dictionary.bin"
+SOLID_INDEX_NAME = SOLID_DIR + "index.json"  # Member tables of the archive's blocks, so readers skip the blocks
+SMALL_FILE_LIMIT = 64 * 1024      # Files up to this size are packed
+SOLID_BLOCK_SIZE = 512 * 1024     # Uncompressed bytes per block (bounds the work to read one file)
+DICT_SIZE = 32 * 1024             # Deflate's window: a longer dictionary is never used
+DICT_SAMPLE = 1024                # Bytes taken from the start of each sampled file
+COMPRESSLEVEL = 9                 # Blocks are small; the best ratio costs little here
+
+# Block entry: header, deflated JSON member table, raw deflate payload using the dictionary.
+# The table lists files as [name, offset, size, mtime]; bytes it doesn't list are ignored.
+BLOCK_MAGIC = b"BSKSOLID"
+BLOCK_HEADER = struct.Struct("<8sHI")  # magic, version, member table length
+
+def block_name(number: int) -> str:
+    return f"{SOLID_DIR}{number:06d}.blk"
+
+def dictionary_name(dictionary: bytes) -> str:
+    """Entry name for a dictionary other than the archive's own (carried over from another archive)"""
+    return f"{SOLID_DIR}dictionary-{hashlib.blake2b(dictionary, digest_size=8).hexdigest()}.bin"
+
+def block_table(members: List[list], dictionary: Optional[str] = None) -> dict:
+    """A block's member table, naming its dictionary if not the default"""
+    table = {"files": members}
+    if dictionary:
+        table["dictionary"] = dictionary
+    return table
+
+def block_bytes(table: dict, payload: bytes) -> bytes:
+    """A block entry: header, member table and payload"""
+    data = zlib.compress(json.dumps(table, separators=(",", ":")).encode("utf-8"))
+    version = SOLID_VERSION_NAMED_DICT if table.get("dictionary") else SOLID_VERSION
+    return BLOCK_HEADER.pack(BLOCK_MAGIC, version, len(data)) + data + payload
+
+def add_solid_index(writer: ZipArchiveWriter):
+    """Write the member tables of the blocks in the current archive (or volume) as one entry
+
+    Call before the archive manifest; does nothing when the archive has no blocks.
+    """
+    names = {entry.name for entry in writer.entries}
+    blocks = {block: table for block, table in writer.packed.items() if block in names}
+    if blocks:
+        data = json.dumps({"version": SOLID_VERSION, "blocks": blocks}, separators=(",", ":")).encode("utf-8")
+        writer.add_bytes(SOLID_INDEX_NAME, data)
+
+def is_small_file(arcname: str, st, limit: int = SMALL_FILE_LIMIT) -> bool:
+    return not arcname.endswith("/") and st.st_size <= limit
+
+def train_dictionary(items: List[tuple], size: int = DICT_SIZE) -> bytes:
+    """Deflate dictionary built from the heads of files, in proportion to each file type
+
+    Deflate matches nearer the end of the dictionary more cheaply, so the most common
+    types go last.
+    """
+    by_type: Dict[str, List[Path]] = {}
+    for arcname, path, _st in items:
+        by_type.setdefault(file_type_key(arcname), []).append(path)
+    total = sum(len(paths) for paths in by_type.values())
+
+    parts = []
+    for _key, paths in sorted(by_type.items(), key=lambda kv: len(kv[1])):
+        budget = max(DICT_SAMPLE, size * len(paths) // total)
+        step = max(1, len(paths) * DICT_SAMPLE // budget)
+        sample = bytearray()
+        for path in paths[::step]:
+            if len(sample) >= budget:
+                break
+            try:
+                with open_source(path) as f:
+                    sample += f.read(DICT_SAMPLE)
+            except OSError:
+                continue
+        parts.append(bytes(sample[:budget]))
+    return b"".join(parts)[-size:]
+
+class SolidPacker:
+    """Collects small files into solid blocks written to a ZipArchiveWriter
+
+    Each packed file's content digest goes into writer.digests like any other file,
+    so incremental manifests see no difference.
+    """
+
+    def __init__(self, writer: ZipArchiveWriter, dictionary: bytes,
+                 block_size: int = None, compresslevel: int = COMPRESSLEVEL):
+        self.writer = writer
+        self.dictionary = dictionary
+        self.block_size = SOLID_BLOCK_SIZE if block_size is None else block_size
+        self.compresslevel = compresslevel
+        self.files = 0
+        self.blocks = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._members: List[list] = []
+        self._data = bytearray()
+        self._dictionaries: Dict[bytes, str] = {dictionary: ""}  # Dictionary -> entry name ("" is the default)
+        # Every volume of a split backup needs its own copy of the dictionary
+        writer.add_bytes(SOLID_DICT_NAME, dictionary)
+        writer.preamble.append((SOLID_DICT_NAME, dictionary))
+
+    def _dictionary_entry(self, dictionary: bytes) -> str:
+        """Name to reference a block's dictionary by, writing it to the archive the first time"""
+        if dictionary not in self._dictionaries:
+            name = dictionary_name(dictionary)
+            self.writer.add_bytes(name, dictionary)
+            self.writer.preamble.append((name, dictionary))
+            self._dictionaries[dictionary] = name
+        return self._dictionaries[dictionary]
+
+    def add(self, arcname: str, path: Path, st) -> Optional[bool]:
+        """Pack one file; returns None when it can't be read (the caller skips it) and
+        False when its size changed since it was listed (the caller writes it as a
+        normal entry)"""
+        try:
+            with open_source(path, st.st_size) as f:
+                data = f.read(st.st_size + 1)
+        except OSError as e:
+            logger.warning(f"⚠️  Skipping unreadable file {arcname}: {e}")
+            self.writer.stats.skipped.append(arcname)
+            return None
+        if len(data) != st.st_size:
+            logger.warning(f"⚠️  {arcname} changed while it was being read: not packing it")
+            return False
+        self.add_data(arcname, data, st.st_mtime)
+        return True
+
+    def add_data(self, arcname: str, data: bytes, mtime: float):
+        """Pack one file's content"""
+        # The table stays small: block digests and the zip CRC already cover the content
+        self._members.append([arcname, len(self._data), len(data), int(mtime)])
+        self._data += data
+        self.writer.digests[arcname] = block_digest(data).hex()
+        self.files += 1
+        self.bytes_in += len(data)
+        if len(self._data) >= self.block_size:
+            self.flush()
+
+    def copy_block(self, chunks: Iterable[bytes], crc: int, size: int, digest: str, members: List[list]):
+        """Copy a whole block from another archive packed with the same dictionary
+
+        members are its member table rows (name, offset, size, mtime).
+        """
+        self.blocks += 1
+        entry = self.writer.add_raw(block_name(self.blocks), chunks, crc, size, ZIP_STORED, digest=digest)
+        self.writer.packed[entry.name] = block_table(members)
+        self.writer.stats.reassign(entry, [(member[0], member[2]) for member in members])
+        self.files += len(members)
+        self.bytes_in += sum(member[2] for member in members)
+        self.bytes_out += size
+
+    def copy_payload(self, payload: bytes, dictionary: bytes, members: List[list]):
+        """Copy another archive's compressed block payload under a new member table
+
+        members are the rows to keep; the payload isn't recompressed, so the bytes of
+        rows left out stay in it unreferenced. A dictionary other than this packer's
+        is written to the archive and named in the table.
+        """
+        self.blocks += 1
+        table = block_table(members, self._dictionary_entry(dictionary))
+        block = block_bytes(table, payload)
+        entry = self.writer.add_bytes(block_name(self.blocks), block, ZIP_STORED)
+        self.writer.packed[entry.name] = table
+        self.writer.stats.reassign(entry, [(member[0], member[2]) for member in members])
+        self.files += len(members)
+        self.bytes_in += sum(member[2] for member in members)
+        self.bytes_out += len(block)
+
+    def flush(self):
+        """Write the pending files as one block"""
+        if not self._members:
+            return
+        compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15, zdict=self.dictionary)
+        payload = compressor.compress(bytes(self._data)) + compressor.flush()
+        self.blocks += 1
+        table = block_table(self._members)
+        block = block_bytes(table, payload)
+        self.bytes_out += len(block)
+        # Already compressed: store as-is so readers can reach the header directly
+        entry = self.writer.add_bytes(block_name(self.blocks), block, ZIP_STORED)
+        self.writer.packed[entry.name] = table
+        self.writer.stats.reassign(entry, [(member[0], member[2]) for member in self._members])
+        self._members = []
+        self._data = bytearray()
+
+    def close(self):
+        self.flush()
+        for dictionary, name in self._dictionaries.items():
+            self.writer.preamble.remove((name or SOLID_DICT_NAME, dictionary))
+
+def pack_small_files(writer: ZipArchiveWriter, items: List[tuple],
+                     limit: int = SMALL_FILE_LIMIT) -> Tuple[List[tuple], Optional[SolidPacker]]:
+    """Pack the small files of items into solid blocks; returns (remaining items, packer)
+
+    Files are packed grouped by type so similar content shares blocks. Directories,
+    larger files and files that changed since they were listed are returned for the
+    normal writer.
+    """
+    small = [item for item in items if is_small_file(item[0], item[2], limit)]
+    if not small:
+        return items, None
+    small.sort(key=lambda item: (file_type_key(item[0]), item[0]))
+    packer = SolidPacker(writer, train_dictionary(small))
+    done = set()  # Packed, or unreadable and skipped
+    for arcname, path, st in small:
+        if packer.add(arcname, path, st) is not False:
+            done.add(arcname)
+    packer.close()
+    print(f"🧱 Packed {packer.files} small files ({round(packer.bytes_in / (1024**2), 1)} MB) "
+          f"into {packer.blocks} solid blocks ({round(packer.bytes_out / (1024**2), 1)} MB)")
+    return [item for item in items if item[0] not in done], packer
+
+class SolidReader:
+    """Random access to the files packed in a zip (a zipfile.ZipFile, local or ranged)
+
+    Nothing is read until packed files are asked about; then the solid index (or, in
+    older archives, each block's header) is read, and a file's block is fetched and
+    decompressed only when the file itself is read.
+    """
+
+    def __init__(self, zf):
+        self.zf = zf
+        self._members: Optional[Dict[str, Tuple[str, int, int, int]]] = None
+        self._block_dictionaries: Dict[str, str] = {}
+        self._dictionaries: Dict[str, bytes] = {}
+        self._cached: Tuple[Optional[str], bytes] = (None, b"")
+
+    @property
+    def members(self) -> Dict[str, Tuple[str, int, int, int]]:
+        """Packed file name -> (block, offset, size, mtime)"""
+        return self._load_tables()
+
+    def _load_tables(self) -> Dict[str, Tuple[str, int, int, int]]:
+        if self._members is None:
+            self._members = {}
+            names = self.zf.namelist()
+            if SOLID_INDEX_NAME in names:
+                tables = json.loads(self.zf.read(SOLID_INDEX_NAME))["blocks"]
+            else:
+                tables = {name: self._read_table(name) for name in names
+                          if name.startswith(SOLID_DIR) and name.endswith(".blk")}
+            for block, table in tables.items():
+                if table.get("dictionary"):
+                    self._block_dictionaries[block] = table["dictionary"]
+                for member in table["files"]:
+                    self._members[member[0]] = (block,) + tuple(member[1:])
+        return self._members
+
+    @property
+    def block_dictionaries(self) -> Dict[str, str]:
+        """Block -> dictionary entry, for blocks not using the archive's default dictionary"""
+        self._load_tables()
+        return self._block_dictionaries
+
+    @property
+    def dictionary(self) -> bytes:
+        """The archive's default dictionary (empty when it has no packed files)"""
+        if SOLID_DICT_NAME not in self._dictionaries:
+            try:
+                self._dictionaries[SOLID_DICT_NAME] = self.zf.read(SOLID_DICT_NAME)
+            except KeyError:
+                self._dictionaries[SOLID_DICT_NAME] = b""
+        return self._dictionaries[SOLID_DICT_NAME]
+
+    def _read_table(self, name: str) -> dict:
+        with self.zf.open(name) as f:
+            magic, version, table_size = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+            if magic != BLOCK_MAGIC or version not in (SOLID_VERSION, SOLID_VERSION_NAMED_DICT):
+                raise ValueError(f"{name} is not a solid block")
+            return json.loads(zlib.decompress(f.read(table_size)))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.members
+
+    def __len__(self) -> int:
+        return len(self.members)
+
+    def names(self) -> List[str]:
+        return list(self.members)
+
+    def block_members(self) -> Dict[str, List[list]]:
+        """Member table rows (name, offset, size, mtime) of each block"""
+        blocks: Dict[str, List[list]] = {}
+        for name, (block, offset, size, mtime) in self.members.items():
+            blocks.setdefault(block, []).append([name, offset, size, mtime])
+        return blocks
+
+    def block_dictionary(self, block: str) -> bytes:
+        """The dictionary a block was compressed with"""
+        name = self.block_dictionaries.get(block)
+        if name is None:
+            return self.dictionary
+        if name not in self._dictionaries:
+            self._dictionaries[name] = self.zf.read(name)
+        return self._dictionaries[name]
+
+    def read(self, name: str) -> bytes:
+        """Content of one packed file (zipfile checks the block's CRC as it is read)"""
+        block, offset, size, _mtime = self.members[name]
+        if self._cached[0] != block:
+            raw = self.zf.read(block)
+            _magic, _version, table_size = BLOCK_HEADER.unpack_from(raw)
+            decompressor = zlib.decompressobj(-15, zdict=self.block_dictionary(block))
+            self._cached = (block, decompressor.decompress(raw[BLOCK_HEADER.size + table_size:]))
+        return self._cached[1][offset:offset + size]
+
+    def extract(self, names: Iterable[str], target: Path) -> List[str]:
+        """Restore packed files into target (block by block); returns the restored names"""
+        target = Path(target)
+        restored = []
+        made = set()
+        for name in sorted(names, key=lambda n: self.members[n][:2]):
+            relative = os.path.normpath(name)
+            if os.path.isabs(relative) or relative.split(os.sep)[0] == "..":
+                logger.warning(f"⚠️  Skipping unsafe path: {name}")
+                continue
+            dest = target / relative
+            if dest.parent not in made:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                made.add(dest.parent)
+            # Small enough to write in one call; a block is decompressed once for all its files
+            with open(dest, "wb") as f:
+                f.write(self.read(name))
+            mtime = self.members[name][3]
+            os.utime(dest, (mtime, mtime))
+            restored.append(name)
+        return restored
@@ -5,14 +5,22 @@ Defines the interface that all storage providers must implement
 
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from typing import BinaryIO, Dict, List, Optional, Any
 import logging
+import re
+import shutil
+import tempfile
 
 logger = logging.getLogger(__name__)
 
+# Volumes and set index of a split backup (name.part001.zip, name.volumes.json)
+SET_MEMBER = re.compile(r"(\.part\d{3,}\.zip|\.volumes\.json)$")
+
 class StorageProvider(ABC):
     """Abstract base class for all storage providers"""
     
+    supports_parallel_upload = True  # Whether one instance may upload from several threads
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.provider_name = config.get('provider', 'unknown')
@@ -46,6 +54,50 @@ class StorageProvider(ABC):
     @abstractmethod
     def create_folder(self, folder_path: str) -> Optional[str]: ...
 
+    def delete_files(self, file_ids: List[str]) -> List[str]:
+        """Delete several files; returns the ids that could not be deleted
+        
+        Providers override this with their batch delete API; this fallback makes one
+        request per file.
+        """
+        failed = []
+        for file_id in file_ids:
+            try:
+                if not self.delete_file(file_id):
+                    failed.append(file_id)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not delete {file_id}: {e}")
+                failed.append(file_id)
+        return failed
+
+    def upload_stream(self, stream: BinaryIO, name: str, destination: str) -> Optional[str]:
+        """Upload everything read from a non-seekable stream as destination/name
+        
+        Providers override this with a multipart or resumable upload; this fallback
+        spools the stream to a temporary file and uses upload_file().
+        """
+        with tempfile.TemporaryDirectory() as tmp:
+            spooled = Path(tmp) / name
+            with open(spooled, 'wb') as f:
+                shutil.copyfileobj(stream, f, 1024 * 1024)
+            return self.upload_file(spooled, destination)
+
+    def upload_backup_stream(self, stream: BinaryIO, name: str, backup_type: str = "daily") -> Optional[str]:
+        """Stream a backup into the folder for its type (see upload_backup)"""
+        destination = self.get_backup_destination(backup_type)
+        file_id = self.upload_stream(stream, name, destination)
+        if file_id:
+            logger.info(f"✅ Backup streamed: {name} → {destination}")
+        return file_id
+
+    def get_file_size(self, file_id: str) -> int:
+        """Size in bytes of a stored file (needed for ranged reads)"""
+        raise NotImplementedError(f"{self.provider_name} does not support ranged reads")
+
+    def read_range(self, file_id: str, start: int, length: int) -> bytes:
+        """Read `length` bytes of a stored file starting at `start` without downloading it all"""
+        raise NotImplementedError(f"{self.provider_name} does not support ranged reads")
+
     def get_backup_destination(self, backup_type: str = "daily") -> str:
         return f"{self.backup_prefix}/{backup_type}"
 
@@ -66,12 +118,18 @@ class StorageProvider(ABC):
         try:
             folder_path = self.get_backup_destination(backup_type)
             files = self.list_files(folder_path)
-            if len(files) <= max_backups:
+            # The volumes and index of a split backup are kept or deleted together
+            backups: Dict[str, List[Dict[str, Any]]] = {}
+            for item in files:
+                backups.setdefault(SET_MEMBER.sub(".zip", item.get('name', '')), []).append(item)
+            if len(backups) <= max_backups:
                 return True
-            files_sorted = sorted(files, key=lambda x: x.get('modified_time', 0), reverse=True)
-            for old in files_sorted[max_backups:]:
-                if not self.delete_file(old.get('id')):
-                    logger.warning(f"⚠️ Could not delete old backup: {old.get('name')}")
+            newest = lambda name: max(item.get('modified_time', 0) for item in backups[name])
+            old = [item for name in sorted(backups, key=newest, reverse=True)[max_backups:] for item in backups[name]]
+            failed = set(self.delete_files([item.get('id') for item in old]))
+            for item in old:
+                if item.get('id') in failed:
+                    logger.warning(f"⚠️ Could not delete old backup: {item.get('name')}")
             return True
         except Exception as e:
             logger.error(f"💥 Error during cleanup: {e}")
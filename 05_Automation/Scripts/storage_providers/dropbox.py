@@ -4,11 +4,31 @@ Implements Dropbox storage functionality for PaulysOps
 """
 
 import os
+import time
+import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 
 from .base_provider import StorageProvider
 
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Bytes per upload session request
+DELETE_BATCH = 1000                  # Entries per files_delete_batch call (the API maximum)
+DELETE_POLL = 1.0                    # Seconds between checks on a running batch delete
+
+def _read_full(stream, size: int) -> bytes:
+    """Read exactly size bytes unless the stream ends first"""
+    parts = []
+    remaining = size
+    while remaining:
+        data = stream.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
 class DropboxProvider(StorageProvider):
     """Dropbox storage provider implementation"""
     
@@ -34,6 +54,7 @@ class DropboxProvider(StorageProvider):
             
             # Create Dropbox client
             self.client = dropbox.Dropbox(self.config['access_token'])
+            self._temporary_links = {}  # file id -> temporary download link (ranged reads)
             
             # Test connection
             self.client.users_get_current_account()
@@ -83,6 +104,34 @@ class DropboxProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Dropbox upload failed: {str(e)}")
     
+    def upload_stream(self, stream, name: str, destination: str) -> Optional[str]:
+        """Upload a stream with an upload session, one chunk at a time"""
+        try:
+            import dropbox
+            
+            if not self._authenticated:
+                if not self.authenticate():
+                    return None
+            
+            self._ensure_folder_exists(destination)
+            dropbox_path = f"/{destination}/{name}"
+            commit = dropbox.files.CommitInfo(path=dropbox_path, mode=dropbox.files.WriteMode.overwrite)
+            
+            chunk = _read_full(stream, UPLOAD_CHUNK_SIZE)
+            session = self.client.files_upload_session_start(chunk)
+            cursor = dropbox.files.UploadSessionCursor(session_id=session.session_id, offset=len(chunk))
+            
+            while True:
+                chunk = _read_full(stream, UPLOAD_CHUNK_SIZE)
+                if len(chunk) < UPLOAD_CHUNK_SIZE:
+                    metadata = self.client.files_upload_session_finish(chunk, cursor, commit)
+                    return metadata.id
+                self.client.files_upload_session_append_v2(chunk, cursor)
+                cursor.offset += len(chunk)
+            
+        except Exception as e:
+            raise Exception(f"Dropbox stream upload failed: {str(e)}")
+    
     def download_file(self, file_id: str, local_path: Path) -> bool:
         """Download file from Dropbox"""
         try:
@@ -99,6 +148,39 @@ class DropboxProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Dropbox download failed: {str(e)}")
     
+    def get_file_size(self, file_id: str) -> int:
+        """Size of a Dropbox file"""
+        try:
+            return self.client.files_get_metadata(file_id).size
+        except Exception as e:
+            raise Exception(f"Dropbox metadata lookup failed: {str(e)}")
+    
+    def read_range(self, file_id: str, start: int, length: int) -> bytes:
+        """Read part of a Dropbox file
+        
+        The SDK's files_download has no range option, so this requests a temporary
+        download link once per file and sends HTTP Range requests to it.
+        """
+        if length <= 0:
+            return b""
+        try:
+            import requests
+            
+            if file_id not in self._temporary_links:
+                self._temporary_links[file_id] = self.client.files_get_temporary_link(file_id).link
+            
+            response = requests.get(
+                self._temporary_links[file_id],
+                headers={'Range': f"bytes={start}-{start + length - 1}"},
+                timeout=60
+            )
+            response.raise_for_status()
+            if response.status_code != 206 and start > 0:
+                raise Exception("server ignored the Range header")
+            return response.content[:length]
+        except Exception as e:
+            raise Exception(f"Dropbox ranged read failed: {str(e)}")
+    
     def list_files(self, folder_path: str = "") -> List[Dict[str, Any]]:
         """List files in Dropbox folder"""
         try:
@@ -113,9 +195,13 @@ class DropboxProvider(StorageProvider):
                 if "not_found" in str(e).lower():
                     return []
                 raise
+            entries = list(result.entries)
+            while result.has_more:
+                result = self.client.files_list_folder_continue(result.cursor)
+                entries += result.entries
             
             files = []
-            for entry in result.entries:
+            for entry in entries:
                 if hasattr(entry, 'id'):  # File or folder
                     files.append({
                         'id': entry.id,
@@ -134,13 +220,44 @@ class DropboxProvider(StorageProvider):
     def delete_file(self, file_id: str) -> bool:
         """Delete file from Dropbox"""
         try:
-            # Get file metadata to get path
-            metadata = self.client.files_get_metadata(file_id)
-            self.client.files_delete_v2(metadata.path_display)
+            # Dropbox accepts an "id:..." file id wherever it takes a path
+            self.client.files_delete_v2(file_id)
             return True
         except Exception as e:
             raise Exception(f"Dropbox delete failed: {str(e)}")
     
+    def delete_files(self, file_ids: List[str]) -> List[str]:
+        """Delete files with files_delete_batch, up to DELETE_BATCH per job"""
+        from dropbox.files import DeleteArg
+        
+        failed = []
+        for start in range(0, len(file_ids), DELETE_BATCH):
+            batch = file_ids[start:start + DELETE_BATCH]
+            try:
+                launch = self.client.files_delete_batch([DeleteArg(file_id) for file_id in batch])
+                if launch.is_async_job_id():
+                    job_id = launch.get_async_job_id()
+                    status = self.client.files_delete_batch_check(job_id)
+                    while status.is_in_progress():
+                        time.sleep(DELETE_POLL)
+                        status = self.client.files_delete_batch_check(job_id)
+                    if not status.is_complete():
+                        raise Exception(f"batch job ended with {status}")
+                    result = status.get_complete()
+                else:
+                    result = launch.get_complete()
+            except Exception as e:
+                logger.warning(f"⚠️ Dropbox batch delete of {len(batch)} files failed: {e}")
+                failed += batch
+                continue
+            for file_id, entry in zip(batch, result.entries):
+                if entry.is_failure():
+                    error = entry.get_failure()
+                    # Already gone counts as deleted
+                    if not (error.is_path_lookup() and error.get_path_lookup().is_not_found()):
+                        failed.append(file_id)
+        return failed
+    
     def create_folder(self, folder_path: str) -> Optional[str]:
         """Create folder in Dropbox"""
         try:
@@ -9,9 +9,63 @@ from typing import Dict, List, Optional, Any
 
 from .base_provider import StorageProvider
 
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Resumable upload chunk (multiple of 256 KiB)
+DELETE_BATCH = 100                   # Calls per batch HTTP request (Drive's limit)
+LIST_PAGE_SIZE = 1000                # Files per list request (the API maximum)
+
+def _stream_media_upload(stream, chunk_size: int = UPLOAD_CHUNK_SIZE):
+    """MediaUpload over a non-seekable stream
+    
+    MediaIoBaseUpload needs a seekable file of known size. This reports an unknown
+    size and keeps the current chunk buffered, so a chunk the server did not fully
+    accept can be sent again; a short read tells the client the upload is complete.
+    """
+    from googleapiclient.http import MediaUpload
+    
+    class StreamMediaUpload(MediaUpload):
+        def __init__(self):
+            super().__init__()
+            self._start = 0
+            self._buffer = bytearray()
+        
+        def chunksize(self):
+            return chunk_size
+        
+        def mimetype(self):
+            return 'application/zip'
+        
+        def size(self):
+            return None
+        
+        def resumable(self):
+            return True
+        
+        def has_stream(self):
+            return False
+        
+        def getbytes(self, begin, length):
+            if begin < self._start:
+                raise IOError("Cannot rewind a streamed upload past the current chunk")
+            # Drop bytes the server has confirmed, then top up to the requested length
+            while self._start + len(self._buffer) < begin:
+                if not stream.read(begin - self._start - len(self._buffer)):
+                    break
+            del self._buffer[:begin - self._start]
+            self._start = begin
+            while len(self._buffer) < length:
+                data = stream.read(length - len(self._buffer))
+                if not data:
+                    break
+                self._buffer += data
+            return bytes(self._buffer[:length])
+    
+    return StreamMediaUpload()
+
 class GoogleDriveProvider(StorageProvider):
     """Google Drive storage provider implementation"""
     
+    supports_parallel_upload = False  # The httplib2 transport is not thread-safe
+    
     def _validate_config(self) -> bool:
         """Validate Google Drive configuration"""
         required_keys = ['credentials_path', 'token_path']
@@ -104,6 +158,30 @@ class GoogleDriveProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Google Drive upload failed: {str(e)}")
     
+    def upload_stream(self, stream, name: str, destination: str) -> Optional[str]:
+        """Resumable upload of a stream of unknown length, one chunk at a time"""
+        try:
+            if not self._authenticated:
+                if not self.authenticate():
+                    return None
+            
+            folder_id = self._get_or_create_folder(destination)
+            media = _stream_media_upload(stream)
+            request = self.service.files().create(
+                body={"name": name, "parents": [folder_id]},
+                media_body=media,
+                fields="id"
+            )
+            
+            response = None
+            while response is None:
+                _status, response = request.next_chunk(num_retries=3)
+            
+            return response['id']
+            
+        except Exception as e:
+            raise Exception(f"Google Drive stream upload failed: {str(e)}")
+    
     def download_file(self, file_id: str, local_path: Path) -> bool:
         """Download file from Google Drive"""
         try:
@@ -121,6 +199,24 @@ class GoogleDriveProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Google Drive download failed: {str(e)}")
     
+    def get_file_size(self, file_id: str) -> int:
+        """Size of a Google Drive file"""
+        try:
+            return int(self.service.files().get(fileId=file_id, fields="size").execute()['size'])
+        except Exception as e:
+            raise Exception(f"Google Drive size lookup failed: {str(e)}")
+    
+    def read_range(self, file_id: str, start: int, length: int) -> bytes:
+        """Read part of a Google Drive file with a Range header on the media download"""
+        if length <= 0:
+            return b""
+        try:
+            request = self.service.files().get_media(fileId=file_id)
+            request.headers['Range'] = f"bytes={start}-{start + length - 1}"
+            return request.execute()
+        except Exception as e:
+            raise Exception(f"Google Drive ranged read failed: {str(e)}")
+    
     def list_files(self, folder_path: str = "") -> List[Dict[str, Any]]:
         """List files in Google Drive folder"""
         try:
@@ -132,13 +228,22 @@ class GoogleDriveProvider(StorageProvider):
             if not folder_id:
                 return []
             
-            results = self.service.files().list(
-                q=f"'{folder_id}' in parents and trashed=false",
-                fields="files(id,name,size,modifiedTime,webViewLink)"
-            ).execute()
+            found = []
+            page_token = None
+            while True:
+                results = self.service.files().list(
+                    q=f"'{folder_id}' in parents and trashed=false",
+                    fields="nextPageToken, files(id,name,size,modifiedTime,webViewLink)",
+                    pageSize=LIST_PAGE_SIZE,
+                    pageToken=page_token
+                ).execute()
+                found += results.get('files', [])
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
             
             files = []
-            for file_info in results.get('files', []):
+            for file_info in found:
                 files.append({
                     'id': file_info['id'],
                     'name': file_info['name'],
@@ -161,6 +266,26 @@ class GoogleDriveProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Google Drive delete failed: {str(e)}")
     
+    def delete_files(self, file_ids: List[str]) -> List[str]:
+        """Delete files with batch HTTP requests of up to DELETE_BATCH calls"""
+        failed = []
+        
+        def deleted(request_id, response, exception):
+            # Already gone (404) counts as deleted
+            if exception is not None and getattr(getattr(exception, 'resp', None), 'status', None) != 404:
+                failed.append(request_id)
+        
+        for start in range(0, len(file_ids), DELETE_BATCH):
+            batch_ids = file_ids[start:start + DELETE_BATCH]
+            batch = self.service.new_batch_http_request(callback=deleted)
+            for file_id in batch_ids:
+                batch.add(self.service.files().delete(fileId=file_id), request_id=file_id)
+            try:
+                batch.execute()
+            except Exception:
+                failed += [file_id for file_id in batch_ids if file_id not in failed]
+        return failed
+    
     def create_folder(self, folder_path: str) -> Optional[str]:
         """Create folder in Google Drive"""
         try:
@@ -81,6 +81,27 @@ class LocalStorageProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Local storage upload failed: {str(e)}")
     
+    def upload_stream(self, stream, name: str, destination: str) -> Optional[str]:
+        """Copy a stream into local storage"""
+        try:
+            dest_dir = self.storage_path / destination
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            dest_path = dest_dir / name
+            partial = dest_dir / f".{name}.partial"
+            
+            try:
+                with open(partial, 'wb') as f:
+                    shutil.copyfileobj(stream, f, 1024 * 1024)
+                os.replace(partial, dest_path)
+            except BaseException:
+                partial.unlink(missing_ok=True)
+                raise
+            
+            return str(dest_path.relative_to(self.storage_path))
+            
+        except Exception as e:
+            raise Exception(f"Local storage stream upload failed: {str(e)}")
+    
     def download_file(self, file_id: str, local_path: Path) -> bool:
         """Copy file from local storage"""
         try:
@@ -98,6 +119,19 @@ class LocalStorageProvider(StorageProvider):
         except Exception as e:
             raise Exception(f"Local storage download failed: {str(e)}")
     
+    def get_file_size(self, file_id: str) -> int:
+        """Size of a file in local storage"""
+        return (self.storage_path / file_id).stat().st_size
+    
+    def read_range(self, file_id: str, start: int, length: int) -> bytes:
+        """Read part of a file in local storage"""
+        try:
+            with open(self.storage_path / file_id, 'rb') as f:
+                f.seek(start)
+                return f.read(length)
+        except Exception as e:
+            raise Exception(f"Local storage ranged read failed: {str(e)}")
+    
     def list_files(self, folder_path: str = "") -> List[Dict[str, Any]]:
         """List files in local storage folder"""
         try:
@@ -3,11 +3,16 @@ AWS S3 Storage Provider
 Implements AWS S3 storage functionality for enterprise customers
 """
 
+import logging
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 
 from .base_provider import StorageProvider
 
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH = 1000  # Keys per DeleteObjects request (the API maximum)
+
 class S3Provider(StorageProvider):
     """AWS S3 storage provider implementation"""
     
@@ -100,6 +105,32 @@ class S3Provider(StorageProvider):
         except Exception as e:
             raise Exception(f"S3 upload failed: {str(e)}")
     
+    def upload_stream(self, stream, name: str, destination: str) -> Optional[str]:
+        """Multipart upload from a non-seekable stream (parts are buffered one at a time)"""
+        try:
+            from boto3.s3.transfer import TransferConfig
+            
+            if not self._authenticated:
+                if not self.authenticate():
+                    return None
+            
+            s3_key = f"{destination}/{name}"
+            self.s3_client.upload_fileobj(
+                stream,
+                self.bucket_name,
+                s3_key,
+                Config=TransferConfig(
+                    multipart_threshold=16 * 1024 * 1024,
+                    multipart_chunksize=16 * 1024 * 1024,
+                    max_concurrency=4
+                )
+            )
+            
+            return s3_key
+            
+        except Exception as e:
+            raise Exception(f"S3 stream upload failed: {str(e)}")
+    
     def download_file(self, file_id: str, local_path: Path) -> bool:
         """Download file from S3"""
         try:
@@ -115,13 +146,34 @@ class S3Provider(StorageProvider):
         except Exception as e:
             raise Exception(f"S3 download failed: {str(e)}")
     
+    def get_file_size(self, file_id: str) -> int:
+        """Size of an S3 object"""
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=file_id)['ContentLength']
+        except Exception as e:
+            raise Exception(f"S3 head object failed: {str(e)}")
+    
+    def read_range(self, file_id: str, start: int, length: int) -> bytes:
+        """Read part of an S3 object with a Range request"""
+        if length <= 0:
+            return b""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=file_id,
+                Range=f"bytes={start}-{start + length - 1}"
+            )
+            return response['Body'].read()
+        except Exception as e:
+            raise Exception(f"S3 ranged read failed: {str(e)}")
+    
     def list_files(self, folder_path: str = "") -> List[Dict[str, Any]]:
         """List files in S3 folder"""
         try:
             # List objects with prefix
             prefix = f"{folder_path}/" if folder_path else ""
             
-            response = self.s3_client.list_objects_v2(
+            pages = self.s3_client.get_paginator('list_objects_v2').paginate(
                 Bucket=self.bucket_name,
                 Prefix=prefix,
                 Delimiter='/'
@@ -129,9 +181,9 @@ class S3Provider(StorageProvider):
             
             files = []
             
-            # Add files
-            if 'Contents' in response:
-                for obj in response['Contents']:
+            # Add files (1000 per page)
+            for response in pages:
+                for obj in response.get('Contents', []):
                     if not obj['Key'].endswith('/'):  # Skip folders
                         files.append({
                             'id': obj['Key'],
@@ -158,6 +210,23 @@ class S3Provider(StorageProvider):
         except Exception as e:
             raise Exception(f"S3 delete failed: {str(e)}")
     
+    def delete_files(self, file_ids: List[str]) -> List[str]:
+        """Delete objects with DeleteObjects, up to DELETE_BATCH keys per request"""
+        failed = []
+        for start in range(0, len(file_ids), DELETE_BATCH):
+            batch = file_ids[start:start + DELETE_BATCH]
+            try:
+                response = self.s3_client.delete_objects(
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                )
+            except Exception as e:
+                logger.warning(f"⚠️ S3 batch delete of {len(batch)} objects failed: {e}")
+                failed += batch
+                continue
+            failed += [error['Key'] for error in response.get('Errors', [])]
+        return failed
+    
     def create_folder(self, folder_path: str) -> Optional[str]:
         """Create folder in S3 (S3 doesn't have real folders, but we can create empty objects)"""
         try:
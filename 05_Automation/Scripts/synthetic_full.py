@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Synthetic Full Backups
+Builds a new full backup by merging the last full with the incrementals after it,
+entirely at the archive level: each file's newest compressed entry is copied raw
+from whichever archive holds it, so nothing is recompressed and the source tree
+is never reread
+"""
+
+import json
+import os
+import sys
+import time
+import zipfile
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from backup_archive import READ_SIZE, ZipArchiveWriter
+from backup_checkpoint import partial_path
+from backup_manifest import (
+    ARCHIVE_MANIFEST_NAME, BACKUP_INFO_NAME, DELETED_LIST_NAME, METADATA_DIR, ArchiveManifest, FileManifest,
+    manifest_path,
+)
+from backup_volumes import VolumeSetWriter, archive_paths, missing_volumes, read_volume_info
+from solid_pack import (
+    BLOCK_HEADER, SOLID_DICT_NAME, SOLID_DIR, SolidPacker, SolidReader, add_solid_index,
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MAX_CHAIN = 400  # Incrementals followed back to their full before giving up
+
+class SyntheticError(Exception):
+    """The backup chain can't be merged (missing archives, broken links, no manifests)"""
+
+class ChainArchive:
+    """One backup of a chain: its zip files and what they contain"""
+
+    def __init__(self, name: str, paths: List[Path]):
+        self.name = name
+        self.paths = paths
+        self.info: Dict[str, Any] = {}
+        self.deleted: List[str] = []
+        self.names: List[str] = []  # Files, directories and packed files, in no particular order
+        for path in paths:
+            with zipfile.ZipFile(path) as zf:
+                namelist = zf.namelist()
+                if BACKUP_INFO_NAME in namelist:
+                    self.info = json.loads(zf.read(BACKUP_INFO_NAME))
+                if DELETED_LIST_NAME in namelist:
+                    self.deleted = zf.read(DELETED_LIST_NAME).decode("utf-8").splitlines()
+                self.names += [name for name in namelist if not name.startswith(METADATA_DIR)]
+                self.names += SolidReader(zf).names()
+        if not self.info:
+            raise SyntheticError(f"{name} has no backup information (written by an older version?)")
+        if len(paths) > 1 or read_volume_info(paths[0]) is not None:
+            missing = missing_volumes([read_volume_info(path) for path in paths])
+            if missing is None or missing:
+                raise SyntheticError(f"{name} is missing volumes: {missing or 'the last one'}")
+
+    @property
+    def kind(self) -> str:
+        return self.info.get("kind", "full")
+
+def find_archive(folders: List[Path], name: str) -> Optional[ChainArchive]:
+    for folder in folders:
+        paths = archive_paths(folder, name)
+        if paths:
+            return ChainArchive(name, paths)
+    return None
+
+def resolve_chain(folders: List[Path], latest: str) -> List[ChainArchive]:
+    """The full backup and the incrementals after it, oldest first, ending with latest"""
+    chain = []
+    name = latest
+    while len(chain) < MAX_CHAIN:
+        archive = find_archive(folders, name)
+        if archive is None:
+            raise SyntheticError(f"Backup {name} is not in {', '.join(str(folder) for folder in folders)}")
+        chain.append(archive)
+        if archive.kind == "full":
+            return chain[::-1]
+        name = archive.info.get("previous_archive")
+        if not name:
+            raise SyntheticError(f"Incremental {archive.name} does not name the backup before it")
+    raise SyntheticError(f"No full backup within {MAX_CHAIN} backups of {latest}")
+
+def live_sources(chain: List[ChainArchive]) -> Dict[str, int]:
+    """Each path in the final tree -> index in chain of the archive holding its newest version"""
+    live: Dict[str, int] = {}
+    for index, archive in enumerate(chain):
+        for name in archive.deleted:
+            live.pop(name, None)
+        for name in archive.names:
+            live[name] = index
+    return live
+
+def _raw_chunks(f, offset: int, length: int):
+    f.seek(offset)
+    while length > 0:
+        chunk = f.read(min(READ_SIZE, length))
+        if not chunk:
+            raise SyntheticError(f"Archive ended early while copying an entry at offset {offset}")
+        length -= len(chunk)
+        yield chunk
+
+def _entry_mtime(info: zipfile.ZipInfo) -> float:
+    return time.mktime(info.date_time + (0, 0, -1))
+
+def copy_chain(writer: ZipArchiveWriter, chain: List[ChainArchive], live: Dict[str, int]) -> Dict[str, int]:
+    """Copy the live entries of every chain archive into writer, each archive read front to back
+
+    Solid blocks keep their compressed payload: a block with superseded or deleted
+    files gets a new member table listing only the live ones (the dead bytes stay,
+    unreferenced), and a block packed with another archive's dictionary names it.
+    Returns counts of raw-copied files, directories, solid blocks copied unchanged,
+    blocks copied under a new table, and the bytes of dead files those still carry.
+    """
+    counts = {"files": 0, "dirs": 0, "blocks": 0, "retabled": 0, "dead_bytes": 0}
+    packer: Optional[SolidPacker] = None
+    dictionary = None
+    for archive in reversed(chain):  # The newest dictionary packs best for what comes next
+        for path in archive.paths:
+            with zipfile.ZipFile(path) as zf:
+                if SOLID_DICT_NAME in zf.namelist():
+                    dictionary = zf.read(SOLID_DICT_NAME)
+                    break
+        if dictionary is not None:
+            break
+
+    for index, archive in enumerate(chain):
+        for path in archive.paths:
+            manifest = ArchiveManifest.load(path)
+            if manifest is None:
+                raise SyntheticError(f"{path.name} has no archive manifest (written by an older version?)")
+            with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+                infos = sorted(zf.infolist(), key=lambda info: info.header_offset)
+                for info in infos:
+                    name = info.filename
+                    if name.startswith(METADATA_DIR) or live.get(name) != index:
+                        continue
+                    mode = info.external_attr >> 16
+                    if info.is_dir():
+                        writer.add_directory(name, _entry_mtime(info), (mode & 0o7777) or 0o755)
+                        counts["dirs"] += 1
+                        continue
+                    entry = manifest.get(name)
+                    if entry is None:
+                        raise SyntheticError(f"{name} is missing from the manifest of {path.name}")
+                    writer.add_raw(name, _raw_chunks(f, entry.data_offset, entry.compress_size), entry.crc,
+                                   entry.size, entry.method, entry.mtime, mode or 0o100644, entry.digest)
+                    counts["files"] += 1
+
+                solid = SolidReader(zf)
+                if not len(solid):
+                    continue
+                if packer is None:
+                    packer = SolidPacker(writer, dictionary or solid.dictionary)
+                for block, members in sorted(solid.block_members().items()):
+                    wanted = [member for member in members if live.get(member[0]) == index]
+                    if not wanted:
+                        continue
+                    entry = manifest.get(block)
+                    if entry is None:
+                        raise SyntheticError(f"{block} is missing from the manifest of {path.name}")
+                    dictionary = solid.block_dictionary(block)
+                    if len(wanted) == len(members) and dictionary == packer.dictionary:
+                        packer.copy_block(_raw_chunks(f, entry.data_offset, entry.compress_size), entry.crc,
+                                          entry.size, entry.digest, members)
+                        counts["blocks"] += 1
+                        continue
+                    # Stored entries: the block's bytes are the entry's data
+                    raw = b"".join(_raw_chunks(f, entry.data_offset, entry.compress_size))
+                    _magic, _version, table_size = BLOCK_HEADER.unpack_from(raw)
+                    packer.copy_payload(raw[BLOCK_HEADER.size + table_size:], dictionary,
+                                        sorted(wanted, key=lambda member: member[1]))
+                    counts["retabled"] += 1
+                    counts["dead_bytes"] += sum(member[2] for member in members) - sum(member[2] for member in wanted)
+    if packer is not None:
+        packer.close()
+    return counts
+
+def synthesize_full(folders: List[Path], latest: str, dest: Path, backup_type: str = None,
+                    volume_size: int = 0) -> Tuple[List[Path], ZipArchiveWriter, List[str]]:
+    """Merge the chain ending at backup `latest` into a new full backup at dest
+
+    folders are searched in order for the chain's archives. With volume_size (bytes)
+    the result is written as split volumes. Returns (written zip files, closed
+    writer, names of the chain's archives).
+    """
+    dest = Path(dest)
+    chain = resolve_chain(folders, latest)
+    if len(chain) == 1:
+        raise SyntheticError(f"{latest} is already a full backup")
+    live = live_sources(chain)
+    names = [archive.name for archive in chain]
+    print(f"🧬 Merging {names[0]} with {len(chain) - 1} incrementals ({len(live)} paths)")
+
+    info = {
+        "backup_type": backup_type,
+        "kind": "full",
+        "synthetic": True,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "sources": names,
+        "files": sum(1 for name in live if not name.endswith("/")),
+        "deleted": 0,
+    }
+
+    if volume_size:
+        volumes = VolumeSetWriter(dest, volume_size, {"synthetic": True})
+        try:
+            counts = copy_chain(volumes.writer, chain, live)
+            volumes.close([(BACKUP_INFO_NAME, json.dumps(info, indent=2).encode("utf-8"))])
+        except BaseException:
+            volumes.discard()
+            raise
+        paths = [dest.with_name(volume["name"]) for volume in volumes.volumes]
+        writer = volumes.writer
+    else:
+        partial = partial_path(dest)
+        try:
+            with open(partial, "wb") as f:
+                writer = ZipArchiveWriter(f)
+                counts = copy_chain(writer, chain, live)
+                writer.add_bytes(BACKUP_INFO_NAME, json.dumps(info, indent=2).encode("utf-8"))
+                add_solid_index(writer)
+                manifest = ArchiveManifest.from_writer(writer, dest.name)
+                writer.add_bytes(ARCHIVE_MANIFEST_NAME, manifest.to_bytes())
+                writer.close()
+                os.fsync(f.fileno())
+            os.replace(partial, dest)
+        except BaseException:
+            partial.unlink(missing_ok=True)
+            raise
+        manifest.save_sidecar(dest)
+        paths = [dest]
+
+    print(f"   📋 Copied {counts['files']} files and {counts['blocks'] + counts['retabled']} solid blocks raw, "
+          f"{counts['dirs']} folders")
+    if counts["retabled"]:
+        print(f"   🧱 {counts['retabled']} blocks got a new file table; they still carry "
+              f"{round(counts['dead_bytes'] / 1024, 1)} KB of superseded or deleted files")
+    return paths, writer, names
+
+def check_archives(paths: List[Path], writer: ZipArchiveWriter):
+    """Cheap structural check of the written zips (the copied data keeps its source CRCs)"""
+    expected = sum(1 for name in writer.digests if not name.startswith(SOLID_DIR))
+    found = 0
+    for path in paths:
+        with zipfile.ZipFile(path) as zf:
+            found += sum(1 for info in zf.infolist() if not info.is_dir() and info.filename in writer.digests)
+    if found < expected:
+        raise SyntheticError(f"Only {found} of {expected} entries are readable in the synthetic full")
+
+def incremental_type(backup_config) -> Optional[str]:
+    """A configured backup type that runs incrementally (used to capture changes first)"""
+    for name, settings in backup_config.get("backup_types", {}).items():
+        if settings.get("type") == "incremental":
+            return name
+    return None
+
+def run_synthetic_full(config=None, backup_type: str = "weekly", refresh: bool = True,
+                       volume_size_mb: Optional[int] = None) -> bool:
+    """Create a full backup for one tenant (None means config.py) from its backup chain
+
+    With refresh, an incremental backup runs first so the synthetic full includes
+    today's changes; it is cheap compared to rereading the whole tree.
+    """
+    from config import BACKUP_CONFIG, STATE_DIR, STORAGE_CONFIG, get_folder_path
+    from create_backup_zip import backup_mode, run_backup
+
+    backup_config = config.backup_config if config else BACKUP_CONFIG
+    backup_prefix = config.backup_prefix if config else STORAGE_CONFIG["backup_prefix"]
+    backup_folder = config.get_folder_path("backups") if config else get_folder_path("backups")
+    manifest_file = manifest_path(STATE_DIR, backup_prefix)
+
+    if refresh:
+        daily = incremental_type(backup_config)
+        if daily is None:
+            logger.error("❌ No incremental backup type is configured to capture recent changes")
+            return False
+        if not run_backup(config, daily):
+            return False
+
+    state = FileManifest.load(manifest_file)
+    if state is None or not state.archive:
+        logger.error("❌ No previous backup to build a synthetic full from")
+        return False
+
+    start_time = time.time()
+    date = time.strftime("%Y-%m-%d_%H%M")
+    dest = backup_folder / f"{backup_prefix}_{backup_type}_{date}.zip"
+    _stream, _keep_local, volume_size_mb = backup_mode(backup_config, False, volume_size_mb)
+    try:
+        paths, writer, sources = synthesize_full([backup_folder, backup_folder / "Archive"], state.archive,
+                                                 dest, backup_type, volume_size_mb * 1024**2)
+        check_archives(paths, writer)
+    except (SyntheticError, OSError, ValueError, zipfile.BadZipFile) as e:
+        logger.error(f"❌ Synthetic full backup failed: {e}")
+        return False
+
+    # Later incrementals chain from the synthetic full; the tree state itself is unchanged
+    latest = FileManifest.load(manifest_file)
+    if latest is not None and latest.archive == sources[-1]:
+        latest.archive = latest.full_archive = dest.name
+        latest.backup_type = backup_type
+        latest.save(manifest_file)
+
+    size_gb = round(sum(path.stat().st_size for path in paths) / (1024**3), 2)
+    print(f"✅ Synthetic {backup_type} backup {dest.name} ({size_gb} GB) in "
+          f"{round(time.time() - start_time, 2)} seconds")
+    return True
+
+def main():
+    """Build a synthetic full backup from the latest backup chain"""
+    import argparse
+    from config import BACKUP_CONFIG
+
+    parser = argparse.ArgumentParser(description="Merge the last full backup and its incrementals into a new full")
+    parser.add_argument("backup_type", nargs="?", default="weekly", choices=list(BACKUP_CONFIG["backup_types"]))
+    parser.add_argument("--no-refresh", action="store_true",
+                        help="Merge the existing chain without running an incremental backup first")
+    args = parser.parse_args()
+    return run_synthetic_full(backup_type=args.backup_type, refresh=not args.no_refresh)
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
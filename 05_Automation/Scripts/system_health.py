@@ -242,7 +242,7 @@ class SystemHealthChecker:
         """Check required system tools"""
         self.print_section_header("SYSTEM TOOLS STATUS")
         
-        required_tools = ["zip", "rsync"]
+        required_tools = ["rsync"]  # Backups use the built-in ZIP64 writer
         all_tools_ok = True
         
         for tool in required_tools:
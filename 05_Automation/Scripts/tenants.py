@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+BigSkyAg Multi-Tenant Registry
+Per-company immutable config contexts so one process can route, back up and
+upload for several companies concurrently
+"""
+
+import sys
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from config import BASE_DIR, COMPANY_SETTINGS, COMPANY_TEMPLATES, build_company_config
+from config_loader import CompiledConfig
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 4
+
+def default_tenant_base_dir(company_name: str) -> Path:
+    """The default company keeps BASE_DIR; other tenants get a sibling folder"""
+    if company_name == COMPANY_SETTINGS["company_name"]:
+        return BASE_DIR
+    return BASE_DIR.parent / company_name
+
+class TenantRegistry:
+    """Registry of per-tenant CompiledConfig contexts with shared workers and caches"""
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_WORKERS):
+        self.max_workers = max_workers
+        self._tenants: Dict[str, CompiledConfig] = {}
+        self._providers: Dict[str, Any] = {}
+        self._lock = threading.RLock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def register(self, company_name: str, storage_provider: str = None,
+                 custom_settings: Dict[str, Any] = None, base_dir: Path = None) -> CompiledConfig:
+        """Build and register an immutable config context for a company"""
+        if base_dir is None:
+            base_dir = default_tenant_base_dir(company_name)
+        compiled = build_company_config(company_name, storage_provider, custom_settings, base_dir)
+        return self.register_config(compiled)
+
+    def register_config(self, compiled: CompiledConfig) -> CompiledConfig:
+        """Register an already-built config context (replacing any previous one)"""
+        with self._lock:
+            self._tenants[compiled.company_name] = compiled
+            # A new context may point at different credentials
+            self._providers.pop(compiled.company_name, None)
+        return compiled
+
+    def load_templates(self, templates: Dict[str, Dict[str, Any]] = None) -> List[str]:
+        """Register every company in COMPANY_TEMPLATES (or the given templates)"""
+        templates = COMPANY_TEMPLATES if templates is None else templates
+        for company_name, template in templates.items():
+            custom_settings = {k: v for k, v in template.items() if k not in ("company_name", "storage_provider")}
+            self.register(
+                template.get("company_name", company_name),
+                template.get("storage_provider"),
+                custom_settings,
+                template.get("base_dir"),
+            )
+        return list(templates)
+
+    def get(self, company_name: str) -> CompiledConfig:
+        """Get the config context for a registered tenant"""
+        with self._lock:
+            if company_name not in self._tenants:
+                raise ValueError(f"Unknown tenant: {company_name}")
+            return self._tenants[company_name]
+
+    def names(self) -> List[str]:
+        with self._lock:
+            return list(self._tenants)
+
+    def get_provider(self, company_name: str):
+        """Get the tenant's storage provider, creating it once and sharing it afterwards"""
+        from storage_providers import get_storage_provider
+
+        with self._lock:
+            provider = self._providers.get(company_name)
+            if provider is None:
+                provider_config = self.get(company_name).get_storage_provider_config()
+                provider = get_storage_provider(provider_config["provider"], provider_config)
+                self._providers[company_name] = provider
+            return provider
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """Worker pool shared by every tenant task"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="tenant")
+            return self._executor
+
+    def run(self, task: Callable[[CompiledConfig], Any],
+            company_names: Iterable[str] = None) -> Dict[str, Any]:
+        """Run task(config) for each tenant in parallel
+
+        Returns {company_name: result}; a task that raised maps to its exception.
+        """
+        company_names = list(company_names) if company_names is not None else self.names()
+        futures = {name: self.executor.submit(task, self.get(name)) for name in company_names}
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"❌ {name}: {e}")
+                results[name] = e
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+_registry: Optional[TenantRegistry] = None
+_registry_lock = threading.Lock()
+
+def get_registry() -> TenantRegistry:
+    """Process-wide registry, pre-loaded with COMPANY_TEMPLATES"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = TenantRegistry()
+            _registry.load_templates()
+        return _registry
+
+# === SCHEDULED TASKS ===
+
+def route_task(config: CompiledConfig):
+    from router import FileRouter
+    return FileRouter(config).route_files()
+
+def backup_task(config: CompiledConfig):
+    from create_backup_zip import run_backup
+    if not config.backup_config.get("stream_upload"):
+        return run_backup(config)
+    try:
+        provider = get_registry().get_provider(config.company_name)
+    except Exception as e:
+        logger.error(f"❌ {config.company_name}: storage provider unavailable: {e}")
+        return False
+    return run_backup(config, provider=provider)
+
+def upload_task(config: CompiledConfig):
+    from upload_backup import run_backup_upload
+    registry = get_registry()
+    try:
+        provider = registry.get_provider(config.company_name)
+    except Exception as e:
+        logger.error(f"❌ {config.company_name}: storage provider unavailable: {e}")
+        return False
+    return run_backup_upload(config, provider=provider)
+
+TASKS = {
+    "route": [route_task],
+    "backup": [backup_task],
+    "upload": [upload_task],
+    "all": [route_task, backup_task, upload_task],
+}
+
+def main():
+    """Run routing/backup/upload for several tenants in one process"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run automation tasks for several companies")
+    parser.add_argument("task", choices=sorted(TASKS), help="Task to run for each tenant")
+    parser.add_argument("--tenants", help="Comma-separated company names (default: all templates)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_MAX_WORKERS, help="Shared worker pool size")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    registry.max_workers = args.workers
+    company_names = args.tenants.split(",") if args.tenants else registry.names()
+
+    print(f"🏢 Tenants: {', '.join(company_names)}")
+    success = True
+    for task in TASKS[args.task]:
+        results = registry.run(task, company_names)
+        for name, result in results.items():
+            ok = result is True
+            success = success and ok
+            print(f"   {'✅' if ok else '❌'} {name}: {task.__name__.replace('_task', '')}")
+
+    registry.shutdown()
+    return success
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
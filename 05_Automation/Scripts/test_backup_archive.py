@@ -0,0 +1,1071 @@
+"""
+Test script for the BigSkyAg backup archive writer
+Builds small archives in a temp folder and checks them with the standard zipfile reader
+"""
+
+import os
+import tempfile
+import time
+import zipfile
+import zlib
+from pathlib import Path
+
+from backup_archive import (
+    ZIP_DEFLATED, ZIP_STORED, ZipArchiveWriter, choose_method, file_digest,
+    iter_source_tree, write_tree,
+)
+from backup_manifest import (
+    DELETED_LIST_NAME, ArchiveManifest, BackupPlan, FileManifest, backup_metadata, manifest_sidecar,
+)
+from backup_verify import restore_file, verify_archive
+from dedup_repo import DedupRepository
+from parallel_deflate import BLOCK_SIZE, crc32_combine, write_tree_parallel
+
+def make_source_tree(root: Path):
+    """Create a small mixed tree resembling the BigSkyAg folders"""
+    (root / "00_Admin" / "Backups").mkdir(parents=True)
+    (root / "02_Field_Projects" / "Source_Data").mkdir(parents=True)
+    (root / "empty").mkdir()
+    (root / "00_Admin" / "Farmer_Outreach_Tracker.csv").write_text("farm,crop,acres\n" * 5000)
+    (root / "00_Admin" / "Backups" / "old_backup.zip").write_bytes(b"PK\x03\x04old")
+    (root / "02_Field_Projects" / "Source_Data" / "ndvi.tif").write_bytes(os.urandom(200_000))
+    (root / "02_Field_Projects" / "Source_Data" / "parcels.prj").write_text('GEOGCS["NAD83"]')
+    (root / "02_Field_Projects" / "Source_Data" / ".DS_Store").write_bytes(b"\x00" * 10)
+
+def test_compression_policy():
+    """Test STORED/DEFLATED selection"""
+    print("🧪 Testing compression policy")
+    assert choose_method("photo.png", b"\x89PNG\r\n\x1a\n" + b"\x00" * 100) == ZIP_STORED
+    assert choose_method("renamed.dat", b"PK\x03\x04" + b"\x00" * 100) == ZIP_STORED
+    assert choose_method("tracker.csv", b"a,b,c\n" * 1000) == ZIP_DEFLATED
+    assert choose_method("noise.bin", os.urandom(4096)) == ZIP_STORED
+    print("✅ Compression policy test passed")
+
+def test_write_tree():
+    """Test that a written tree is a valid archive honoring exclusions"""
+    print("🧪 Testing archive writer")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        archive = Path(tmp) / "backup.zip"
+
+        with open(archive, "wb") as f:
+            writer = ZipArchiveWriter(f)
+            stats = write_tree(writer, source, ["*.DS_Store", "00_Admin/Backups/*"])
+            writer.close()
+
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.testzip() is None
+            names = zf.namelist()
+            assert "00_Admin/Farmer_Outreach_Tracker.csv" in names
+            assert "empty/" in names
+            assert not any(name.startswith("00_Admin/Backups/") for name in names)
+            assert not any(name.endswith(".DS_Store") for name in names)
+            assert zf.getinfo("02_Field_Projects/Source_Data/ndvi.tif").compress_type == ZIP_STORED
+            assert zf.getinfo("00_Admin/Farmer_Outreach_Tracker.csv").compress_type == ZIP_DEFLATED
+            assert zf.read("00_Admin/Farmer_Outreach_Tracker.csv") == (source / "00_Admin" / "Farmer_Outreach_Tracker.csv").read_bytes()
+
+        print("\n".join(stats.report_lines()))
+        assert stats.by_type[".csv"]["bytes_out"] < stats.by_type[".csv"]["bytes_in"]
+    print("✅ Archive writer test passed")
+
+def test_zip64_records():
+    """Test zip64 local headers and the zip64 end record (>65535 entries)"""
+    print("🧪 Testing ZIP64 records")
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = Path(tmp) / "many.zip"
+        with open(archive, "wb") as f:
+            writer = ZipArchiveWriter(f)
+            writer.add_stream("unknown_size.txt", [b"abc" * 1000], size_hint=None)
+            for i in range(0x10000):
+                writer.add_stream(f"f/{i}", [b"x"], ZIP_STORED, 0, size_hint=1)
+            writer.close()
+
+        with zipfile.ZipFile(archive) as zf:
+            assert len(zf.infolist()) == 0x10001
+            assert zf.read("unknown_size.txt") == b"abc" * 1000
+            assert zf.read("f/65535") == b"x"
+    print("✅ ZIP64 records test passed")
+
+def test_growing_file():
+    """Test that a file growing while it is read is archived at its stat'ed size"""
+    print("🧪 Testing a file that grows while being archived")
+    with tempfile.TemporaryDirectory() as tmp:
+        log = Path(tmp) / "telemetry.log"
+        log.write_bytes(os.urandom(300_000))
+        st = log.stat()
+        with open(log, "ab") as f:
+            f.write(os.urandom(100_000))
+        archive = Path(tmp) / "growing.zip"
+        with open(archive, "wb") as f:
+            writer = ZipArchiveWriter(f)
+            entry = writer.add_file(log, "telemetry.log", st)
+            writer.close()
+
+        assert entry.file_size == st.st_size and not entry.zip64_local
+        assert writer.stats.changed == ["telemetry.log"]
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.read("telemetry.log") == log.read_bytes()[:st.st_size]
+    print("✅ Growing file test passed")
+
+def test_parallel_matches_serial():
+    """Test that the multi-process writer produces the same entries as the serial one"""
+    print("🧪 Testing parallel compression")
+    first, second = os.urandom(100), os.urandom(BLOCK_SIZE + 3)
+    assert crc32_combine(zlib.crc32(first), zlib.crc32(second), len(second)) == zlib.crc32(first + second)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        # Large enough to be split into several independently deflated blocks
+        rows = b"".join(b"%d,almonds,kern,%d\n" % (i, i % 97) for i in range(BLOCK_SIZE // 8))
+        (source / "02_Field_Projects" / "yield_history.csv").write_bytes(rows)
+
+        archives = {}
+        for workers in (1, 2):
+            archive = Path(tmp) / f"backup_{workers}.zip"
+            with open(archive, "wb") as f:
+                writer = ZipArchiveWriter(f)
+                if workers == 1:
+                    write_tree(writer, source, ["*.DS_Store"])
+                else:
+                    write_tree_parallel(writer, source, ["*.DS_Store"], workers=workers)
+                writer.close()
+            archives[workers] = archive
+
+        with zipfile.ZipFile(archives[1]) as serial, zipfile.ZipFile(archives[2]) as parallel:
+            assert parallel.testzip() is None
+            assert serial.namelist() == parallel.namelist()
+            for info in serial.infolist():
+                assert parallel.getinfo(info.filename).CRC == info.CRC
+                assert parallel.read(info.filename) == serial.read(info.filename)
+            assert parallel.getinfo("02_Field_Projects/yield_history.csv").compress_type == ZIP_DEFLATED
+    print("✅ Parallel compression test passed")
+
+def test_incremental_manifest():
+    """Test that an incremental plan archives only changes and records deletions"""
+    print("🧪 Testing incremental backup manifest")
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        rows = b"".join(b"%d,wheat,%d\n" % (i, i % 13) for i in range(BLOCK_SIZE // 6))
+        (source / "02_Field_Projects" / "yield_history.csv").write_bytes(rows)
+        excludes = ["*.DS_Store"]
+
+        def backup(plan, name, workers):
+            with open(Path(tmp) / name, "wb") as f:
+                writer = ZipArchiveWriter(f)
+                items = plan.items
+                if workers == 1:
+                    write_tree(writer, source, excludes, items)
+                else:
+                    write_tree_parallel(writer, source, excludes, workers=workers, items=items)
+                writer.close()
+            return writer.digests
+
+        items = list(iter_source_tree(source, excludes))
+        plan = BackupPlan.full(items)
+        digests = backup(plan, "full.zip", 2)
+        # Digests from the process pool match a plain read of the file
+        for arcname, path, _ in items:
+            if not arcname.endswith("/"):
+                assert digests[arcname] == file_digest(path)
+        manifest = FileManifest.after_backup(plan, digests, "weekly", "full.zip", "full.zip")
+        manifest.save(Path(tmp) / "state" / "manifest.json.gz")
+        manifest = FileManifest.load(Path(tmp) / "state" / "manifest.json.gz")
+
+        # Nothing changed: nothing to archive
+        plan = manifest.plan_incremental(iter_source_tree(source, excludes))
+        assert plan.items == [] and plan.deleted == []
+
+        # Add, modify, delete, and touch a file without changing its content
+        tracker = source / "00_Admin" / "Farmer_Outreach_Tracker.csv"
+        tracker.write_text(tracker.read_text() + "new,farm,40\n")
+        (source / "00_Admin" / "new_contacts.csv").write_text("name\nJo\n")
+        (source / "02_Field_Projects" / "Source_Data" / "parcels.prj").unlink()
+        later = time.time() + 10
+        os.utime(source / "02_Field_Projects" / "Source_Data" / "ndvi.tif", (later, later))
+
+        plan = manifest.plan_incremental(iter_source_tree(source, excludes))
+        assert [a for a, _, _ in plan.items] == ["00_Admin/Farmer_Outreach_Tracker.csv", "00_Admin/new_contacts.csv"]
+        assert plan.deleted == ["02_Field_Projects/Source_Data/parcels.prj"]
+        assert plan.rehashed == 1
+        assert "02_Field_Projects/yield_history.csv" in plan.carried
+
+        digests = backup(plan, "daily.zip", 1)
+        metadata = backup_metadata(plan, "daily", "incremental", manifest)
+        assert dict(metadata)[DELETED_LIST_NAME] == b"02_Field_Projects/Source_Data/parcels.prj\n"
+        updated = FileManifest.after_backup(plan, digests, "daily", "daily.zip", manifest.full_archive)
+        assert updated.full_archive == "full.zip"
+        assert "02_Field_Projects/Source_Data/parcels.prj" not in updated.entries
+        assert updated.entries["00_Admin/new_contacts.csv"].digest == file_digest(source / "00_Admin" / "new_contacts.csv")
+
+        with zipfile.ZipFile(Path(tmp) / "daily.zip") as zf:
+            assert len(zf.namelist()) == 2
+    print("✅ Incremental backup manifest test passed")
+
+def test_dedup_repository():
+    """Test that a second snapshot stores only new chunks and restores byte for byte"""
+    print("🧪 Testing dedup repository")
+    from storage_providers.local import LocalStorageProvider
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        big = source / "02_Field_Projects" / "Source_Data" / "field_scan.raw"
+        big.write_bytes(os.urandom(3 * 1024 * 1024))
+
+        repo = DedupRepository.open(Path(tmp) / "repo")
+        first = repo.create_snapshot(source, ["*.DS_Store"])
+        first_chunks = repo.stats["chunks_new"]
+        assert first_chunks > 3
+
+        # Insert bytes near the start of the large file: content-defined cut points realign
+        data = big.read_bytes()
+        big.write_bytes(data[:1000] + b"inserted" + data[1000:])
+        repo = DedupRepository.open(Path(tmp) / "repo")
+        second = repo.create_snapshot(source, ["*.DS_Store"], workers=2)
+        assert repo.stats["chunks_new"] <= 2, repo.stats
+        assert repo.stats["chunks_reused"] >= first_chunks - 2
+
+        restored = Path(tmp) / "restored"
+        repo.restore(second, restored)
+        assert (restored / "02_Field_Projects" / "Source_Data" / "field_scan.raw").read_bytes() == big.read_bytes()
+        assert (restored / "empty").is_dir()
+        repo.restore(first, Path(tmp) / "old", ["02_Field_Projects/Source_Data/field_scan.raw"])
+        assert (Path(tmp) / "old" / "02_Field_Projects" / "Source_Data" / "field_scan.raw").read_bytes() == data
+
+        provider = LocalStorageProvider({"provider": "local", "storage_path": str(Path(tmp) / "remote")})
+        uploaded = repo.sync(provider, "BigSkyAg_Backup/dedup")
+        assert uploaded > 3
+        assert repo.sync(provider, "BigSkyAg_Backup/dedup") == 0
+    print("✅ Dedup repository test passed")
+
+def test_chunker_fast_path():
+    """Test that numpy chunking finds exactly the pure-Python cut points"""
+    print("🧪 Testing vectorized chunking")
+    import dedup_repo
+    if dedup_repo.numpy is None:
+        print("⏭ numpy not installed; only the pure-Python chunker is in use")
+        return
+    gear = dedup_repo.gear_table("test")
+    masks = dedup_repo.chunk_masks(4096)
+    data = os.urandom(600_000) + b"\0" * 50_000  # A run of zeros forces cuts at the maximum
+
+    def cuts():
+        found, pos = [], 0
+        while pos < len(data):
+            pos = dedup_repo.find_cut(data, pos, len(data), gear, *masks, 1024, 4096, 16384)
+            found.append(pos)
+        return found
+
+    fast = cuts()
+    numpy = dedup_repo.numpy
+    dedup_repo.numpy = None
+    try:
+        slow = cuts()
+    finally:
+        dedup_repo.numpy = numpy
+    assert fast == slow and len(fast) > 50
+    print("✅ Vectorized chunking test passed")
+
+def test_archive_manifest():
+    """Test parallel digest verification and seek-based single-file restore"""
+    print("🧪 Testing archive manifest")
+    from create_backup_zip import create_zip
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        archive = Path(tmp) / "backup.zip"
+        assert create_zip(source, archive, ["*.DS_Store"], workers=2)
+
+        manifest = ArchiveManifest.load(archive)
+        tracker = manifest.get("00_Admin/Farmer_Outreach_Tracker.csv")
+        assert tracker.size == (source / "00_Admin" / "Farmer_Outreach_Tracker.csv").stat().st_size
+        assert verify_archive(archive, workers=2) == []
+
+        with open(archive, "rb") as f:
+            restore_file(f, tracker, Path(tmp) / "restored" / "tracker.csv")
+        assert (Path(tmp) / "restored" / "tracker.csv").read_text() == (source / "00_Admin" / "Farmer_Outreach_Tracker.csv").read_text()
+
+        # Without the sidecar the copy stored inside the archive is used
+        manifest_sidecar(archive).unlink()
+        assert len(ArchiveManifest.load(archive)) == len(manifest)
+
+        # Flip one byte of stored data: only that file fails
+        ndvi = manifest.get("02_Field_Projects/Source_Data/ndvi.tif")
+        with open(archive, "r+b") as f:
+            f.seek(ndvi.data_offset + 1000)
+            byte = f.read(1)
+            f.seek(ndvi.data_offset + 1000)
+            f.write(bytes([byte[0] ^ 0xFF]))
+        failures = verify_archive(archive, manifest, workers=1)
+        assert [name for name, _ in failures] == ["02_Field_Projects/Source_Data/ndvi.tif"]
+    print("✅ Archive manifest test passed")
+
+def test_ranged_restore():
+    """Test that restoring one file from stored backup fetches only a small part of it"""
+    print("🧪 Testing ranged-read restore")
+    from create_backup_zip import create_zip
+    from restore_backup import RangeReader, list_remote_backups, restore_members
+    from storage_providers.local import LocalStorageProvider
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        (source / "02_Field_Projects" / "Source_Data" / "field_scan.raw").write_bytes(os.urandom(8 * 1024 * 1024))
+        archive = Path(tmp) / "BigSkyAg_Backup_daily_2026-01-05_0200.zip"
+        assert create_zip(source, archive, ["*.DS_Store"], workers=1)
+
+        provider = LocalStorageProvider({"provider": "local", "backup_prefix": "BigSkyAg_Backup",
+                                         "storage_path": str(Path(tmp) / "remote")})
+        provider.upload_backup(archive, "daily")
+        backup = list_remote_backups(provider, ["daily", "weekly"])[-1]
+        assert backup["name"] == archive.name
+
+        reader = RangeReader(provider, backup["id"])
+        restored = restore_members(reader, ["00_Admin/*.csv"], Path(tmp) / "restored")
+        assert restored == ["00_Admin/Farmer_Outreach_Tracker.csv"]
+        assert (Path(tmp) / "restored" / "00_Admin" / "Farmer_Outreach_Tracker.csv").read_bytes() == \
+            (source / "00_Admin" / "Farmer_Outreach_Tracker.csv").read_bytes()
+        print(f"   📥 {reader.bytes_fetched} of {reader.size} bytes in {reader.requests} requests")
+        assert reader.bytes_fetched < reader.size // 4
+    print("✅ Ranged-read restore test passed")
+
+def test_chain_restore():
+    """Test that restoring from an incremental finds unchanged files in the full and skips deleted ones"""
+    print("🧪 Testing restore through an incremental chain")
+    from create_backup_zip import create_zip
+    from restore_backup import group_backups, list_remote_backups, restore_chain
+    from storage_providers.local import LocalStorageProvider
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        tracker = source / "00_Admin" / "Farmer_Outreach_Tracker.csv"
+        excludes = ["*.DS_Store"]
+        provider = LocalStorageProvider({"provider": "local", "backup_prefix": "BigSkyAg_Backup",
+                                         "storage_path": str(Path(tmp) / "remote")})
+
+        full_name = "BigSkyAg_Backup_weekly_2026-01-04_0200.zip"
+        plan = BackupPlan.full(list(iter_source_tree(source, excludes)))
+        writer = create_zip(source, Path(tmp) / full_name, excludes, 1, plan.items,
+                            backup_metadata(plan, "weekly", "full", None))
+        manifest = FileManifest.after_backup(plan, writer.digests, "weekly", full_name, full_name)
+        provider.upload_backup(Path(tmp) / full_name, "weekly")
+
+        original = tracker.read_bytes()
+        (source / "empty" / "scouting.txt").write_text("hail damage on the north quarter\n")
+        (source / "02_Field_Projects" / "Source_Data" / "ndvi.tif").unlink()
+        daily_name = "BigSkyAg_Backup_daily_2026-01-05_0200.zip"
+        plan = manifest.plan_incremental(iter_source_tree(source, excludes))
+        create_zip(source, Path(tmp) / daily_name, excludes, 1, plan.items,
+                   backup_metadata(plan, "daily", "incremental", manifest))
+        provider.upload_backup(Path(tmp) / daily_name, "daily")
+
+        backups = group_backups(list_remote_backups(provider, ["daily", "weekly"]))
+        assert list(backups) == [full_name, daily_name]
+        target = Path(tmp) / "restored"
+        restored, _fetched, _requests = restore_chain(provider, backups, daily_name,
+                                                      ["00_Admin/*.csv", "empty/", "02_Field_Projects/"], target)
+        assert "00_Admin/Farmer_Outreach_Tracker.csv" in restored  # Unchanged: only in the full
+        assert "empty/scouting.txt" in restored
+        assert "02_Field_Projects/Source_Data/parcels.prj" in restored
+        assert "02_Field_Projects/Source_Data/ndvi.tif" not in restored
+        assert not (target / "02_Field_Projects" / "Source_Data" / "ndvi.tif").exists()
+        assert len(restored) == len(set(restored))
+        assert (target / "00_Admin" / "Farmer_Outreach_Tracker.csv").read_bytes() == original
+    print("✅ Chain restore test passed")
+
+def test_resume_after_interruption():
+    """Test that an interrupted backup resumes from its checkpoint and redoes changed files"""
+    print("🧪 Testing checkpointed resume")
+    import backup_checkpoint
+    from create_backup_zip import create_zip
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        archive = Path(tmp) / "backup.zip"
+        original_add_file = ZipArchiveWriter.add_file
+        calls = []
+
+        def failing_add_file(self, path, arcname, st=None, method=None):
+            calls.append(arcname)
+            if len(calls) == 3:
+                raise RuntimeError("SSD disconnected")
+            return original_add_file(self, path, arcname, st, method)
+
+        backup_checkpoint.CHECKPOINT_INTERVAL = 0
+        ZipArchiveWriter.add_file = failing_add_file
+        try:
+            assert create_zip(source, archive, ["*.DS_Store"], workers=1) is None
+        finally:
+            ZipArchiveWriter.add_file = original_add_file
+            backup_checkpoint.CHECKPOINT_INTERVAL = 60
+        assert backup_checkpoint.partial_path(archive).exists()
+        assert backup_checkpoint.checkpoint_path(archive).exists()
+
+        # One of the already archived files changes before the retry
+        tracker = source / "00_Admin" / "Farmer_Outreach_Tracker.csv"
+        assert "00_Admin/Farmer_Outreach_Tracker.csv" in calls[:2]
+        tracker.write_text("farm,crop,acres\nedited,hay,12\n")
+
+        assert create_zip(source, archive, ["*.DS_Store"], workers=1)
+        assert not backup_checkpoint.checkpoint_path(archive).exists()
+        with zipfile.ZipFile(archive) as zf:
+            assert zf.testzip() is None
+            assert len(zf.namelist()) == len(set(zf.namelist()))
+            assert zf.read("00_Admin/Farmer_Outreach_Tracker.csv") == tracker.read_bytes()
+            assert zf.read("02_Field_Projects/Source_Data/ndvi.tif") == (source / "02_Field_Projects" / "Source_Data" / "ndvi.tif").read_bytes()
+        assert verify_archive(archive, workers=1) == []
+    print("✅ Checkpointed resume test passed")
+
+def test_streamed_upload():
+    """Test that a streamed backup lands in storage intact and producer errors reach the upload"""
+    print("🧪 Testing streamed backup upload")
+    from backup_stream import BoundedPipe, stream_through_pipe
+    from create_backup_zip import stream_zip
+    from storage_providers.local import LocalStorageProvider
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        provider = LocalStorageProvider({"provider": "local", "backup_prefix": "BigSkyAg_Backup",
+                                         "storage_path": str(Path(tmp) / "remote")})
+        name = "BigSkyAg_Backup_daily_2026-01-05_0200.zip"
+        writer, file_id = stream_zip(source, name, provider, "daily", ["*.DS_Store"], workers=1)
+        remote = Path(tmp) / "remote" / file_id
+        assert remote.stat().st_size == writer.offset
+        assert not list(Path(tmp).glob("*.zip*"))  # Nothing staged locally
+        with zipfile.ZipFile(remote) as zf:
+            assert zf.testzip() is None
+        tracker = "00_Admin/Farmer_Outreach_Tracker.csv"
+        assert ArchiveManifest.load(remote).get(tracker).digest == writer.digests[tracker]
+
+        def failing_producer(pipe):
+            pipe.write(b"x" * 3 * 1024 * 1024)
+            raise RuntimeError("SSD disconnected")
+
+        try:
+            stream_through_pipe(failing_producer, lambda pipe: provider.upload_stream(pipe, "broken.zip", "daily"),
+                                BoundedPipe(depth=2))
+            assert False, "producer error was swallowed"
+        except RuntimeError:
+            pass
+        assert not (Path(tmp) / "remote" / "daily" / "broken.zip").exists()
+        assert not list((Path(tmp) / "remote" / "daily").glob(".*.partial"))
+    print("✅ Streamed backup upload test passed")
+
+def test_split_volumes():
+    """Test that volumes are standalone, restore in any order and upload with per-volume retry"""
+    print("🧪 Testing split-volume backups")
+    from backup_volumes import restore_volumes, upload_volume_set
+    from create_backup_zip import create_volumes
+    from storage_providers.local import LocalStorageProvider
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        for i in range(4):
+            (source / "02_Field_Projects" / f"flight_{i}.raw").write_bytes(os.urandom(100_000))
+        dest = Path(tmp) / "backups" / "BigSkyAg_Backup_daily_2026-01-05_0200.zip"
+        dest.parent.mkdir()
+        volumes = create_volumes(source, dest, 150_000, ["*.DS_Store"], workers=1,
+                                 extra_entries=[(DELETED_LIST_NAME, b"gone.txt\n")])
+        paths = [dest.with_name(volume["name"]) for volume in volumes.volumes]
+        assert len(paths) >= 3 and not dest.exists()
+        for path in paths:
+            with zipfile.ZipFile(path) as zf:
+                assert zf.testzip() is None
+            assert verify_archive(path, workers=1) == []
+
+        restored, missing = restore_volumes(list(reversed(paths)), Path(tmp) / "restored")
+        assert missing == []
+        assert sorted(restored) == sorted(name for name in volumes.writer.digests if not name.startswith(".bigsky/"))
+        flight = "02_Field_Projects/flight_2.raw"
+        assert (Path(tmp) / "restored" / flight).read_bytes() == (source / flight).read_bytes()
+        assert restore_volumes([paths[0], paths[-1]], Path(tmp) / "partial")[1] == list(range(2, len(paths)))
+
+        class FlakyProvider(LocalStorageProvider):
+            def __init__(self, config):
+                super().__init__(config)
+                self.attempts = []
+
+            def upload_backup(self, backup_path, backup_type="daily"):
+                self.attempts.append(backup_path.name)
+                if backup_path.name == paths[1].name and self.attempts.count(backup_path.name) == 1:
+                    raise IOError("Starlink dropped")
+                return super().upload_backup(backup_path, backup_type)
+
+        provider = FlakyProvider({"provider": "local", "backup_prefix": "BigSkyAg_Backup",
+                                  "storage_path": str(Path(tmp) / "remote")})
+        index = dest.with_name(dest.stem + ".volumes.json")
+        assert upload_volume_set(provider, index, "daily", workers=3, retry_delay=0) == []
+        assert provider.attempts.count(paths[1].name) == 2 and provider.attempts.count(paths[0].name) == 1
+        provider.attempts.clear()
+        assert upload_volume_set(provider, index, "daily", workers=3, retry_delay=0) == []
+        assert provider.attempts == [index.name]  # Volumes already stored are skipped
+    print("✅ Split-volume backup test passed")
+
+
+def test_oversized_volume_entry():
+    """Test that a file larger than the volume size starts a volume of its own"""
+    print("🧪 Testing an oversized file in a split-volume backup")
+    from backup_volumes import restore_volumes
+    from create_backup_zip import create_volumes
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        (source / "02_Field_Projects").mkdir(parents=True)
+        (source / "02_Field_Projects" / "a_notes.raw").write_bytes(os.urandom(50_000))
+        (source / "02_Field_Projects" / "b_orthomosaic.raw").write_bytes(os.urandom(1_000_000))
+        dest = Path(tmp) / "BigSkyAg_Backup_daily_2026-01-05_0200.zip"
+        volumes = create_volumes(source, dest, 150_000, [], workers=1,
+                                 extra_entries=[(DELETED_LIST_NAME, b"gone.txt\n")])
+        paths = [dest.with_name(volume["name"]) for volume in volumes.volumes]
+        contents = []
+        for path in paths:
+            with zipfile.ZipFile(path) as zf:
+                contents.append([name for name in zf.namelist()
+                                 if not name.startswith(".bigsky/") and not name.endswith("/")])
+        assert contents == [["02_Field_Projects/a_notes.raw"], ["02_Field_Projects/b_orthomosaic.raw"]]
+        with zipfile.ZipFile(paths[-1]) as zf:
+            assert DELETED_LIST_NAME in zf.namelist()
+
+        restored, missing = restore_volumes(paths, Path(tmp) / "restored")
+        assert missing == [] and len(restored) == 2
+    print("✅ Oversized volume entry test passed")
+
+def test_solid_packing():
+    """Test that small files pack into solid blocks that restore individually and shrink the backup"""
+    print("🧪 Testing solid small-file packing")
+    from backup_volumes import restore_volumes
+    from create_backup_zip import create_volumes, create_zip
+    from restore_backup import RangeReader, restore_members
+    import solid_pack
+    from solid_pack import SolidReader
+    from storage_providers.local import LocalStorageProvider
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        parcels = source / "03_Mapping_QGIS" / "parcels"
+        parcels.mkdir(parents=True)
+        for i in range(400):
+            (parcels / f"field_{i}.prj").write_text(f'PROJCS["NAD83 / Montana",GEOGCS["NAD83"],UNIT["metre",{i}]]')
+            (parcels / f"field_{i}.cpg").write_text("UTF-8")
+            (parcels / f"._field_{i}.shp").write_bytes(b"\x00\x05\x16\x07\x00\x02\x00\x00Mac OS X        " + bytes([i % 256]) * 40)
+
+        plain, solid = Path(tmp) / "plain.zip", Path(tmp) / "solid.zip"
+        excludes = ["*.DS_Store", "*.tif"]  # Leave out the incompressible image
+        assert create_zip(source, plain, excludes, workers=1, solid_limit=0)
+        writer = create_zip(source, solid, excludes, workers=1, solid_limit=64 * 1024)
+        print(f"   📦 {plain.stat().st_size} bytes per-entry, {solid.stat().st_size} bytes solid")
+        assert solid.stat().st_size < plain.stat().st_size // 2
+        assert verify_archive(solid, workers=1) == []
+
+        name = "03_Mapping_QGIS/parcels/field_7.prj"
+        assert writer.digests[name] == file_digest(parcels / "field_7.prj")
+        with zipfile.ZipFile(solid) as zf:
+            assert zf.testzip() is None
+            assert name not in zf.namelist()
+            reader = SolidReader(zf)
+            assert len(reader) == 1200 + 2 and reader.read(name) == (parcels / "field_7.prj").read_bytes()
+
+        provider = LocalStorageProvider({"provider": "local", "backup_prefix": "BigSkyAg_Backup",
+                                         "storage_path": str(Path(tmp) / "remote")})
+        provider.upload_backup(solid, "daily")
+        ranged = RangeReader(provider, "BigSkyAg_Backup/daily/solid.zip")
+        restored = restore_members(ranged, ["03_Mapping_QGIS/parcels/field_1?.prj"], Path(tmp) / "restored")
+        assert len(restored) == 10
+        assert (Path(tmp) / "restored" / name.replace("_7", "_17")).read_text().endswith("17]]")
+
+        # Restoring an ordinary entry reads the solid index at most, never a block
+        with zipfile.ZipFile(solid) as zf:
+            blocks = [(info.header_offset, info.header_offset + 30 + len(info.filename) + info.compress_size)
+                      for info in zf.infolist() if info.filename.endswith(".blk")]
+        fetched = []
+        read_range = provider.read_range
+        provider.read_range = lambda file_id, offset, length: fetched.append((offset, offset + length)) \
+            or read_range(file_id, offset, length)
+        ranged = RangeReader(provider, "BigSkyAg_Backup/daily/solid.zip", readahead=512)
+        assert restore_members(ranged, ["00_Admin/*.csv"], Path(tmp) / "plain_restore") == \
+            ["00_Admin/Farmer_Outreach_Tracker.csv"]
+        assert not any(start < end_block and start_block < end for start, end in fetched for start_block, end_block in blocks)
+
+        # Every volume carries the dictionary its blocks need
+        dest = Path(tmp) / "vol" / "set.zip"
+        dest.parent.mkdir()
+        solid_pack.SOLID_BLOCK_SIZE = 4096
+        try:
+            volumes = create_volumes(source, dest, 8 * 1024, excludes, workers=1, solid_limit=64 * 1024)
+        finally:
+            solid_pack.SOLID_BLOCK_SIZE = 512 * 1024
+        paths = [dest.with_name(volume["name"]) for volume in volumes.volumes]
+        later = [path for path in paths[1:] if any(n.endswith(".blk") for n in zipfile.ZipFile(path).namelist())]
+        assert later
+        restored, _missing = restore_volumes([later[-1]], Path(tmp) / "one")
+        assert any(name.startswith("03_Mapping_QGIS/parcels/") for name in restored)
+
+        # A small file that grew since it was listed is left to the normal writer
+        grown = parcels / "field_3.prj"
+        items = [(f"03_Mapping_QGIS/parcels/{path.name}", path, path.stat()) for path in sorted(parcels.glob("field_*"))]
+        grown.write_text(grown.read_text() + "\n")
+        with open(Path(tmp) / "grown.zip", "wb") as f:
+            remaining, packer = solid_pack.pack_small_files(ZipArchiveWriter(f), items, 64 * 1024)
+        assert [item[0] for item in remaining] == ["03_Mapping_QGIS/parcels/field_3.prj"]
+        assert packer.files == len(items) - 1
+    print("✅ Solid packing test passed")
+
+def test_page_cache_reads():
+    """Drop-mode and O_DIRECT reads return the same bytes and leave less of the file cached"""
+    print("🧪 Testing page-cache-friendly reads")
+    import page_cache
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "ortho.tif"
+        data = os.urandom(3 * 1024 * 1024 + 12345)
+        with open(path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+        def read_all(size=None):
+            with page_cache.open_source(path, size) as f:
+                head = f.read(100)
+                f.seek(len(data) - 5000)
+                tail = f.read()
+                f.seek(100)
+                return head + f.read(len(data) - 5100) + tail
+
+        def evict():
+            if page_cache.HAS_FADVISE:
+                fd = os.open(path, os.O_RDONLY)
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+                os.close(fd)
+
+        try:
+            results = {}
+            for mode, direct_min in (("keep", 0), ("drop", 0), ("drop", 1)):
+                evict()
+                page_cache.configure(mode, direct_min)
+                assert read_all() == data, (mode, direct_min)
+                results[(mode, direct_min)] = page_cache.resident_bytes(path)
+        finally:
+            page_cache.configure()
+
+        # Residency is only meaningful where the cache can be dropped (not tmpfs)
+        evict()
+        cold = page_cache.resident_bytes(path)
+        if cold is not None and cold[0] < len(data) // 2:
+            assert results[("keep", 0)][0] > len(data) // 2
+            assert results[("drop", 0)][0] < len(data) // 4
+            assert results[("drop", 1)][0] < len(data) // 4
+    print("✅ Page cache read test passed")
+
+def test_backup_estimate():
+    """Test that the estimator learns ratios and throughput from a run and predicts the next one"""
+    print("🧪 Testing backup size and duration estimates")
+    import backup_estimate
+    from backup_estimate import EstimateHistory, check_estimate, estimate_backup, history_path
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        excludes = ["*.DS_Store", "00_Admin/Backups/*"]
+        items = list(iter_source_tree(source, excludes))
+        files = {arcname: st.st_size for arcname, _path, st in items if not arcname.endswith("/")}
+
+        history_file = history_path(Path(tmp) / "state", "BigSkyAg_Backup")
+        history = EstimateHistory.load(history_file)
+        first = estimate_backup(files.items(), history, "local")
+        assert not first.from_history and first.bytes_in == sum(files.values())
+
+        with open(os.devnull, "wb") as out:
+            writer = ZipArchiveWriter(out)
+            stats = write_tree(writer, source, items=items)
+            writer.close()
+        history.record(stats, 2.0, "local", "weekly", "full")
+        history.save(history_file)
+
+        backup_estimate.RATE_MIN_BYTES = 0  # The test tree is far below the size that counts
+        try:
+            estimate = estimate_backup(files.items(), EstimateHistory.load(history_file), "local")
+        finally:
+            backup_estimate.RATE_MIN_BYTES = 64 * 1024 * 1024
+        assert estimate.from_history
+        assert abs(estimate.bytes_out - stats.bytes_out) <= 16
+        assert abs(estimate.seconds - 2.0) < 0.01
+        assert EstimateHistory().ratio(".jpg") == 1.0
+        assert check_estimate(estimate, Path(tmp), 0) == []
+        assert len(check_estimate(estimate, Path(tmp), 1 / 120)) == 1  # Half-second window
+    print("✅ Backup estimate test passed")
+
+def test_exclusion_rules():
+    """Test that excluded subtrees are pruned without being scanned and match rsync filters"""
+    print("🧪 Testing compiled exclusion rules")
+    import exclusions
+    from exclusions import compile_exclusions
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        (source / "00_Admin" / "Backups" / "deep").mkdir()
+        (source / "00_Admin" / "Backups" / "deep" / "old.zip").write_bytes(b"PK")
+        (source / "02_Field_Projects" / "__MACOSX").mkdir()
+        (source / "02_Field_Projects" / "__MACOSX" / "._ndvi.tif").write_bytes(b"\x00")
+
+        patterns = ["*.DS_Store", "__MACOSX/*", "*/__MACOSX/*", "00_Admin/Backups/*"]
+        rules = compile_exclusions(patterns)
+        assert rules is compile_exclusions(list(patterns))
+        assert rules.excludes("a/b/.DS_Store") and not rules.excludes("a/b/DS_Store.txt")
+        assert rules.prunes("00_Admin/Backups/") and not rules.prunes("00_Admin/")
+        assert not rules.prunes("x/.DS_Store/")
+
+        scanned = []
+        scandir = os.scandir
+        exclusions.os.scandir = lambda path: scanned.append(Path(path).name) or scandir(path)
+        try:
+            names = [arcname for arcname, _path, _st in iter_source_tree(source, rules)]
+        finally:
+            exclusions.os.scandir = scandir
+        assert "Backups" not in scanned and "deep" not in scanned and "__MACOSX" not in scanned
+        assert names == [n for n in names if "Backups" not in n and "MACOSX" not in n and "DS_Store" not in n]
+        assert "00_Admin/Farmer_Outreach_Tracker.csv" in names and "empty/" in names
+        assert rules.rsync_filters() == ["/**.DS_Store", "/__MACOSX/", "/**/__MACOSX/", "/00_Admin/Backups/"]
+    print("✅ Exclusion rules test passed")
+
+def test_synthetic_full():
+    """A full merged from a full and an incremental matches the tree without recompressing anything"""
+    print("🧪 Testing synthetic full backups")
+    from create_backup_zip import create_zip
+    import solid_pack
+    from solid_pack import SolidReader
+    from synthetic_full import synthesize_full
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        notes = source / "02_Field_Projects" / "notes"
+        notes.mkdir()
+        for i in range(60):
+            (notes / f"field_{i}.txt").write_text(f"Field {i}: winter wheat, no-till\n" * 20)
+        folder = Path(tmp) / "Backups"
+        (folder / "Archive").mkdir(parents=True)
+        excludes = ["*.DS_Store"]
+
+        solid_pack.SOLID_BLOCK_SIZE = 4096
+        try:
+            items = list(iter_source_tree(source, excludes))
+            plan = BackupPlan.full(items)
+            writer = create_zip(source, folder / "Archive" / "full.zip", excludes, 1, plan.items,
+                                backup_metadata(plan, "weekly", "full", None), solid_limit=1024)
+            manifest = FileManifest.after_backup(plan, writer.digests, "weekly", "full.zip", "full.zip")
+
+            (notes / "field_3.txt").write_text("Field 3: replanted to barley\n")
+            (notes / "field_4.txt").unlink()
+            (source / "00_Admin" / "Farmer_Outreach_Tracker.csv").write_text("farm,crop,acres\n" * 6000)
+            (source / "empty" / "scouting.txt").write_text("hail damage on the north quarter\n")
+            plan = manifest.plan_incremental(iter_source_tree(source, excludes))
+            create_zip(source, folder / "daily.zip", excludes, 1, plan.items,
+                       backup_metadata(plan, "daily", "incremental", manifest), solid_limit=1024)
+
+            dest = folder / "synthetic.zip"
+            paths, writer, sources = synthesize_full([folder, folder / "Archive"], "daily.zip", dest, "weekly")
+        finally:
+            solid_pack.SOLID_BLOCK_SIZE = 512 * 1024
+        assert paths == [dest] and sources == ["full.zip", "daily.zip"]
+        assert verify_archive(dest, workers=1) == []
+
+        expected = {arcname for arcname, _path, _st in iter_source_tree(source, excludes)}
+        with zipfile.ZipFile(dest) as zf:
+            solid = SolidReader(zf)
+            names = {name for name in zf.namelist() if not name.startswith(".bigsky/")} | set(solid.names())
+            assert names == expected
+            for arcname in expected:
+                if not arcname.endswith("/"):
+                    data = solid.read(arcname) if arcname in solid else zf.read(arcname)
+                    assert data == (source / arcname).read_bytes(), arcname
+            assert b'"synthetic": true' in zf.read(".bigsky/backup.json")
+
+        # Entries are copied raw from the archive that held their newest version
+        merged = ArchiveManifest.load(dest)
+        for name, archive in (("02_Field_Projects/Source_Data/ndvi.tif", "Archive/full.zip"),
+                              ("00_Admin/Farmer_Outreach_Tracker.csv", "daily.zip")):
+            original = ArchiveManifest.load(folder / archive).get(name)
+            entry = merged.get(name)
+            assert (entry.crc, entry.compress_size, entry.digest) == (original.crc, original.compress_size, original.digest)
+
+        # Solid payloads are reused as they are, even from blocks with dead files or another dictionary
+        def payloads(path):
+            with zipfile.ZipFile(path) as zf:
+                blocks = [zf.read(name) for name in zf.namelist() if name.endswith(".blk")]
+            return {raw[solid_pack.BLOCK_HEADER.size + solid_pack.BLOCK_HEADER.unpack_from(raw)[2]:] for raw in blocks}
+        assert payloads(dest) <= payloads(folder / "Archive" / "full.zip") | payloads(folder / "daily.zip")
+        with zipfile.ZipFile(dest) as zf:
+            assert SolidReader(zf).block_dictionaries
+    print("✅ Synthetic full test passed")
+
+def test_integrity_check():
+    """Damaged zips are found, results are remembered, and volumes count against their backup"""
+    print("🧪 Testing archive integrity checks")
+    import backup_verify
+    import cleanup_old_backups
+    from backup_verify import VerifiedArchives, check_zip_integrity, verify_backups
+    from create_backup_zip import create_volumes, create_zip
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source"
+        make_source_tree(source)
+        folder = Path(tmp) / "Backups"
+        (folder / "Archive").mkdir(parents=True)
+        for day in ("01", "02", "03"):
+            create_zip(source, folder / "Archive" / f"BigSkyAg_Backup_weekly_2025-01-{day}.zip", ["*.DS_Store"], 1)
+        create_volumes(source, folder / "BigSkyAg_Backup_daily_2025-01-04.zip", 64 * 1024, ["*.DS_Store"], 1)
+
+        # Flip a byte inside the deflated tracker of one backup, truncate another
+        bad_crc = folder / "Archive" / "BigSkyAg_Backup_weekly_2025-01-02.zip"
+        with zipfile.ZipFile(bad_crc) as zf:
+            info = zf.getinfo("00_Admin/Farmer_Outreach_Tracker.csv")
+        offset = info.header_offset + 30 + len(info.filename) + len(info.extra) + 20
+        with open(bad_crc, "r+b") as f:
+            f.seek(offset)
+            byte = f.read(1)
+            f.seek(offset)
+            f.write(bytes([byte[0] ^ 0x01]))
+        truncated = folder / "Archive" / "BigSkyAg_Backup_weekly_2025-01-03.zip"
+        with open(truncated, "r+b") as f:
+            f.truncate(truncated.stat().st_size - 40)
+
+        paths = sorted(folder.rglob("*.zip"))
+        results = check_zip_integrity(paths, workers=3)
+        assert [name for name, _ in results[bad_crc]] == ["00_Admin/Farmer_Outreach_Tracker.csv"]
+        assert results[truncated][0][0] == ""
+        assert sum(1 for problems in results.values() if problems) == 2
+
+        # Remembered results are reused until the file changes
+        verified = VerifiedArchives()
+        verify_backups(paths, verified, workers=2)
+        checked = []
+        original = backup_verify.check_zip_integrity
+        backup_verify.check_zip_integrity = lambda stale, workers=None: checked.extend(stale) or original(stale, workers)
+        try:
+            assert verify_backups(paths, verified)[bad_crc]
+            assert checked == []
+            os.utime(bad_crc, (time.time() + 5, time.time() + 5))
+            verify_backups(paths, verified)
+            assert checked == [bad_crc]
+        finally:
+            backup_verify.check_zip_integrity = original
+
+        # A damaged volume marks its whole backup
+        volume = sorted(folder.glob("*.part*.zip"))[0]
+        with open(volume, "r+b") as f:
+            f.truncate(100)
+        state_dir = cleanup_old_backups.STATE_DIR
+        cleanup_old_backups.STATE_DIR = Path(tmp) / "state"
+        try:
+            damaged = cleanup_old_backups.damaged_backups([folder, folder / "Archive"], "BigSkyAg_Backup_*.zip",
+                                                          {}, "BigSkyAg_Backup")
+        finally:
+            cleanup_old_backups.STATE_DIR = state_dir
+        assert sorted(damaged) == ["BigSkyAg_Backup_daily_2025-01-04.zip", bad_crc.name, truncated.name]
+        assert (Path(tmp) / "state" / "verified" / "BigSkyAg_Backup.json").exists()
+    print("✅ Integrity check test passed")
+
+def test_retention_plan():
+    """GFS retention keeps each type's periods plus incremental chains, locally and remotely"""
+    print("🧪 Testing GFS retention")
+    from datetime import date, timedelta
+    from create_backup_zip import select_backup_type
+    from retention import apply_plan, make_records, parse_backup_name, plan_backups, plan_retention
+    from storage_providers.local import LocalStorageProvider
+
+    backup_config = {
+        "max_working_backups": 1, "max_archive_backups": 4,
+        "backup_types": {"daily": {"type": "incremental", "retention": 7},
+                         "weekly": {"type": "full", "retention": 4},
+                         "monthly": {"type": "full", "retention": 3}},
+    }
+    prefix = "BigSkyAg_Backup"
+    assert parse_backup_name(f"{prefix}_2024-12-31.zip", prefix)[0] is None
+    assert parse_backup_name(f"{prefix}_weekly_2025-01-05_0200.zip", prefix)[0] == "weekly"
+    assert parse_backup_name(f"{prefix}_2025-01-05.zip.partial", prefix) is None
+
+    day, names = date(2025, 1, 1), []
+    while day <= date(2025, 6, 18):  # A Wednesday
+        names.append(f"{prefix}_{select_backup_type(backup_config, day)}_{day}_0200.zip")
+        day += timedelta(days=1)
+    names.append(f"{prefix}_2024-12-31.zip")  # Before typed names existed
+    records = make_records(names, prefix, backup_config["backup_types"])
+    keep = plan_retention(records, backup_config["backup_types"])
+    kept = sorted(keep, key=lambda name: name[-19:])
+    daily = [name for name in kept if "daily" in keep[name]]
+    assert [name[-19:-9] for name in daily] == [f"2025-06-{d}" for d in range(12, 19)]
+    assert [name[-19:-9] for name in kept if "weekly" in keep[name]] == ["2025-05-25", "2025-06-01", "2025-06-08", "2025-06-15"]
+    assert [name[-19:-9] for name in kept if "monthly" in keep[name]] == ["2025-04-27", "2025-05-25", "2025-06-15"]
+    # The dailies of June 12-14 need the full of June 8 and everything after it
+    assert all(keep[f"{prefix}_daily_2025-06-{d:02d}_0200.zip"] for d in range(9, 12))
+    assert f"{prefix}_2024-12-31.zip" not in keep and len(keep) == 14
+
+    # Local copies are capped to max_working_backups + max_archive_backups (plus chains)
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "Backups"
+        (folder / "Archive").mkdir(parents=True)
+        provider = LocalStorageProvider({"provider": "local", "backup_prefix": prefix,
+                                         "storage_path": str(Path(tmp) / "remote")})
+        for name in names[-30:]:
+            (folder / "Archive" / name).write_bytes(b"x" * 1000)
+            (folder / "Archive" / (name + ".manifest.json.gz")).write_bytes(b"m")
+            provider.upload_backup(folder / "Archive" / name, "daily")
+        plan = plan_backups(backup_config, prefix, folder, provider)
+        # June 18 back to the full of June 15; June 14 would need five more backups
+        assert sorted(name[-19:-9] for name in plan.local_keep) == [f"2025-06-{d}" for d in range(15, 19)]
+        assert plan.local_keep <= set(plan.keep)
+        assert apply_plan(plan, provider, dry_run=True)
+        assert len(list((folder / "Archive").iterdir())) == 60
+
+        assert apply_plan(plan, provider)
+        local = {path.name for path in (folder / "Archive").iterdir()}
+        remote = {item["name"] for item in provider.list_files(f"{prefix}/daily")}
+        assert local == plan.local_keep | {name + ".manifest.json.gz" for name in plan.local_keep}
+        assert remote == set(plan.keep) & set(names[-30:])
+    print("✅ Retention test passed")
+
+def test_batch_deletes():
+    """Batch deletes need one request per batch and report only the files that failed"""
+    print("🧪 Testing batch deletes")
+    from storage_providers import google_drive, s3
+    from storage_providers.local import LocalStorageProvider
+
+    class FakeS3:
+        def __init__(self):
+            self.requests = []
+
+        def delete_objects(self, Bucket, Delete):
+            self.requests.append(len(Delete["Objects"]))
+            return {"Errors": [{"Key": obj["Key"]} for obj in Delete["Objects"] if obj["Key"].endswith("locked")]}
+
+    provider = s3.S3Provider.__new__(s3.S3Provider)
+    provider.s3_client, provider.bucket_name = FakeS3(), "bigsky"
+    keys = [f"BigSkyAg_Backup/chunks/{i:04d}" for i in range(2500)] + ["BigSkyAg_Backup/daily/locked"]
+    assert provider.delete_files(keys) == ["BigSkyAg_Backup/daily/locked"]
+    assert provider.s3_client.requests == [1000, 1000, 501]
+
+    class FakeDrive:
+        """files().delete() and new_batch_http_request() of the Drive API client"""
+        def __init__(self):
+            self.batches = 0
+
+        def files(self):
+            return self
+
+        def delete(self, fileId):
+            return fileId
+
+        def new_batch_http_request(self, callback):
+            drive = self
+
+            class Batch(list):
+                def add(self, request, request_id):
+                    self.append(request_id)
+
+                def execute(self):
+                    drive.batches += 1
+                    for request_id in self:
+                        error = None
+                        if request_id.startswith("gone"):
+                            error = type("HttpError", (Exception,), {"resp": type("Resp", (), {"status": 404})})()
+                        elif request_id.startswith("shared"):
+                            error = type("HttpError", (Exception,), {"resp": type("Resp", (), {"status": 403})})()
+                        callback(request_id, None, error)
+            return Batch()
+
+    provider = google_drive.GoogleDriveProvider.__new__(google_drive.GoogleDriveProvider)
+    provider.service = FakeDrive()
+    assert provider.delete_files([f"file{i}" for i in range(250)] + ["gone1", "shared1"]) == ["shared1"]
+    assert provider.service.batches == 3
+
+    # The fallback deletes one at a time and reports what it could not delete
+    with tempfile.TemporaryDirectory() as tmp:
+        provider = LocalStorageProvider({"provider": "local", "backup_prefix": "BigSkyAg_Backup",
+                                         "storage_path": tmp})
+        (Path(tmp) / "a.zip").write_bytes(b"a")
+        assert provider.delete_files(["a.zip", "missing.zip"]) == ["missing.zip"]
+        assert not (Path(tmp) / "a.zip").exists()
+    print("✅ Batch delete test passed")
+
+def test_space_budget():
+    """Cleanup drops the oldest whole chains until the next backup fits the budget and disk"""
+    print("🧪 Testing space-budget pruning")
+    from backup_estimate import EstimateHistory, forecast_bytes
+    from cleanup_old_backups import fit_to_space
+    from retention import plan_backups
+
+    history = EstimateHistory(runs=[{"backup_type": "weekly", "kind": "full", "bytes_out": size} for size in (5, 9, 7)])
+    assert forecast_bytes(history, "weekly", "full") == int(9 * 1.1)
+    assert forecast_bytes(history, "monthly", "full") == int(9 * 1.1)
+    assert forecast_bytes(history, "daily", "incremental") is None
+
+    prefix = "BigSkyAg_Backup"
+    names = [f"{prefix}_weekly_2025-06-01_0200.zip", f"{prefix}_daily_2025-06-02_0200.zip",
+             f"{prefix}_weekly_2025-06-08_0200.zip", f"{prefix}_daily_2025-06-09_0200.zip",
+             f"{prefix}_daily_2025-06-10_0200.zip", f"{prefix}_weekly_2025-06-15_0200.zip",
+             f"{prefix}_daily_2025-06-16_0200.zip"]
+    backup_config = {"max_working_backups": 1, "max_archive_backups": 10, "min_free_gb": 0,
+                     "backup_types": {"daily": {"type": "incremental", "retention": 7},
+                                      "weekly": {"type": "full", "retention": 4}}}
+    mb = 1024**2
+    with tempfile.TemporaryDirectory() as tmp:
+        folder = Path(tmp) / "Backups"
+        (folder / "Archive").mkdir(parents=True)
+        for name in names:
+            (folder / "Archive" / name).write_bytes(b"\0" * mb)
+
+        # 7 MB kept + 2 MB next backup against a 6 MB budget: the June 1 and June 8 chains go
+        backup_config["local_budget_gb"] = 6 * mb / 1024**3
+        plan = plan_backups(backup_config, prefix, folder)
+        assert len(plan.local_keep) == 7
+        assert fit_to_space(plan, folder, backup_config, 2 * mb)
+        assert sorted(plan.local_delete) == sorted(names[:5])
+
+        # Room for the next backup already: nothing more goes
+        backup_config["local_budget_gb"] = 20 * mb / 1024**3
+        plan = plan_backups(backup_config, prefix, folder)
+        assert fit_to_space(plan, folder, backup_config, 2 * mb) and plan.local_delete == []
+
+        # A free-space target the disk can't meet: the newest chain still stays
+        backup_config["min_free_gb"] = 1024**2
+        plan = plan_backups(backup_config, prefix, folder)
+        assert not fit_to_space(plan, folder, backup_config, 2 * mb)
+        assert plan.local_keep == set(names[5:])
+    print("✅ Space budget test passed")
+
+if __name__ == "__main__":
+    test_compression_policy()
+    test_write_tree()
+    test_zip64_records()
+    test_growing_file()
+    test_parallel_matches_serial()
+    test_incremental_manifest()
+    test_dedup_repository()
+    test_chunker_fast_path()
+    test_archive_manifest()
+    test_ranged_restore()
+    test_chain_restore()
+    test_resume_after_interruption()
+    test_streamed_upload()
+    test_split_volumes()
+    test_oversized_volume_entry()
+    test_solid_packing()
+    test_page_cache_reads()
+    test_backup_estimate()
+    test_exclusion_rules()
+    test_synthetic_full()
+    test_integrity_check()
+    test_retention_plan()
+    test_batch_deletes()
+    test_space_budget()
+    print("\n🎉 All backup archive tests passed!")
@@ -3,6 +3,12 @@ Test script for BigSkyAg Configuration
 Verifies that all configuration functions work correctly with the updated SSD path
 """
 
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
 from config import (
     BASE_DIR, 
     DESKTOP_SOURCE, 
@@ -10,8 +16,11 @@ from config import (
     ROUTING_RULES,
     ensure_critical_folders,
     get_folder_path,
-    get_routing_destination
+    get_routing_destination,
+    compile_config,
+    load_config_file
 )
+from config_loader import ConfigWatcher, cache_path_for
 
 def test_config():
     """Test the configuration system"""
@@ -99,6 +108,114 @@ def test_config():
     print(f"\n🎉 All configuration tests passed!")
     return True
 
+def test_compiled_config():
+    """Test file overrides, the pickle cache and hot reload"""
+    print("🧪 Testing compiled configuration")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        config_file = Path(tmp) / "bigsky.json"
+        config_file.write_text(json.dumps({
+            "company_settings": {"company_name": "PaulysOps", "storage_provider": "dropbox"},
+            "routing_rules": {".LAS": "mapping"}
+        }))
+        
+        compiled = load_config_file(config_file)
+        print(f"   Loaded: {compiled}")
+        assert compiled.backup_prefix == "PaulysOps_Backup"
+        assert compiled.dropzone_name == "PaulysOpsDropZone"
+        assert compiled.get_folder_path("dropzone").name == "PaulysOpsDropZone"
+        assert compiled.get_routing_destination(".las") == compiled.get_folder_path("mapping")
+        assert compiled.get_storage_provider_config()["provider"] == "dropbox"
+        assert cache_path_for(config_file).exists()
+        
+        # Immutable
+        try:
+            compiled.routing_rules[".new"] = "admin"
+            assert False, "routing rules should be read-only"
+        except TypeError:
+            pass
+        
+        # Cache hit returns an equivalent object without re-parsing
+        assert load_config_file(config_file).to_dict() == compiled.to_dict()
+        
+        # Hot reload picks up edits
+        watcher = ConfigWatcher(config_file, load_config_file, check_interval=0)
+        assert watcher.get().company_name == "PaulysOps"
+        config_file.write_text(json.dumps({"company_settings": {"company_name": "GenericCorp"}}))
+        future = time.time() + 5
+        os.utime(config_file, (future, future))
+        assert watcher.get().company_name == "GenericCorp"
+    
+    # Defaults are unaffected by override files
+    assert compile_config().routing_rules == ROUTING_RULES
+    print("✅ Compiled configuration test passed")
+
+def test_folder_stamp():
+    """Test that verified folders are stamped and not re-probed"""
+    print("🧪 Testing folder verification stamp")
+    import config
+    
+    real = config.BASE_DIR, config.STATE_DIR, config.CRITICAL_FOLDERS
+    with tempfile.TemporaryDirectory() as tmp:
+        # Scratch folders and stamp, not the real ones
+        config.BASE_DIR, config.STATE_DIR = Path(tmp) / "base", Path(tmp) / "state"
+        config.CRITICAL_FOLDERS = {key: config.BASE_DIR / path.relative_to(real[0])
+                                   for key, path in real[2].items()}
+        try:
+            config.invalidate_folder_stamp()
+            assert config.ensure_critical_folders(probe_writes=True) == []
+            assert config._folder_stamp_path().exists()
+            
+            # A valid stamp short-circuits the probes, even for a fresh process
+            config._folders_verified.clear()
+            stamp = config._read_folder_stamp()
+            assert config._folder_stamp_is_valid(stamp, probe_writes=True)
+            assert config.ensure_critical_folders(probe_writes=True) == []
+            assert not any(path.joinpath(config.PROBE_FILE_NAME).exists()
+                           for path in config.CRITICAL_FOLDERS.values())
+        finally:
+            config.invalidate_folder_stamp()
+            config.BASE_DIR, config.STATE_DIR, config.CRITICAL_FOLDERS = real
+    print("✅ Folder stamp test passed")
+
+def test_tenant_registry():
+    """Test that several companies can be routed concurrently in one process"""
+    print("🧪 Testing multi-tenant registry")
+    from tenants import TenantRegistry, route_task
+    import config
+    
+    real_state_dir = config.STATE_DIR
+    with tempfile.TemporaryDirectory() as tmp:
+        # Folder stamps go to a scratch state folder, not the real one
+        config.STATE_DIR = Path(tmp) / "state"
+        try:
+            registry = TenantRegistry(max_workers=3)
+            for name, template in config.COMPANY_TEMPLATES.items():
+                registry.register(name, template["storage_provider"], base_dir=Path(tmp) / name)
+            
+            assert sorted(registry.names()) == sorted(config.COMPANY_TEMPLATES)
+            for name in registry.names():
+                tenant = registry.get(name)
+                assert tenant.backup_prefix == f"{name}_Backup"
+                assert tenant.get_folder_path("dropzone") == Path(tmp) / name / f"{name}DropZone"
+                tenant.get_folder_path("dropzone").mkdir(parents=True)
+                (tenant.get_folder_path("dropzone") / f"{name}.csv").write_text(name)
+            
+            results = registry.run(route_task)
+            registry.shutdown()
+            assert all(result is True for result in results.values()), results
+            for name in registry.names():
+                assert (registry.get(name).get_folder_path("admin") / f"{name}.csv").exists()
+        finally:
+            config.STATE_DIR = real_state_dir
+    
+    # Module globals are untouched
+    assert config.COMPANY_SETTINGS["company_name"] == config._DEFAULT_COMPANY_SETTINGS["company_name"]
+    print("✅ Multi-tenant registry test passed")
+
 if __name__ == "__main__":
     success = test_config()
+    test_compiled_config()
+    test_folder_stamp()
+    test_tenant_registry()
     exit(0 if success else 1)
@@ -0,0 +1,222 @@
+"""
+Test script for the BigSkyAg SSD mirror
+Mirrors small trees in a temp folder with the native engine, the rsync wrapper and the daemon
+"""
+
+import io
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from types import SimpleNamespace
+
+from mirror_daemon import ChangeJournal, JournalHandler, MirrorDaemon
+from mirror_engine import FILE_COST, MirrorReport, mirror_tree, shard_jobs
+from mirror_to_ssd import output_lines, parse_itemized, run_rsync
+
+def make_mirror_tree(root: Path):
+    """Create a source tree and an empty target, all dated long ago; returns (source, target)
+
+    src/a holds f0..f19, src/a/b holds g0..g19, src/c is empty, src/Fields holds a.tif
+    and gone.txt, and src/junk.tmp is there for the exclusion rules.
+    """
+    source, target = root / "src", root / "dst"
+    for folder in ("a/b", "c", "Fields"):
+        (source / folder).mkdir(parents=True)
+    for i in range(20):
+        (source / "a" / f"f{i}").write_bytes(b"a" * i)
+        (source / "a" / "b" / f"g{i}").write_bytes(b"b" * i)
+    (source / "Fields" / "a.tif").write_bytes(b"a" * 100)
+    (source / "Fields" / "gone.txt").write_bytes(b"gone")
+    (source / "junk.tmp").write_bytes(b"skip me")
+    target.mkdir()
+    for folder, dirs, files in os.walk(source):
+        for name in files + dirs:
+            os.utime(os.path.join(folder, name), (1e9, 1e9))
+    os.utime(source, (1e9, 1e9))
+    return source, target
+
+def test_native_mirror():
+    """The native mirror copies only changes, skips unchanged folders and keeps excluded files"""
+    print("🧪 Testing native mirror engine")
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = make_mirror_tree(Path(tmp))
+        snapshot = Path(tmp) / "mirror.json.gz"
+
+        report = mirror_tree(source, target, ["*.tmp"], snapshot)
+        assert report.full and len(report.added) == 42
+        assert report.created_dirs == ["Fields/", "a/", "a/b/", "c/"]
+        assert not (target / "junk.tmp").exists()
+        assert (target / "a" / "f3").stat().st_mtime_ns == (source / "a" / "f3").stat().st_mtime_ns
+
+        report = mirror_tree(source, target, ["*.tmp"], snapshot)
+        assert not report.full and not report.changed
+        assert report.folders_listed == 0 and report.files_checked == 42
+
+        # An in-place edit (folder mtime unchanged), a deletion, a new folder, an excluded file on the target
+        (source / "a" / "b" / "g2").unlink()
+        (source / "c" / "new").mkdir()
+        (source / "c" / "new" / "n").write_bytes(b"n")
+        (source / "a" / "f1").write_bytes(b"edited")
+        for path in ("a/f1", "c/new/n", "c/new"):
+            os.utime(source / path, (2e9, 2e9))
+        os.utime(source / "a", (1e9, 1e9))
+        (target / "a" / "b" / "keep.tmp").write_bytes(b"mine")
+        report = mirror_tree(source, target, ["*.tmp"], snapshot)
+        assert report.change_lines() == ["+ c/new/", "+ c/new/n", "M a/f1", "- a/b/g2"]
+        assert (target / "a" / "f1").read_bytes() == b"edited"
+
+        # A removed folder goes, except for the excluded file inside it
+        shutil.rmtree(source / "a" / "b")
+        report = mirror_tree(source, target, ["*.tmp"], snapshot)
+        assert len(report.deleted) == 19 and report.deleted_dirs == []
+        assert sorted(os.listdir(target / "a" / "b")) == ["keep.tmp"]
+
+        # A full comparison finds nothing the snapshot missed
+        report = mirror_tree(source, target, ["*.tmp"], snapshot, full=True)
+        assert report.full and not report.changed
+    print("✅ Native mirror test passed")
+
+def test_mirror_shards():
+    """Copies are split into balanced contiguous shards and a pooled mirror matches a serial one"""
+    print("🧪 Testing sharded mirror copies")
+
+    class Stat:
+        def __init__(self, size):
+            self.st_size = size
+
+    # 90 tiny files and one large one: the large file gets a shard to itself
+    jobs = [(f"small{i}", None, None, Stat(0), True) for i in range(90)] + [("big", None, None, Stat(30 * FILE_COST), True)]
+    shards = shard_jobs(jobs, 4)
+    assert [job for shard in shards for job in shard] == jobs
+    assert [len(shard) for shard in shards] == [30, 30, 30, 1]
+    assert shard_jobs(jobs[:2], 8) == [[jobs[0]], [jobs[1]]] and shard_jobs([], 4) == []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, _target = make_mirror_tree(Path(tmp))
+        for workers in (1, 4):
+            target = Path(tmp) / f"dst{workers}"
+            target.mkdir()
+            report = mirror_tree(source, target, (), Path(tmp) / f"{workers}.json.gz", workers=workers)
+            assert len(report.added) == 43 and not report.errors
+            for folder, _dirs, files in os.walk(source):
+                copy = target / Path(folder).relative_to(source)
+                assert copy.stat().st_mtime_ns == Path(folder).stat().st_mtime_ns
+                for name in files:
+                    assert (copy / name).read_bytes() == Path(folder, name).read_bytes()
+        assert sorted(os.listdir(Path(tmp) / "dst1" / "a")) == sorted(os.listdir(Path(tmp) / "dst4" / "a"))
+    print("✅ Sharded mirror test passed")
+
+def test_rsync_stream():
+    """rsync's itemized output is parsed as it streams and saved as a compact change list"""
+    print("🧪 Testing streamed rsync changes")
+    assert parse_itemized(">f+++++++++ Fields/a.tif") == ("+", "Fields/a.tif")
+    assert parse_itemized(">f.st...... Fields/b.tif") == ("M", "Fields/b.tif")
+    assert parse_itemized(">f.st.... old rsync.txt") == ("M", "old rsync.txt")
+    assert parse_itemized("cd+++++++++ Fields/New/") == ("+", "Fields/New/")
+    assert parse_itemized("cL+++++++++ latest -> Fields/a.tif") == ("+", "latest")
+    assert parse_itemized("*deleting   Fields/Old/") == ("-", "Fields/Old/")
+    assert parse_itemized(".d..t...... Fields/") is None
+    assert parse_itemized("sending incremental file list") is None
+    stream = io.BufferedReader(io.BytesIO(b"a\r  1,024  50%  1.00MB/s  0:00:01\rb\nc"))
+    assert list(output_lines(stream)) == ["a", "  1,024  50%  1.00MB/s  0:00:01", "b", "c"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # A stand-in rsync that prints what rsync 3 would, progress updates included
+        fake = Path(tmp) / "rsync"
+        fake.write_text("#!/bin/sh\n"
+                        "printf 'cd+++++++++ New/\\n>f+++++++++ New/a.txt\\n'\n"
+                        "printf '      2,048 100%%    1.95MB/s    0:00:00 (xfr#1, to-chk=0/3)\\r'\n"
+                        "printf '>f..t...... b.txt\\n*deleting   gone.txt\\n'\n"
+                        "printf '     10,240 100%%    9.77MB/s    0:00:00 (xfr#2, to-chk=0/3)\\n'\n")
+        fake.chmod(0o755)
+        path = os.environ["PATH"]
+        os.environ["PATH"] = f"{tmp}{os.pathsep}{path}"
+        try:
+            returncode, report = run_rsync(Path(tmp) / "src", Path(tmp) / "dst", progress2=True)
+        finally:
+            os.environ["PATH"] = path
+        assert returncode == 0 and report.bytes_copied == 10240
+        assert report.change_lines() == ["+ New/", "+ New/a.txt", "M b.txt", "- gone.txt"]
+
+        saved = Path(tmp) / "changes.txt.gz"
+        report.save_changes(saved, engine="rsync")
+        header, loaded = MirrorReport.load_changes(saved)
+        assert header["engine"] == "rsync" and header["complete"] and header["bytes_copied"] == 10240
+        assert loaded.change_lines() == report.change_lines()
+        assert MirrorReport.load_changes(Path(tmp) / "missing.txt.gz") is None
+    print("✅ Streamed rsync test passed")
+
+def test_mirror_daemon():
+    """Journaled events survive a restart and are applied with renames, deletes and partial writes"""
+    print("🧪 Testing mirror daemon journal")
+    with tempfile.TemporaryDirectory() as tmp:
+        source, target = make_mirror_tree(Path(tmp))
+        journal_file = Path(tmp) / "journal.jsonl"
+        mirror_tree(source, target, ["*.tmp"])
+        settings = {"daemon_quiet_seconds": 0, "daemon_stable_seconds": 60}
+
+        # Events journaled by one daemon are applied by the next (as after a crash)
+        daemon = MirrorDaemon(source, target, ChangeJournal(journal_file), ["*.tmp"], settings)
+        (source / "Fields" / "a.tif").rename(source / "Fields" / "b.tif")
+        (source / "Fields" / "gone.txt").unlink()
+        (source / "New" / "Deep").mkdir(parents=True)
+        (source / "New" / "Deep" / "x.xmp").write_bytes(b"x")
+        (source / "scratch.tmp").write_bytes(b"tmp")
+        daemon.record([str(source / "Fields" / "a.tif"), str(source / "Fields" / "b.tif"),
+                       str(source / "Fields" / "gone.txt"), str(source / "New"), str(source / "New" / "Deep" / "x.xmp"),
+                       str(source / "scratch.tmp"), str(Path(tmp) / "elsewhere")])
+        daemon.journal.close()
+        with open(journal_file, "ab") as f:
+            f.write(b'[1.0, "torn')  # A line cut short by the crash
+
+        journal = ChangeJournal(journal_file)
+        daemon = MirrorDaemon(source, target, journal, ["*.tmp"], settings)
+        offset, entries = journal.pending()
+        assert [path for _, path in entries] == ["Fields/a.tif", "Fields/b.tif", "Fields/gone.txt", "New", "New/Deep/x.xmp"]
+        for path in ("New/Deep/x.xmp", "Fields/b.tif"):
+            os.utime(source / path, (1e9, 1e9))  # Settled: written long ago
+
+        report = daemon.apply_pending()
+        assert sorted(os.listdir(target / "Fields")) == ["b.tif"] and not (target / "scratch.tmp").exists()
+        assert (target / "New" / "Deep" / "x.xmp").read_bytes() == b"x"
+        assert report.deleted == ["Fields/a.tif", "Fields/gone.txt"] and "Fields/b.tif" in report.added
+        assert journal.pending()[1] == [] and journal.applied_offset() == offset
+        assert daemon.apply_pending() is None
+
+        # A file written moments ago waits in the journal until it settles
+        (source / "Fields" / "live.tif").write_bytes(b"half")
+        daemon.record([str(source / "Fields" / "live.tif")])
+        daemon.apply_pending()
+        assert not (target / "Fields" / "live.tif").exists()
+        assert [path for _, path in journal.pending()[1]] == ["Fields/live.tif"]
+        os.utime(source / "Fields" / "live.tif", (1e9, 1e9))
+        daemon.apply_pending()
+        assert (target / "Fields" / "live.tif").read_bytes() == b"half" and journal.pending()[1] == []
+
+        # Only folder events arrive (FSEvents): each folder's direct children are relisted
+        (source / "Fields" / "b.tif").unlink()
+        (source / "Fields" / "c.tif").write_bytes(b"c")
+        (source / "New" / "Deep" / "x.xmp").write_bytes(b"changed")
+        (source / "Fresh" / "Sub").mkdir(parents=True)
+        (source / "Fresh" / "Sub" / "f.txt").write_bytes(b"f")
+        for path in ("Fields/c.tif", "New/Deep/x.xmp", "Fresh/Sub/f.txt"):
+            os.utime(source / path, (1e9, 1e9))
+        handler = JournalHandler(daemon)
+        for folder in (source / "Fields", source):
+            handler.on_any_event(SimpleNamespace(event_type="modified", is_directory=True, src_path=str(folder)))
+        assert [path for _, path in journal.pending()[1]] == ["Fields/", "/"]
+        report = daemon.apply_pending()
+        assert sorted(os.listdir(target / "Fields")) == ["c.tif", "live.tif"]
+        assert (target / "Fresh" / "Sub" / "f.txt").read_bytes() == b"f"
+        assert (target / "New" / "Deep" / "x.xmp").read_bytes() == b"x"  # Not below a relisted folder
+        assert report.deleted == ["Fields/b.tif"] and journal.pending()[1] == []
+        journal.close()
+    print("✅ Mirror daemon test passed")
+
+if __name__ == "__main__":
+    test_native_mirror()
+    test_mirror_shards()
+    test_rsync_stream()
+    test_mirror_daemon()
+    print("\n🎉 All mirror tests passed!")
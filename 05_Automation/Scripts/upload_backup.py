@@ -5,8 +5,10 @@ Uploads backups to the configured storage provider with proper error handling
 """
 
 import sys
+import json
 import logging
 import time
+import zipfile
 from pathlib import Path
 from datetime import datetime
 
@@ -14,8 +16,11 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent))
 
 try:
-    from config import get_storage_provider_config
+    from config import get_storage_provider_config, get_folder_path, BACKUP_CONFIG
     from storage_providers import get_storage_provider
+    from backup_volumes import index_path, upload_volume_set, volume_set_name
+    from backup_manifest import BACKUP_INFO_NAME
+    from retention import parse_backup_name, run_retention
     CONFIG_AVAILABLE = True
 except ImportError as e:
     CONFIG_AVAILABLE = False
@@ -38,14 +43,20 @@ MAX_RETRIES = 3
 RETRY_DELAY = 30  # seconds
 UPLOAD_TIMEOUT = 300  # 5 minutes
 
-def initialize_storage():
-    """Initialize storage provider from config with proper error handling"""
+def initialize_storage(tenant_config=None):
+    """Initialize storage provider from config with proper error handling
+    
+    tenant_config is an optional CompiledConfig; None means the module-level config.py settings.
+    """
     if not CONFIG_AVAILABLE:
         logger.error("❌ Configuration not available")
         return None
         
     try:
-        config = get_storage_provider_config()
+        if tenant_config is not None:
+            config = tenant_config.get_storage_provider_config()
+        else:
+            config = get_storage_provider_config()
         provider = get_storage_provider(config['provider'], config)
         logger.info(f"✅ Initialized {config['provider']} storage provider")
         return provider
@@ -53,10 +64,13 @@ def initialize_storage():
         logger.error(f"❌ Failed to initialize storage: {e}")
         return None
 
-def find_latest_backup():
+def find_latest_backup(tenant_config=None):
     """Find the most recent backup file with validation"""
     try:
-        backup_dir = Path("/Volumes/BigSkyAgSSD/BigSkyAg/00_Admin/Backups")
+        if tenant_config is not None:
+            backup_dir = tenant_config.get_folder_path("backups")
+        else:
+            backup_dir = get_folder_path("backups")
         if not backup_dir.exists():
             logger.error(f"❌ Backup directory not found: {backup_dir}")
             return None
@@ -86,7 +100,23 @@ def find_latest_backup():
         logger.error(f"💥 Error finding latest backup: {e}")
         return None
 
-def upload_backup_with_retry(provider, backup_path):
+def backup_type_of(backup_path, backup_prefix):
+    """The backup type (daily, weekly, ...) a backup or volume was written as
+
+    Read from the backup.json inside the archive, else from the
+    {prefix}_{type}_{date}.zip name; older untyped backups count as daily.
+    """
+    try:
+        with zipfile.ZipFile(backup_path) as zf:
+            backup_type = json.loads(zf.read(BACKUP_INFO_NAME)).get("backup_type")
+            if backup_type:
+                return backup_type
+    except (KeyError, ValueError, OSError, zipfile.BadZipFile):
+        pass
+    parsed = parse_backup_name(volume_set_name(Path(backup_path).name), backup_prefix)
+    return parsed[0] if parsed and parsed[0] else "daily"
+
+def upload_backup_with_retry(provider, backup_path, backup_type="daily"):
     """Upload backup to storage provider with retry logic and timeout handling"""
     for attempt in range(MAX_RETRIES):
         try:
@@ -101,9 +131,9 @@ def upload_backup_with_retry(provider, backup_path):
                 logger.error("❌ Authentication failed")
                 return False
             
-            # Upload to daily backup folder with timeout handling
+            # Upload to the backup type's folder with timeout handling
             start_time = time.time()
-            file_id = provider.upload_backup(backup_path, "daily")
+            file_id = provider.upload_backup(backup_path, backup_type)
             
             upload_time = time.time() - start_time
             logger.info(f"⏱️  Upload completed in {upload_time:.1f} seconds")
@@ -129,14 +159,14 @@ def upload_backup_with_retry(provider, backup_path):
     
     return False
 
-def cleanup_old_backups(provider):
-    """Clean up old backups based on config with error handling"""
+def cleanup_old_backups(provider, tenant_config=None):
+    """Apply the backup_types retention plan to stored and local backups with error handling"""
     try:
         if not provider:
             logger.warning("⚠️ No provider available for cleanup")
             return False
             
-        success = provider.cleanup_old_backups(max_backups=5, backup_type="daily")
+        success = run_retention(tenant_config, provider)
         if success:
             logger.info("✅ Old backups cleaned up")
         else:
@@ -162,8 +192,12 @@ def get_storage_info(provider):
         logger.error(f"💥 Error getting storage info: {e}")
         return None
 
-def run_backup_upload():
-    """Main backup upload process with comprehensive error handling"""
+def run_backup_upload(tenant_config=None, provider=None):
+    """Main backup upload process with comprehensive error handling
+    
+    A multi-tenant scheduler passes the tenant's CompiledConfig and may pass a shared,
+    already-initialized provider.
+    """
     logger.info("🚀 Starting backup upload process...")
     
     # Validate system state
@@ -172,24 +206,40 @@ def run_backup_upload():
         return False
     
     # Initialize storage
-    provider = initialize_storage()
+    if provider is None:
+        provider = initialize_storage(tenant_config)
     if not provider:
         logger.error("❌ Failed to initialize storage provider")
         return False
     
-    # Find latest backup
-    backup_path = find_latest_backup()
-    if not backup_path:
-        logger.error("❌ No valid backup found for upload")
-        return False
-    
-    # Upload backup with retry logic
-    if not upload_backup_with_retry(provider, backup_path):
-        logger.error("❌ Backup upload failed after all retry attempts")
-        return False
+    backup_config = tenant_config.backup_config if tenant_config is not None else BACKUP_CONFIG
+    if backup_config.get("stream_upload"):
+        # create_backup_zip already uploaded the backup while writing it
+        logger.info("☁️  Backups are streamed to storage; skipping upload")
+    else:
+        # Find latest backup
+        backup_path = find_latest_backup(tenant_config)
+        if not backup_path:
+            logger.error("❌ No valid backup found for upload")
+            return False
+        
+        backup_type = backup_type_of(backup_path, provider.backup_prefix)
+        index_file = index_path(backup_path.with_name(volume_set_name(backup_path.name)))
+        if index_file.exists():
+            # Split-volume backup: volumes go up in parallel, each retried on its own
+            failed = upload_volume_set(provider, index_file, backup_type, backup_config.get("upload_workers", 4),
+                                       MAX_RETRIES, RETRY_DELAY)
+            if failed:
+                logger.error(f"❌ {len(failed)} volumes failed to upload: {', '.join(failed)}")
+                logger.error("💡 Run the upload again to send only the missing volumes")
+                return False
+        # Upload backup with retry logic
+        elif not upload_backup_with_retry(provider, backup_path, backup_type):
+            logger.error("❌ Backup upload failed after all retry attempts")
+            return False
     
     # Cleanup old backups
-    cleanup_old_backups(provider)
+    cleanup_old_backups(provider, tenant_config)
     
     # Get storage info
     get_storage_info(provider)
@@ -25,15 +25,21 @@ echo "📁 Source: $SOURCE"
 echo "💾 Target: $TARGET"
 echo ""
 
+# Exclude patterns come from the automation config (shared with the backup and mirror_to_ssd.py)
+SCRIPTS_DIR="$(cd "$(dirname "$0")" && pwd)/05_Automation/Scripts"
+EXCLUDE_FILE="$(mktemp)"
+trap 'rm -f "$EXCLUDE_FILE"' EXIT
+if ! python3 "$SCRIPTS_DIR/exclusions.py" --rsync > "$EXCLUDE_FILE"; then
+    echo "❌ Could not load exclude patterns from $SCRIPTS_DIR/exclusions.py"
+    exit 1
+fi
+
 echo "🚀 Starting sync operation..."
 echo "📊 This may take a while depending on file sizes..."
 
 # Run rsync with progress and error handling
 rsync -av --delete \
-    --exclude="*.DS_Store" \
-    --exclude="__MACOSX" \
-    --exclude=".git" \
-    --exclude="*.tmp" \
+    --exclude-from="$EXCLUDE_FILE" \
     "$SOURCE/" "$TARGET/"
 
 # Check if rsync was successful